@@ -0,0 +1,124 @@
+"""
+Admission control for document processing endpoints
+
+Limits how much OCR/LLM work runs inside an API process at once, and checks
+Celery queue depth before diverting overflow to the async pipeline. Limits
+are per API process; run N uvicorn workers for N times the global budget.
+"""
+
+import os
+import threading
+from typing import Optional, Dict, Any
+from dotenv import load_dotenv
+
+import fair_scheduler
+
+load_dotenv()
+
+# Celery queues whose backlog counts towards the queue depth limit
+ADMISSION_QUEUES = ("document_processing", "ocr")
+
+
+class AdmissionController:
+    """Tracks in-flight synchronous processing and decides whether to admit more"""
+
+    def __init__(
+        self,
+        max_inflight: int,
+        max_inflight_per_user: int,
+        max_queue_depth: int,
+        retry_after_seconds: int,
+        divert_to_queue: bool = True
+    ):
+        self.max_inflight = max_inflight
+        self.max_inflight_per_user = max_inflight_per_user
+        self.max_queue_depth = max_queue_depth
+        self.retry_after_seconds = retry_after_seconds
+        self.divert_to_queue = divert_to_queue
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._inflight_by_user: Dict[str, int] = {}
+        self.rejected = 0
+        self.diverted = 0
+
+    def try_acquire(self, user_key: str) -> Optional[str]:
+        """
+        Reserve an in-flight slot for user_key
+
+        Returns:
+            None if admitted, otherwise "user" or "global" naming the limit hit
+        """
+        with self._lock:
+            if self._inflight_by_user.get(user_key, 0) >= self.max_inflight_per_user:
+                return "user"
+            if self._inflight >= self.max_inflight:
+                return "global"
+            self._inflight += 1
+            self._inflight_by_user[user_key] = self._inflight_by_user.get(user_key, 0) + 1
+            return None
+
+    def release(self, user_key: str) -> None:
+        """Free a slot reserved with try_acquire"""
+        with self._lock:
+            self._inflight = max(0, self._inflight - 1)
+            remaining = self._inflight_by_user.get(user_key, 0) - 1
+            if remaining > 0:
+                self._inflight_by_user[user_key] = remaining
+            else:
+                self._inflight_by_user.pop(user_key, None)
+
+    def record_rejected(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def record_diverted(self) -> None:
+        with self._lock:
+            self.diverted += 1
+
+    def queue_depth(self, redis_client) -> Optional[int]:
+        """
+        Pending messages across ADMISSION_QUEUES, plus jobs still waiting in
+        the fair scheduler's sub-queues, or None if the broker is unreachable
+        """
+        if redis_client is None:
+            return None
+        try:
+            # The Redis broker keeps each Celery queue as a list named after it
+            depth = sum(redis_client.llen(queue) for queue in ADMISSION_QUEUES)
+            if fair_scheduler.fair_scheduling_enabled():
+                # The dispatcher only keeps a few jobs on the Celery queue;
+                # the backlog sits in the per-tenant sub-queues
+                depth += sum(fair_scheduler.get_scheduler(redis_client).store.depth().values())
+            return depth
+        except Exception as e:
+            print(f"Warning: Could not read Celery queue depth: {str(e)}")
+            return None
+
+    def queue_has_capacity(self, redis_client) -> bool:
+        """True if the async queue can take another job"""
+        depth = self.queue_depth(redis_client)
+        return depth is not None and depth < self.max_queue_depth
+
+    def stats(self, redis_client=None) -> Dict[str, Any]:
+        """Current load figures for /health"""
+        with self._lock:
+            stats = {
+                "inflight": self._inflight,
+                "max_inflight": self.max_inflight,
+                "max_inflight_per_user": self.max_inflight_per_user,
+                "active_users": len(self._inflight_by_user),
+                "rejected_total": self.rejected,
+                "diverted_total": self.diverted,
+            }
+        stats["queue_depth"] = self.queue_depth(redis_client)
+        stats["max_queue_depth"] = self.max_queue_depth
+        return stats
+
+
+admission_controller = AdmissionController(
+    max_inflight=int(os.getenv("MAX_INFLIGHT_PROCESSING", 4)),
+    max_inflight_per_user=int(os.getenv("MAX_INFLIGHT_PER_USER", 2)),
+    max_queue_depth=int(os.getenv("MAX_QUEUE_DEPTH", 500)),
+    retry_after_seconds=int(os.getenv("ADMISSION_RETRY_AFTER", 10)),
+    divert_to_queue=os.getenv("ADMISSION_DIVERT_TO_QUEUE", "true").lower() == "true",
+)
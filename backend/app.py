@@ -1,10 +1,11 @@
 import os
 import sys
 import json
+import uuid
 import pytesseract
 from pdf2image import convert_from_path
-from fastapi import FastAPI, UploadFile, File, HTTPException, Form
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Form, Request, Header
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional, List, Dict, Any
 import re
@@ -59,6 +60,16 @@ except Exception as e:
     celery_app = None
     CELERY_AVAILABLE = False
 
+# Single-document async jobs run on Celery, or on a local process pool when
+# Celery/Redis is unavailable (JOB_BACKEND overrides; see get_job_backend().py)
+import job_backend as job_backends
+
+
+def get_job_backend() -> job_backends.JobBackend:
+    """The job backend, created on first use rather than whenever app is imported"""
+    return job_backends.get_job_backend(celery_app if CELERY_AVAILABLE else None,
+                                        redis_client if REDIS_AVAILABLE else None)
+
 try:
     from docx import Document
     DOCX_AVAILABLE = True
@@ -70,20 +81,23 @@ except ImportError:
 IS_WINDOWS = platform.system() == "Windows"
 EXE_EXT = ".exe" if IS_WINDOWS else ""
 from report_generators import (
-    generate_bank_statement_reports,
-    generate_gst_return_reports,
-    generate_invoice_reports,
-    generate_purchase_order_reports,
-    generate_salary_slip_reports,
-    generate_profit_loss_reports,
-    generate_trial_balance_reports,
-    generate_balance_sheet_reports,
-    generate_audit_papers_reports,
-    generate_agreement_contract_reports,
     generate_comprehensive_audit_report,
     generate_gst_reports_from_excel
 )
 
+from tasks.pipeline import extract_text_for_file, extract_audit_file, extract_gst_file, generate_reports
+from admission import admission_controller
+import fair_scheduler
+import idempotency
+from uploads import ingest_upload, DOCUMENT_EXTENSIONS, EXCEL_EXTENSIONS
+from workspace import RequestWorkspace
+import upload_sessions
+import archives
+import segmentation
+import result_store
+import webhooks
+import lazy_reports
+
 # Import Tally integration
 try:
     from tally_integration import export_to_tally_xml, TallyXMLGenerator
@@ -154,10 +168,20 @@ def get_cache_key(prompt: str, require_json: bool = False) -> str:
 # Helper function to generate document cache key from file content
 def get_document_cache_key(file_content: bytes, document_type: Optional[str] = None) -> str:
     """Generate a cache key from file content hash"""
-    file_hash = hashlib.sha256(file_content).hexdigest()
+    return get_document_cache_key_for_hash(hashlib.sha256(file_content).hexdigest(), document_type)
+
+def get_document_cache_key_for_hash(file_hash: str, document_type: Optional[str] = None) -> str:
+    """Generate a cache key from a precomputed SHA-256 (see uploads.ingest_upload)"""
     doc_type_str = document_type or "auto"
     return f"document_cache:{file_hash}:{doc_type_str}"
 
+def stored_result_response(value: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None):
+    """JSON response for a stored result; result_store pointers are streamed from disk"""
+    if result_store.is_pointer(value):
+        return StreamingResponse(result_store.iter_bytes(value), status_code=status_code,
+                                 media_type="application/json", headers=headers)
+    return JSONResponse(content=value, status_code=status_code, headers=headers)
+
 # Helper function to generate content using Vertex AI
 def generate_content_with_vertexai(prompt: str, require_json: bool = False, max_retries: int = 3, use_cache: bool = True):
     """
@@ -496,6 +520,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def start_job_backend():
+    """Pick the job backend when serving (fails local jobs orphaned by a previous server)"""
+    get_job_backend()
+
+@app.on_event("shutdown")
+def shutdown_job_backend():
+    """Stop the local job pool's worker processes (no-op on Celery)"""
+    job_backends.shutdown_job_backend()
+
+@app.on_event("shutdown")
+async def close_database_pools():
+    """Close the sync and async database pools"""
+    if DATABASE_AVAILABLE and database:
+        await database.close_pools()
+
 # Add logging middleware to see all requests
 import logging
 logging.basicConfig(
@@ -533,6 +573,10 @@ async def log_requests(request, call_next):
 
 def extract_text_from_pdf(file_path):
     """Extract text from PDF using OCR"""
+    return "".join(extract_pages_from_pdf(file_path))
+
+def extract_pages_from_pdf(file_path):
+    """OCR a PDF and return one text string per page (used for segmentation)"""
     try:
         # Try to get poppler path from environment
         poppler_path = os.getenv("POPPLER_PATH")
@@ -579,7 +623,7 @@ def extract_text_from_pdf(file_path):
             # Try default (assumes poppler is in PATH)
             pages = convert_from_path(file_path)
         
-        text = ""
+        page_texts = []
         tesseract_errors = []
         for i, page in enumerate(pages):
             try:
@@ -595,10 +639,9 @@ def extract_text_from_pdf(file_path):
                         )
                 
                 page_text = pytesseract.image_to_string(page)
-                if page_text.strip():
-                    text += page_text
-                else:
+                if not page_text.strip():
                     print(f"Warning: Page {i+1} returned empty text from OCR")
+                page_texts.append(page_text)
             except HTTPException:
                 raise
             except Exception as tesseract_error:
@@ -606,8 +649,9 @@ def extract_text_from_pdf(file_path):
                 tesseract_errors.append(f"Page {i+1}: {error_msg}")
                 print(f"Warning: Tesseract OCR failed for page {i+1}: {error_msg}")
                 # Continue processing other pages
+                page_texts.append("")
         
-        if not text.strip():
+        if not "".join(page_texts).strip():
             error_detail = "No text could be extracted from the PDF."
             if tesseract_errors:
                 error_detail += f" Tesseract errors: {'; '.join(tesseract_errors[:3])}"
@@ -619,7 +663,7 @@ def extract_text_from_pdf(file_path):
                 detail=error_detail
             )
         
-        return text
+        return page_texts
     except HTTPException:
         raise
     except Exception as e:
@@ -1312,13 +1356,6 @@ OCR Text:
         deposit_withdrawal_ratio = (total_deposits / total_withdrawals) if total_withdrawals > 0 else 0
         
         # Add dashboard-ready structure
-        # Generate all required reports for Bank Statement
-        try:
-            reports = generate_bank_statement_reports(result, text)
-            result["reports"] = reports
-        except Exception as e:
-            result["reports"] = {"error": f"Could not generate reports: {str(e)}"}
-        
         # Keep dashboard for backward compatibility
         result["dashboard"] = {
             "tables": {
@@ -1551,13 +1588,6 @@ OCR Text:
             "requires_multiple_pdfs": False
         }
         
-        # Generate all required reports for Trial Balance
-        try:
-            reports = generate_trial_balance_reports(result, text)
-            result["reports"] = reports
-        except Exception as e:
-            result["reports"] = {"error": f"Could not generate reports: {str(e)}"}
-        
         return result
     except HTTPException:
         # Re-raise HTTPExceptions as-is (they already have proper status codes and messages)
@@ -1727,13 +1757,6 @@ OCR Text:
             "requires_multiple_pdfs": True
         }
         
-        # Generate all required reports for Profit & Loss
-        try:
-            reports = generate_profit_loss_reports(result, text)
-            result["reports"] = reports
-        except Exception as e:
-            result["reports"] = {"error": f"Could not generate reports: {str(e)}"}
-        
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting profit & loss: {str(e)}")
@@ -1973,13 +1996,6 @@ OCR Text:
             "requires_multiple_pdfs": False
         }
         
-        # Generate all required reports for Purchase Order
-        try:
-            reports = generate_purchase_order_reports(result, text)
-            result["reports"] = reports
-        except Exception as e:
-            result["reports"] = {"error": f"Could not generate reports: {str(e)}"}
-        
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting purchase order: {str(e)}")
@@ -2118,13 +2134,6 @@ OCR Text:
             "requires_multiple_pdfs": True
         }
         
-        # Generate all required reports for Salary Slip
-        try:
-            reports = generate_salary_slip_reports(result, text)
-            result["reports"] = reports
-        except Exception as e:
-            result["reports"] = {"error": f"Could not generate reports: {str(e)}"}
-        
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting salary slip: {str(e)}")
@@ -2285,13 +2294,6 @@ OCR Text:
             "requires_multiple_pdfs": False
         }
         
-        # Generate all required reports for Balance Sheet
-        try:
-            reports = generate_balance_sheet_reports(result, text)
-            result["reports"] = reports
-        except Exception as e:
-            result["reports"] = {"error": f"Could not generate reports: {str(e)}"}
-        
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting balance sheet: {str(e)}")
@@ -2324,13 +2326,6 @@ OCR Text:
         response_text = generate_content_with_vertexai(prompt, require_json=True)
         result = json.loads(response_text)
         
-        # Generate all required reports for Audit Papers
-        try:
-            reports = generate_audit_papers_reports(result, text)
-            result["reports"] = reports
-        except Exception as e:
-            result["reports"] = {"error": f"Could not generate reports: {str(e)}"}
-        
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting audit papers: {str(e)}")
@@ -2366,13 +2361,6 @@ OCR Text:
         response_text = generate_content_with_vertexai(prompt, require_json=True)
         result = json.loads(response_text)
         
-        # Generate all required reports for Agreement/Contract
-        try:
-            reports = generate_agreement_contract_reports(result, text)
-            result["reports"] = reports
-        except Exception as e:
-            result["reports"] = {"error": f"Could not generate reports: {str(e)}"}
-        
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error extracting agreement/contract: {str(e)}")
@@ -2381,8 +2369,279 @@ OCR Text:
 # MAIN PROCESSING ROUTE
 # ------------------------------
 
+def raise_overloaded(reason: str):
+    """Reject a request that failed admission control with 429 and Retry-After"""
+    admission_controller.record_rejected()
+    if reason == "user":
+        detail = "Too many documents are already processing for this user. Please retry shortly."
+    elif reason == "queue":
+        detail = "The processing queue is full. Please retry shortly."
+    else:
+        detail = "The server is at processing capacity. Please retry shortly."
+    raise HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(admission_controller.retry_after_seconds)}
+    )
+
+async def record_document_outcome(filename: str, file_type: str, file_size: int, document_type: Optional[str],
+                            started_at: datetime, user_id: Optional[str], user_email: Optional[str],
+                            processing_time_ms: Optional[int] = None, result: Optional[Dict[str, Any]] = None,
+                            error_message: Optional[str] = None, file_sha256: Optional[str] = None,
+                            document_type_forced: Optional[bool] = None) -> Optional[str]:
+    """
+    Save a processed (or failed) document in one database transaction, on a
+    worker thread so the event loop is not blocked
+    
+    Returns the new document_id, or None when the database is not configured,
+    no user was given, or the save failed (processing results are still returned).
+    """
+    if not (DATABASE_AVAILABLE and database):
+        return None
+    if not (user_email or user_id):
+        print("⚠️ Database: Skipping save - no user_email/user_id provided")
+        return None
+    loop = asyncio.get_event_loop()
+    try:
+        ids = await loop.run_in_executor(None, lambda: database.record_document_lifecycle(
+            original_filename=filename,
+            file_type=file_type,
+            file_size=file_size,
+            document_type=document_type,
+            started_at=started_at,
+            user_id=None if user_email else user_id,
+            user_email=user_email,
+            extracted_data=result,
+            insights=(result or {}).get('insights') or None,
+            summary_stats=(result or {}).get('summary_stats') or None,
+            anomalies=(result or {}).get('anomalies') or None,
+            processing_time_ms=processing_time_ms,
+            error_message=error_message,
+            file_sha256=file_sha256,
+            document_type_forced=document_type_forced
+        ))
+    except Exception as e:
+        print(f"❌ Error: Could not save processing results to database: {str(e)}")
+        return None
+    if ids.get("duplicate"):
+        return ids["document_id"]
+    status = "failed" if error_message is not None else "completed"
+    print(f"✓ Database: Document {ids['document_id']} saved ({status}) for user {ids['user_id']}")
+    return ids["document_id"]
+
+
+def cached_result_covers(value: Any, reports: Optional[str]) -> bool:
+    """Whether a document cache entry has every report the reports= selection asks for"""
+    source = (value.get("summary") or {}) if result_store.is_pointer(value) else value
+    return lazy_reports.selection_covered(reports, source.get("pending_reports") or {})
+
+
+async def load_processed_document(file_sha256: str, user_id: Optional[str], user_email: Optional[str],
+                                  document_type: Optional[str], reports: Optional[str] = None) -> Optional[tuple]:
+    """
+    (document_id, result) of the same file already processed for this user,
+    or None (no database, no user, not found)
+    
+    Reports the reports= selection asks for that were left pending are
+    generated now (from the stored data, without OCR text, as on first
+    access); the rest are listed in "pending_reports" again.
+    
+    Raises:
+        HTTPException: 400 if reports names a report the stored type lacks
+    """
+    if not (DATABASE_AVAILABLE and database) or not (user_email or user_id):
+        return None
+    if document_type:
+        document_type = document_type.lower().replace(" ", "_").replace("-", "_")
+    loop = asyncio.get_event_loop()
+    try:
+        stored = await loop.run_in_executor(None, lambda: database.get_result_by_sha256(
+            file_sha256, user_id=None if user_email else user_id, user_email=user_email, document_type=document_type
+        ))
+    except Exception as e:
+        print(f"Database dedup check error (continuing with processing): {str(e)}")
+        return None
+    if stored is None:
+        return None
+    result = stored["result"]
+    report_type = lazy_reports.canonical_type(stored["document_type"])
+    try:
+        selection = lazy_reports.parse_selection(reports, report_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if selection is not None and not (REDIS_AVAILABLE and redis_client):
+        selection = None
+    generated = dict(result.get("reports") or {})
+    missing = [name for name in lazy_reports.available_reports(report_type)
+               if name not in generated and (selection is None or name in selection)]
+    if missing and REDIS_AVAILABLE and redis_client:
+        # Reports generated on first access after processing are only in Redis
+        for name in missing:
+            try:
+                cached = lazy_reports.get_cached(redis_client, stored["document_id"], name)
+            except Exception:
+                cached = None
+            if cached is not None:
+                generated[name] = cached
+        missing = [name for name in missing if name not in generated]
+    if any(lazy_reports.needs_text(report_type, name) for name in missing):
+        # The OCR text is not stored, so these need the document processed again
+        print(f"Stored document {stored['document_id']} lacks the text for reports {', '.join(missing)}; reprocessing")
+        return None
+    if missing:
+        print(f"Generating reports {', '.join(missing)} for stored document {stored['document_id']}")
+        extracted = {key: value for key, value in result.items() if key not in ("reports", "pending_reports")}
+        fresh = await loop.run_in_executor(None, generate_reports, extracted, "", report_type, set(missing))
+        generated.update(fresh)
+        for name, report in fresh.items():
+            await loop.run_in_executor(None, persist_report, stored["document_id"], name, report)
+    result["reports"] = generated
+    pending = [name for name in lazy_reports.available_reports(report_type) if name not in generated]
+    if pending:
+        result["document_id"] = stored["document_id"]
+        result["pending_reports"] = {
+            name: lazy_reports.report_url(stored["document_id"], name) for name in pending
+        }
+    return stored["document_id"], result
+
+
+def job_queue_has_capacity() -> bool:
+    """True if the active job backend can take another single-document job"""
+    depth = get_job_backend().queue_depth()
+    if depth is not None:
+        return depth < admission_controller.max_queue_depth
+    return admission_controller.queue_has_capacity(redis_client)
+
+def queue_document_job(content: Optional[bytes], filename: str, document_type: Optional[str],
+                       tenant: str, lane: str = "interactive", file_hash: Optional[str] = None,
+                       stored_path: Optional[str] = None, webhook: Optional[Dict[str, str]] = None) -> str:
+    """
+    Queue a document on the job backend, through the fair scheduler when enabled
+    
+    Pass stored_path (with file_hash) instead of content for files already in
+    the content store; the pipeline then reads them by path. webhook (from
+    resolve_webhook) is called back when the job finishes.
+    """
+    fair = (get_job_backend().supports_fair_scheduling and fair_scheduler.fair_scheduling_enabled()
+            and REDIS_AVAILABLE and redis_client)
+    if not fair:
+        return get_job_backend().submit_document(content, filename, document_type, file_hash=file_hash,
+                                           stored_path=stored_path, webhook=webhook)
+
+    from tasks.document_processing import prepare_document_job, prepare_stored_document_job
+    from tasks.pipeline import estimate_page_count
+
+    if stored_path:
+        context = prepare_stored_document_job(stored_path, filename, document_type, file_hash)
+    else:
+        context = prepare_document_job(content, filename, document_type,
+                                       upload_ttl=fair_scheduler.QUEUED_UPLOAD_TTL, file_hash=file_hash)
+    context["webhook"] = webhook
+    page_count = estimate_page_count(stored_path or content, filename)
+    fair_scheduler.get_scheduler(redis_client).submit(tenant, context, lane=lane, page_count=page_count)
+    print(f"✓ Fair queue: {filename} ({page_count} pages) → {lane} lane for {tenant}")
+    return context["job_id"]
+
+async def attach_to_idempotent_request(idem_key: str, record: Dict[str, Any]) -> Optional[JSONResponse]:
+    """
+    Answer a retried request from the original request's idempotency record
+    
+    Returns None when the original failed (or its result or queued job is
+    gone) and this request has taken over the key and should process the
+    document itself.
+    """
+    if record.get("status") == idempotency.STATUS_IN_FLIGHT:
+        print(f"Idempotency: attaching to in-flight request ({idem_key[:24]}...)")
+        record = await idempotency.wait_for_completion(redis_client, idem_key)
+        if record is None:
+            # Timed out or released: the original may still have finished just now
+            record = claim_or_conflict(idem_key)
+            if record is None:
+                return None
+    
+    # A record that cannot be replayed is taken over once; if another request
+    # completed or queued it in the meantime, that record is answered instead
+    for attempt in range(2):
+        if record.get("status") == idempotency.STATUS_QUEUED:
+            loop = asyncio.get_event_loop()
+            job = await loop.run_in_executor(None, archives.job_snapshot, get_job_backend(), record.get("job_id"))
+            # Both job backends show a job as processing from submission on, so
+            # pending means the job id is unknown (expired or lost)
+            if job["status"] in ("failed", "pending") or (
+                    job["status"] == "completed" and not result_store.exists(job.get("result"))):
+                print(f"Idempotency: queued job {record.get('job_id')} is {job['status']}; processing again")
+            else:
+                return JSONResponse(
+                    status_code=202,
+                    content={
+                        "job_id": record.get("job_id"),
+                        "status": "queued",
+                        "message": "This request was already queued. Use /job/{job_id}/status to check progress."
+                    },
+                    headers={"Idempotent-Replayed": "true"}
+                )
+        else:
+            result = idempotency.load_result(redis_client, record, database if DATABASE_AVAILABLE else None)
+            if result is not None:
+                print(f"Idempotency: replaying completed request ({idem_key[:24]}...)")
+                return stored_result_response(result, headers={"Idempotent-Replayed": "true"})
+            # Stored result is gone (cache evicted, no database row): recompute
+        if attempt:
+            break
+        idempotency.release(redis_client, idem_key)
+        record = claim_or_conflict(idem_key)
+        if record is None:
+            return None
+    # Taken over and replaced by another unreplayable record again: let the client retry
+    raise_idempotency_conflict()
+
+def claim_or_conflict(idem_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Claim the key for this request
+
+    Returns:
+        None if this request now owns it, else the completed or queued record
+        that another request left there
+
+    Raises:
+        HTTPException: 409 if another request is processing it
+    """
+    record = idempotency.claim(redis_client, idem_key)
+    if record is not None and record.get("status") == idempotency.STATUS_IN_FLIGHT:
+        raise_idempotency_conflict()
+    return record
+
+def raise_idempotency_conflict():
+    raise HTTPException(
+        status_code=409,
+        detail="An identical request is still being processed. Please retry shortly.",
+        headers={"Retry-After": str(admission_controller.retry_after_seconds)}
+    )
+
+def admission_key(request: Request, user_id: Optional[str] = None, user_email: Optional[str] = None) -> str:
+    """Identify the caller for per-user in-flight limits"""
+    if user_email:
+        return f"email:{user_email.lower()}"
+    if user_id:
+        return f"user:{user_id}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+def resolve_webhook(request: Request, user_key: str, webhook_url: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """
+    The webhook a new job reports to (webhook_url, else the user's registration);
+    a webhook_url for a registered user needs its X-Webhook-Secret header
+    """
+    try:
+        return webhooks.resolve(redis_client if REDIS_AVAILABLE else None, user_key, webhook_url,
+                                request.headers.get("X-Webhook-Secret"))
+    except webhooks.WebhookAuthError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/process-audit")
 async def process_audit_files(
+    request: Request,
     files: List[UploadFile] = File(...),
     document_type: Optional[str] = Form("audit")
 ):
@@ -2392,9 +2651,6 @@ async def process_audit_files(
     - Max file size per file: 50MB
     - Allowed file types: PDF, DOCX, DOC, XLSX, XLS, JPG, JPEG, PNG
     """
-    MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
-    ALLOWED_EXTENSIONS = {'.pdf', '.docx', '.doc', '.xlsx', '.xls', '.jpg', '.jpeg', '.png'}
-    
     print(f"\n{'='*60}")
     print(f"POST /process-audit - Processing {len(files) if files else 0} files for audit report")
     print(f"{'='*60}\n")
@@ -2402,128 +2658,30 @@ async def process_audit_files(
     if not files or len(files) == 0:
         raise HTTPException(status_code=400, detail="At least one file is required for audit report")
     
-    temp_files = {}
+    user_key = admission_key(request)
+    rejection = admission_controller.try_acquire(user_key)
+    if rejection:
+        raise_overloaded(rejection)
+    
+    workspace = RequestWorkspace("audit")
     extracted_texts = {}
     
     try:
-        import tempfile
-        temp_dir = tempfile.gettempdir()
-        
         # Process each file
         for file in files:
             if not file.filename:
                 continue
             
-            # Validate file extension
-            file_extension = os.path.splitext(file.filename)[1].lower()
-            if file_extension not in ALLOWED_EXTENSIONS:
-                allowed_types_str = ', '.join(sorted([ext.upper() for ext in ALLOWED_EXTENSIONS]))
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File '{file.filename}' has unsupported type '{file_extension}'. Allowed types: {allowed_types_str}"
-                )
-                
             print(f"Processing file: {file.filename}")
-            # Sanitize filename for filesystem
-            safe_filename = file.filename.replace("/", "_").replace("\\", "_")
-            temp_file_path = os.path.join(temp_dir, f"finsight_audit_{os.getpid()}_{safe_filename}")
-            
-            # Read and validate file size
-            content = b""
-            total_size = 0
-            chunk_size = 1024 * 1024  # 1MB chunks
+            upload = await ingest_upload(file, DOCUMENT_EXTENSIONS, dest_dir=workspace.root)
+            print(f"Saved to: {upload.path}")
             
-            while True:
-                chunk = await file.read(chunk_size)
-                if not chunk:
-                    break
-                total_size += len(chunk)
-                if total_size > MAX_FILE_SIZE:
-                    raise HTTPException(
-                        status_code=413,
-                        detail=f"File '{file.filename}' size ({total_size / (1024*1024):.2f}MB) exceeds maximum allowed size of 50MB."
-                    )
-                content += chunk
-            
-            if total_size == 0:
-                raise HTTPException(status_code=400, detail=f"File '{file.filename}' is empty.")
-            
-            print(f"✓ File validated: {file.filename} ({total_size / (1024*1024):.2f}MB)")
-            print(f"Read {len(content)} bytes from {file.filename}")
-            with open(temp_file_path, "wb") as temp:
-                temp.write(content)
-            temp_files[file.filename] = temp_file_path
-            print(f"Saved to: {temp_file_path}")
-            
-            # Extract text
+            # Extract text and map filename to document type
             print(f"Extracting text from {file.filename}...")
-            try:
-                if file.filename.lower().endswith(".pdf"):
-                    text = extract_text_from_pdf(temp_file_path)
-                elif file.filename.lower().endswith((".docx", ".doc")):
-                    text = extract_text_from_docx(temp_file_path)
-                elif file.filename.lower().endswith((".jpg", ".jpeg", ".png")):
-                    text = extract_text_from_image(temp_file_path)
-                else:
-                    # Try to read as text file
-                    with open(temp_file_path, "r", encoding="utf-8", errors="ignore") as f:
-                        text = f.read()
-            except Exception as extract_error:
-                print(f"Error extracting text from {file.filename}: {str(extract_error)}")
-                text = f"Error extracting text: {str(extract_error)}"
-            
-            # Map filename to document type based on field name or filename
-            filename_lower = file.filename.lower()
-            doc_type = "unknown"
-            
-            # Check field name if available (from form data)
-            if hasattr(file, 'field_name'):
-                field_name = file.field_name.lower()
-                if "trial" in field_name or "balance" in field_name:
-                    doc_type = "trial_balance"
-                elif "profit" in field_name or "loss" in field_name:
-                    doc_type = "profit_loss"
-                elif "balance" in field_name and "sheet" in field_name:
-                    doc_type = "balance_sheet"
-                elif "ledger" in field_name:
-                    doc_type = "general_ledger"
-                elif "cash" in field_name:
-                    doc_type = "cash_book"
-                elif "bank" in field_name:
-                    doc_type = "bank_statement"
-                elif "asset" in field_name or "fixed" in field_name:
-                    doc_type = "fixed_asset_register"
-                elif "gst" in field_name:
-                    doc_type = "gst_returns"
-                elif "tds" in field_name:
-                    doc_type = "tds_summary"
-            
-            # Fallback to filename analysis
-            if doc_type == "unknown":
-                if "trial" in filename_lower or ("balance" in filename_lower and "sheet" not in filename_lower):
-                    doc_type = "trial_balance"
-                elif "profit" in filename_lower or "loss" in filename_lower or "p&l" in filename_lower or "p_l" in filename_lower:
-                    doc_type = "profit_loss"
-                elif "balance" in filename_lower and "sheet" in filename_lower:
-                    doc_type = "balance_sheet"
-                elif "ledger" in filename_lower:
-                    doc_type = "general_ledger"
-                elif "cash" in filename_lower:
-                    doc_type = "cash_book"
-                elif "bank" in filename_lower:
-                    doc_type = "bank_statement"
-                elif "asset" in filename_lower or "fixed" in filename_lower:
-                    doc_type = "fixed_asset_register"
-                elif "gst" in filename_lower:
-                    doc_type = "gst_returns"
-                elif "tds" in filename_lower:
-                    doc_type = "tds_summary"
-            
-            extracted_texts[doc_type] = {
-                "filename": file.filename,
-                "text": text,
-                "type": doc_type
-            }
+            extracted = extract_audit_file(upload.path, file.filename)
+            text = extracted["text"]
+            doc_type = extracted["type"]
+            extracted_texts[doc_type] = extracted
             print(f"Extracted {len(text)} characters from {file.filename} (type: {doc_type})")
         
         print(f"\nExtracted texts from {len(extracted_texts)} documents")
@@ -2550,17 +2708,13 @@ async def process_audit_files(
         raise HTTPException(status_code=500, detail=f"Error processing audit files: {str(e)}")
     
     finally:
-        # Clean up temporary files
-        for temp_path in temp_files.values():
-            if os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                    print(f"Cleaned up: {temp_path}")
-                except Exception as cleanup_error:
-                    print(f"Warning: Could not delete {temp_path}: {cleanup_error}")
+        admission_controller.release(user_key)
+        # Clean up the request workspace
+        workspace.cleanup()
 
 @app.post("/process-gst")
 async def process_gst_files(
+    request: Request,
     files: List[UploadFile] = File(...),
     document_type: Optional[str] = Form("gst_return")
 ):
@@ -2570,9 +2724,6 @@ async def process_gst_files(
     - Max file size per file: 50MB
     - Only Excel files allowed: .xlsx, .xls
     """
-    MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
-    ALLOWED_EXTENSIONS = {'.xlsx', '.xls'}
-    
     print(f"\n{'='*60}")
     print(f"POST /process-gst - Processing {len(files) if files else 0} Excel files for GST reports")
     print(f"{'='*60}\n")
@@ -2580,95 +2731,37 @@ async def process_gst_files(
     if not files or len(files) == 0:
         raise HTTPException(status_code=400, detail="At least one Excel file is required for GST reports")
     
-    temp_files = {}
+    user_key = admission_key(request)
+    rejection = admission_controller.try_acquire(user_key)
+    if rejection:
+        raise_overloaded(rejection)
+    
+    workspace = RequestWorkspace("gst")
     excel_data_dict = {}
     
     try:
-        import tempfile
-        temp_dir = tempfile.gettempdir()
-        
         # Process each Excel file
         for file in files:
             if not file.filename:
                 continue
             
-            # Validate file extension (only Excel files)
-            file_extension = os.path.splitext(file.filename)[1].lower()
-            if file_extension not in ALLOWED_EXTENSIONS:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File '{file.filename}' is not an Excel file. Only .xlsx and .xls files are allowed for GST processing."
-                )
-            
             print(f"Processing Excel file: {file.filename}")
-            safe_filename = file.filename.replace("/", "_").replace("\\", "_")
-            temp_file_path = os.path.join(temp_dir, f"finsight_gst_{os.getpid()}_{safe_filename}")
-            
-            # Read and validate file size
-            content = b""
-            total_size = 0
-            chunk_size = 1024 * 1024  # 1MB chunks
-            
-            while True:
-                chunk = await file.read(chunk_size)
-                if not chunk:
-                    break
-                total_size += len(chunk)
-                if total_size > MAX_FILE_SIZE:
-                    raise HTTPException(
-                        status_code=413,
-                        detail=f"File '{file.filename}' size ({total_size / (1024*1024):.2f}MB) exceeds maximum allowed size of 50MB."
-                    )
-                content += chunk
-            
-            if total_size == 0:
-                raise HTTPException(status_code=400, detail=f"File '{file.filename}' is empty.")
-            
-            print(f"✓ File validated: {file.filename} ({total_size / (1024*1024):.2f}MB)")
-            print(f"Read {len(content)} bytes from {file.filename}")
-            with open(temp_file_path, "wb") as temp:
-                temp.write(content)
-            temp_files[file.filename] = temp_file_path
-            print(f"Saved to: {temp_file_path}")
+            upload = await ingest_upload(file, EXCEL_EXTENSIONS, dest_dir=workspace.root)
+            print(f"Saved to: {upload.path}")
             
             # Extract data from Excel
             print(f"Extracting data from {file.filename}...")
-            try:
-                excel_data = extract_data_from_excel(temp_file_path)
-                
-                # Map filename to file type
-                filename_lower = file.filename.lower()
-                file_type = "unknown"
-                
-                if "gstr" in filename_lower or "2b" in filename_lower or "summary" in filename_lower:
-                    file_type = "gstr2b_summary"
-                elif "purchase" in filename_lower or "register" in filename_lower:
-                    file_type = "purchase_register"
-                elif "vendor" in filename_lower or "master" in filename_lower:
-                    file_type = "vendor_master"
-                
-                excel_data_dict[file_type] = excel_data
-                print(f"Extracted data from {file.filename} (type: {file_type})")
-                print(f"  Sheets: {excel_data.get('sheet_names', [])}")
-                
-                # Log sample of actual data extracted
-                excel_data_obj = excel_data.get("excel_data", {})
-                for sheet_name, sheet_info in excel_data_obj.items():
-                    row_count = sheet_info.get("row_count", 0)
-                    columns = sheet_info.get("columns", [])
-                    print(f"  Sheet '{sheet_name}': {row_count} rows, Columns: {columns}")
-                    if sheet_info.get("data"):
-                        print(f"  First row sample: {sheet_info['data'][0] if len(sheet_info['data']) > 0 else 'No data'}")
-                
-            except Exception as extract_error:
-                print(f"Error extracting data from {file.filename}: {str(extract_error)}")
-                import traceback
-                traceback.print_exc()
-                excel_data_dict[file.filename] = {
-                    "error": f"Error extracting data: {str(extract_error)}",
-                    "summary_text": f"Error reading {file.filename}",
-                    "sheet_names": []
-                }
+            extracted = extract_gst_file(upload.path, file.filename)
+            excel_data_dict[extracted["key"]] = extracted["data"]
+            
+            # Log sample of actual data extracted
+            excel_data_obj = extracted["data"].get("excel_data", {})
+            for sheet_name, sheet_info in excel_data_obj.items():
+                row_count = sheet_info.get("row_count", 0)
+                columns = sheet_info.get("columns", [])
+                print(f"  Sheet '{sheet_name}': {row_count} rows, Columns: {columns}")
+                if sheet_info.get("data"):
+                    print(f"  First row sample: {sheet_info['data'][0] if len(sheet_info['data']) > 0 else 'No data'}")
         
         print(f"\nExtracted data from {len(excel_data_dict)} Excel files")
         print(f"File types: {list(excel_data_dict.keys())}")
@@ -2694,21 +2787,136 @@ async def process_gst_files(
         raise HTTPException(status_code=500, detail=f"Error processing GST Excel files: {str(e)}")
     
     finally:
-        # Clean up temporary files
-        for temp_path in temp_files.values():
-            if os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                    print(f"Cleaned up: {temp_path}")
-                except Exception as cleanup_error:
-                    print(f"Warning: Could not delete {temp_path}: {cleanup_error}")
+        admission_controller.release(user_key)
+        # Clean up the request workspace
+        workspace.cleanup()
+
+async def _read_batch_uploads(files: List[UploadFile], allowed_extensions: set,
+                              workspace: RequestWorkspace) -> List[tuple]:
+    """Validate and spool a multi-file upload into (filename, buffer) tuples mapped from workspace"""
+    uploads = []
+    for file in files:
+        if not file.filename:
+            continue
+
+        upload = await ingest_upload(file, allowed_extensions, dest_dir=workspace.root)
+        uploads.append((file.filename, workspace.map(upload.path)))
+    return uploads
+
+
+@app.post("/process-audit/async")
+async def process_audit_files_async(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    document_type: Optional[str] = Form("audit"),
+    user_id: Optional[str] = Form(None),
+    user_email: Optional[str] = Form(None),
+    webhook_url: Optional[str] = Form(None)
+):
+    """
+    Queue an audit pack for parallel processing and return a job ID.
+    Each file is OCR'd on its own worker; the comprehensive audit report is
+    generated once all files are extracted. Poll /job/{job_id}/status, or
+    pass webhook_url to be called back when the report is ready.
+    """
+    if get_job_backend().name != "celery":
+        raise HTTPException(
+            status_code=503,
+            detail="Multi-file jobs need the Celery job queue. Please start Redis and Celery worker."
+        )
+    if not files or len(files) == 0:
+        raise HTTPException(status_code=400, detail="At least one file is required for audit report")
+
+    webhook = resolve_webhook(request, admission_key(request, user_id, user_email), webhook_url)
+
+    if not admission_controller.queue_has_capacity(redis_client):
+        raise_overloaded("queue")
+
+    workspace = RequestWorkspace("audit_async")
+    try:
+        uploads = await _read_batch_uploads(files, DOCUMENT_EXTENSIONS, workspace)
+        from tasks.document_processing import start_files_pipeline, process_audit_files_task
+        job_id = start_files_pipeline(process_audit_files_task, uploads, webhook)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error queueing audit files: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Could not queue audit files for processing: {str(e)}")
+    finally:
+        workspace.cleanup()
+
+    print(f"✓ Queued {len(uploads)} audit files (job: {job_id})")
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job_id,
+            "status": "queued",
+            "message": "Audit processing started. Use /job/{job_id}/status to check progress.",
+            "files": [filename for filename, _ in uploads]
+        }
+    )
+
+@app.post("/process-gst/async")
+async def process_gst_files_async(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    document_type: Optional[str] = Form("gst_return"),
+    user_id: Optional[str] = Form(None),
+    user_email: Optional[str] = Form(None),
+    webhook_url: Optional[str] = Form(None)
+):
+    """
+    Queue GST Excel files for parallel processing and return a job ID.
+    Each file is extracted on its own worker; the GST report is generated
+    once all files are extracted. Poll /job/{job_id}/status, or pass
+    webhook_url to be called back when the report is ready.
+    """
+    if get_job_backend().name != "celery":
+        raise HTTPException(
+            status_code=503,
+            detail="Multi-file jobs need the Celery job queue. Please start Redis and Celery worker."
+        )
+    if not files or len(files) == 0:
+        raise HTTPException(status_code=400, detail="At least one Excel file is required for GST reports")
+
+    webhook = resolve_webhook(request, admission_key(request, user_id, user_email), webhook_url)
+
+    if not admission_controller.queue_has_capacity(redis_client):
+        raise_overloaded("queue")
+
+    workspace = RequestWorkspace("gst_async")
+    try:
+        uploads = await _read_batch_uploads(files, EXCEL_EXTENSIONS, workspace)
+        from tasks.document_processing import start_files_pipeline, process_gst_files_task
+        job_id = start_files_pipeline(process_gst_files_task, uploads, webhook)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error queueing GST files: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Could not queue GST files for processing: {str(e)}")
+    finally:
+        workspace.cleanup()
+
+    print(f"✓ Queued {len(uploads)} GST files (job: {job_id})")
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job_id,
+            "status": "queued",
+            "message": "GST processing started. Use /job/{job_id}/status to check progress.",
+            "files": [filename for filename, _ in uploads]
+        }
+    )
 
 @app.post("/process")
 async def process_file(
+    request: Request,
     file: UploadFile = File(...),
     document_type: Optional[str] = Form(None),
     user_id: Optional[str] = Form(None),
-    user_email: Optional[str] = Form(None)
+    user_email: Optional[str] = Form(None),
+    reports: Optional[str] = Form(None),
+    idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Process document synchronously and return results immediately.
@@ -2722,16 +2930,21 @@ async def process_file(
     Optional parameters:
     - user_id: User ID for database tracking (UUID format)
     - user_email: User email for database tracking
-    """
-    # File validation constants
-    MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB in bytes
-    ALLOWED_EXTENSIONS = {
-        '.pdf', '.docx', '.doc', 
-        '.xlsx', '.xls', 
-        '.jpg', '.jpeg', '.png'
-    }
+    - reports: "all" (default), "none", or comma-separated report names to
+      generate now. The rest are listed in pending_reports and generated on
+      first GET /documents/{document_id}/reports/{report_name}
     
-    # Validate filename
+    Admission control: when the per-user in-flight limit is hit, or the
+    server is at capacity and the async queue is full, responds 429 with
+    Retry-After. At capacity with queue room, the document is diverted to
+    the async pipeline and a 202 with a job_id is returned instead.
+    
+    Idempotency: retries carrying the same Idempotency-Key header (or, without
+    one, the same file, user and document_type) attach to the original
+    request: they wait for it if it is still running, or replay its stored
+    result, instead of processing again and duplicating database rows.
+    """
+    # Validate filename and extension before reading any bytes
     filename = file.filename
     if not filename:
         raise HTTPException(
@@ -2739,10 +2952,9 @@ async def process_file(
             detail="No filename provided. Please ensure the file has a valid name."
         )
     
-    # Validate file extension
     file_extension = os.path.splitext(filename)[1].lower()
-    if file_extension not in ALLOWED_EXTENSIONS:
-        allowed_types_str = ', '.join(sorted([ext.upper() for ext in ALLOWED_EXTENSIONS]))
+    if file_extension not in DOCUMENT_EXTENSIONS:
+        allowed_types_str = ', '.join(sorted([ext.upper() for ext in DOCUMENT_EXTENSIONS]))
         raise HTTPException(
             status_code=400,
             detail=f"File type '{file_extension}' is not supported. Allowed file types: {allowed_types_str}. Please upload a supported file format."
@@ -2754,130 +2966,144 @@ async def process_file(
     print(f"Document type: {document_type}")
     print(f"{'='*60}\n")
     
-    temp_file_path = None
+    workspace = RequestWorkspace("process")
     document_id = None
     processing_start_time = time.time()
-    db_user_id = None
+    processing_started_at = datetime.utcnow()
+    user_key = admission_key(request, user_id, user_email)
+    admitted = False
+    processing = False
+    idem_key = None
+    requested_document_type = document_type
+    
+    if document_type:
+        # Reject bad report names before reading the upload
+        try:
+            lazy_reports.parse_selection(reports, document_type.lower().replace(" ", "_").replace("-", "_"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # Admission control: take the in-flight slot before reading the upload,
+    # so the limits also bound concurrent uploads (a retry that attaches to
+    # an identical request gives it back while it waits)
+    rejection = admission_controller.try_acquire(user_key)
+    admitted = rejection is None
     
     try:
-        # Handle user creation/retrieval if database is available and user info provided
-        if DATABASE_AVAILABLE and database and user_email:
+        # Stream the upload to disk, hashing as it arrives
+        upload = await ingest_upload(file, dest_dir=workspace.root)
+        temp_file_path = upload.path
+        total_size = upload.size
+        
+        # Idempotency: retries attach to the original request before any
+        # work or database writes happen
+        if REDIS_AVAILABLE and redis_client:
+            existing = None
             try:
-                user = database.create_or_get_user(user_email)
-                db_user_id = user.get('user_id') if isinstance(user.get('user_id'), str) else str(user.get('user_id'))
-                print(f"✓ Database: Using user {db_user_id} ({user_email})")
-            except Exception as e:
-                print(f"Warning: Could not create/get user in database: {str(e)}")
-        elif user_id:
-            db_user_id = user_id
-        
-        # Read file content with size validation
-        content = b""
-        total_size = 0
-        chunk_size = 1024 * 1024  # Read in 1MB chunks
-        
-        while True:
-            chunk = await file.read(chunk_size)
-            if not chunk:
-                break
-            total_size += len(chunk)
-            
-            # Check size during read to avoid loading huge files into memory
-            if total_size > MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"File size ({total_size / (1024*1024):.2f}MB) exceeds maximum allowed size of 50MB. Please upload a smaller file."
+                candidate_key = idempotency.idempotency_key(
+                    user_key, idempotency_key_header, upload.sha256, document_type
                 )
+                existing = idempotency.claim(redis_client, candidate_key)
+                idem_key = candidate_key
+            except Exception as e:
+                print(f"Idempotency check error (continuing without it): {str(e)}")
+            if existing:
+                idem_key = None
+                # Waiting on the original request is not processing: free the
+                # slot while attached so retries cannot use up the user's limit
+                if admitted:
+                    admission_controller.release(user_key)
+                    admitted = False
+                replay = await attach_to_idempotent_request(candidate_key, existing)
+                if replay is not None:
+                    return replay
+                idem_key = candidate_key
+                rejection = admission_controller.try_acquire(user_key)
+                admitted = rejection is None
+        
+        # Over a limit: cached results are still served, new work is
+        # diverted to the async queue or rejected
+        if rejection:
+            if REDIS_AVAILABLE and redis_client:
+                try:
+                    doc_cache_key = get_document_cache_key_for_hash(upload.sha256, document_type)
+                    cached_result = result_store.load_cached(redis_client, doc_cache_key)
+                    if cached_result is not None and cached_result_covers(cached_result, reports):
+                        if idem_key:
+                            idempotency.complete(redis_client, idem_key, doc_cache_key, None)
+                            idem_key = None
+                        return stored_result_response(cached_result)
+                except Exception as e:
+                    print(f"Cache check error during admission: {str(e)}")
             
-            content += chunk
-        
-        # Final size validation
-        if total_size == 0:
-            raise HTTPException(
-                status_code=400,
-                detail="File is empty. Please upload a file with content."
-            )
-        
-        if total_size > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File size ({total_size / (1024*1024):.2f}MB) exceeds maximum allowed size of 50MB. Please upload a smaller file."
-            )
-        
-        print(f"✓ File validation passed: {filename} ({total_size / (1024*1024):.2f}MB, {file_extension})")
-        
-        # Save document to database if available
-        if DATABASE_AVAILABLE and database and db_user_id:
-            try:
-                import tempfile
-                temp_dir = tempfile.gettempdir()
-                # Create a storage path (in production, this would be S3 or similar)
-                storage_path = f"uploads/{db_user_id}/{filename}"
-                
-                doc_record = database.create_document(
-                    user_id=db_user_id,
-                    original_filename=filename,
-                    file_type=file.content_type or file_extension,
-                    file_size=total_size,
-                    storage_path=storage_path,
-                    document_type=document_type
+            if (rejection == "global" and admission_controller.divert_to_queue
+                    and job_queue_has_capacity()):
+                job_id = queue_document_job(
+                    workspace.map(upload.path), filename, document_type, user_key,
+                    file_hash=upload.sha256, webhook=resolve_webhook(request, user_key)
                 )
-                document_id = str(doc_record.get('document_id'))
-                print(f"✓ Database: Document record created: {document_id}")
-                
-                # Update status to processing
-                database.update_document_status(document_id, 'processing')
-                
-                # Add processing history
-                database.add_processing_history(
-                    user_id=db_user_id,
-                    document_id=document_id,
-                    action_type='processing_started',
-                    metadata={'filename': filename, 'document_type': document_type}
+                admission_controller.record_diverted()
+                if idem_key:
+                    idempotency.mark_queued(redis_client, idem_key, job_id)
+                    idem_key = None
+                print(f"⚠️ At capacity: diverted {filename} to async pipeline (job: {job_id})")
+                return JSONResponse(
+                    status_code=202,
+                    content={
+                        "job_id": job_id,
+                        "status": "queued",
+                        "diverted": True,
+                        "message": "Server is at capacity; document was queued. Use /job/{job_id}/status to check progress.",
+                        "filename": filename
+                    }
                 )
-            except Exception as e:
-                print(f"Warning: Could not save document to database: {str(e)}")
-                # Continue processing even if database save fails
+            raise_overloaded(rejection)
+        processing = True
         
         # Check cache for complete document processing result
         if REDIS_AVAILABLE and redis_client:
             try:
-                doc_cache_key = get_document_cache_key(content, document_type)
-                cached_result = redis_client.get(doc_cache_key)
-                if cached_result:
+                doc_cache_key = get_document_cache_key_for_hash(upload.sha256, document_type)
+                cached_result = result_store.load_cached(redis_client, doc_cache_key)
+                if cached_result is not None and not cached_result_covers(cached_result, reports):
+                    # Selected reports are still pending: the stored document fills them in below
+                    print(f"✓ CACHE HIT without the selected reports (key: {doc_cache_key[:30]}...)")
+                elif cached_result is not None:
                     print(f"✓ CACHE HIT: Returning cached result for document (key: {doc_cache_key[:30]}...)")
                     print(f"  Document: {filename} | Type: {document_type or 'auto'}")
-                    return JSONResponse(content=json.loads(cached_result))
+                    if idem_key:
+                        idempotency.complete(redis_client, idem_key, doc_cache_key, document_id)
+                        idem_key = None
+                    return stored_result_response(cached_result)
                 else:
                     print(f"✓ CACHE MISS: Processing new document (key: {doc_cache_key[:30]}...)")
             except Exception as e:
                 print(f"Cache check error (continuing with processing): {str(e)}")
         
-        # Save to temporary file
-        import tempfile
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, f"finsight_{filename}")
-        
-        with open(temp_file_path, "wb") as temp:
-            temp.write(content)
+        # Durable dedup: a file this user already processed is served from
+        # the database, and warms the Redis cache, instead of being OCR'd again
+        stored = await load_processed_document(upload.sha256, user_id, user_email, requested_document_type, reports)
+        if stored is not None:
+            stored_document_id, stored_result = stored
+            print(f"✓ DATABASE HIT: Returning stored result of document {stored_document_id} for {filename}")
+            if REDIS_AVAILABLE and redis_client:
+                doc_cache_key = None
+                try:
+                    doc_cache_key = get_document_cache_key_for_hash(upload.sha256, requested_document_type)
+                    cache_ttl = min(604800, lazy_reports.REPORT_CONTEXT_TTL) if "pending_reports" in stored_result else 604800
+                    redis_client.setex(doc_cache_key, cache_ttl, json.dumps(result_store.store(stored_result)))
+                    if idem_key:
+                        idempotency.complete(redis_client, idem_key, doc_cache_key, stored_document_id)
+                        idem_key = None
+                except Exception as e:
+                    print(f"Cache warm error (stored result still returned): {str(e)}")
+            return JSONResponse(content=stored_result)
         
         print(f"File saved to: {temp_file_path}")
         
-        # Extract text
+        # Extract text from the single spooled copy
         print("Extracting text...")
-        text = ""
-        if filename.lower().endswith(".pdf"):
-            text = extract_text_from_pdf(temp_file_path)
-        elif filename.lower().endswith((".docx", ".doc")):
-            text = extract_text_from_docx(temp_file_path)
-        elif filename.lower().endswith((".jpg", ".jpeg", ".png")):
-            text = extract_text_from_image(temp_file_path)
-        elif filename.lower().endswith((".xlsx", ".xls")):
-            excel_data = extract_excel_data(temp_file_path)
-            text = excel_data.get("summary_text", "")
-        else:
-            with open(temp_file_path, "r", encoding="utf-8") as f:
-                text = f.read()
+        text = extract_text_for_file(temp_file_path, filename)
         
         print(f"Text extracted: {len(text)} characters")
         
@@ -2926,143 +3152,71 @@ async def process_file(
                 detail=f"Unsupported document type: {document_type or 'unknown'}. Supported types: bank_statement, gst_return, trial_balance, profit_loss, invoice, purchase_order, salary_slip, balance_sheet, audit_papers, agreement_contract"
             )
         
+        # Generate the selected reports now; the rest wait for first access
+        try:
+            selection = lazy_reports.parse_selection(reports, document_type)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if selection is not None and not (REDIS_AVAILABLE and redis_client):
+            print("⚠️ Redis unavailable: generating all reports (lazy reports need Redis)")
+            selection = None
+        report_type = lazy_reports.canonical_type(document_type)
+        result["reports"] = generate_reports(result, text, report_type, only=selection)
+        pending = [name for name in lazy_reports.available_reports(report_type) if name not in result["reports"]]
+        
         print(f"Processing completed successfully!")
         
-        # Save processing results to database if available
-        processing_end_time = time.time()
-        processing_time_ms = int((processing_end_time - processing_start_time) * 1000)
+        # Save the document, its result, analytics and history in one transaction
+        processing_time_ms = int((time.time() - processing_start_time) * 1000)
+        document_id = await record_document_outcome(
+            filename, file.content_type or file_extension, total_size, document_type, processing_started_at,
+            user_id, user_email, processing_time_ms=processing_time_ms, result=result, file_sha256=upload.sha256,
+            document_type_forced=bool(requested_document_type)
+        )
+        
+        if pending:
+            # Keep the report context so pending reports can be generated later
+            report_document_id = document_id or uuid.uuid4().hex
+            try:
+                lazy_reports.save_context(redis_client, report_document_id, report_type, result, text, result["reports"])
+                result["document_id"] = report_document_id
+                result["pending_reports"] = {
+                    name: lazy_reports.report_url(report_document_id, name) for name in pending
+                }
+            except Exception as e:
+                print(f"Warning: Could not save report context: {str(e)}")
         
-        if DATABASE_AVAILABLE and database:
-            # Try to save even if we don't have document_id (might have failed during creation)
-            if not document_id and db_user_id:
-                print(f"⚠️ Database: Document ID not available, attempting to create document record...")
+        # Cache the result if Redis is available; with pending reports it is
+        # cached with their links, for as long as their report context lives
+        if REDIS_AVAILABLE and redis_client:
+            doc_cache_key = None
+            if not pending or "pending_reports" in result:
                 try:
-                    import tempfile
-                    temp_dir = tempfile.gettempdir()
-                    storage_path = f"uploads/{db_user_id}/{filename}"
-                    
-                    doc_record = database.create_document(
-                        user_id=db_user_id,
-                        original_filename=filename,
-                        file_type=file.content_type or file_extension,
-                        file_size=total_size,
-                        storage_path=storage_path,
-                        document_type=document_type
-                    )
-                    document_id = str(doc_record.get('document_id'))
-                    print(f"✓ Database: Document record created (retry): {document_id}")
+                    # Key on the requested type so identical uploads hit the lookup above
+                    doc_cache_key = get_document_cache_key_for_hash(upload.sha256, requested_document_type)
+                    # Cache for 7 days (604800 seconds) - documents rarely change
+                    cache_ttl = min(604800, lazy_reports.REPORT_CONTEXT_TTL) if pending else 604800
+                    redis_client.setex(doc_cache_key, cache_ttl, json.dumps(result_store.store(result)))
+                    print(f"✓ Cached document result (key: {doc_cache_key[:30]}..., TTL: {cache_ttl}s)")
                 except Exception as e:
-                    print(f"Warning: Could not create document record (retry): {str(e)}")
-            
-            if document_id:
+                    print(f"Cache write error (result still returned): {str(e)}")
+            if idem_key:
                 try:
-                    # Extract insights, summary stats, and anomalies from result
-                    insights = result.get('insights', {})
-                    summary_stats = result.get('summary_stats', {})
-                    anomalies = result.get('anomalies', [])
-                    
-                    # Save processing result
-                    database.save_processing_result(
-                        document_id=document_id,
-                        extracted_data=result,
-                        insights=insights if insights else None,
-                        summary_stats=summary_stats if summary_stats else None,
-                        anomalies=anomalies if anomalies else None,
-                        output_files=None  # Could add file paths here if files are generated
-                    )
-                    
-                    # Update document status to completed
-                    database.update_document_status(document_id, 'completed')
-                    
-                    # Save analytics
-                    database.save_analytics(
-                        user_id=db_user_id,
-                        document_id=document_id,
-                        processing_time_ms=processing_time_ms,
-                        success_rate=100.0,  # If we got here, it was successful
-                        document_type=document_type
-                    )
-                    
-                    # Add processing history
-                    database.add_processing_history(
-                        user_id=db_user_id,
-                        document_id=document_id,
-                        action_type='processing_completed',
-                        metadata={'processing_time_ms': processing_time_ms}
-                    )
-                    
-                    print(f"✓ Database: Processing results saved for document {document_id}")
+                    idempotency.complete(redis_client, idem_key, doc_cache_key, document_id)
+                    idem_key = None
                 except Exception as e:
-                    print(f"❌ Error: Could not save processing results to database: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-                    # Continue even if database save fails
-            else:
-                print(f"⚠️ Database: Skipping save - no document_id available (user_email/user_id may not have been provided)")
-            try:
-                # Extract insights, summary stats, and anomalies from result
-                insights = result.get('insights', {})
-                summary_stats = result.get('summary_stats', {})
-                anomalies = result.get('anomalies', [])
-                
-                # Save processing result
-                database.save_processing_result(
-                    document_id=document_id,
-                    extracted_data=result,
-                    insights=insights if insights else None,
-                    summary_stats=summary_stats if summary_stats else None,
-                    anomalies=anomalies if anomalies else None,
-                    output_files=None  # Could add file paths here if files are generated
-                )
-                
-                # Update document status to completed
-                database.update_document_status(document_id, 'completed')
-                
-                # Save analytics
-                database.save_analytics(
-                    user_id=db_user_id,
-                    document_id=document_id,
-                    processing_time_ms=processing_time_ms,
-                    success_rate=100.0,  # If we got here, it was successful
-                    document_type=document_type
-                )
-                
-                # Add processing history
-                database.add_processing_history(
-                    user_id=db_user_id,
-                    document_id=document_id,
-                    action_type='processing_completed',
-                    metadata={'processing_time_ms': processing_time_ms}
-                )
-                
-                print(f"✓ Database: Processing results saved for document {document_id}")
-            except Exception as e:
-                print(f"❌ Error: Could not save processing results to database: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                # Continue even if database save fails
-            else:
-                print(f"⚠️ Database: Skipping save - no document_id available (user_email/user_id may not have been provided)")
-        
-        # Cache the complete result if Redis is available
-        if REDIS_AVAILABLE and redis_client:
-            try:
-                doc_cache_key = get_document_cache_key(content, document_type)
-                # Cache for 7 days (604800 seconds) - documents rarely change
-                redis_client.setex(doc_cache_key, 604800, json.dumps(result))
-                print(f"✓ Cached complete document result (key: {doc_cache_key[:30]}..., TTL: 7 days)")
-            except Exception as e:
-                print(f"Cache write error (result still returned): {str(e)}")
+                    print(f"Warning: Could not record idempotent result: {str(e)}")
         
         return JSONResponse(content=result)
     
-    except HTTPException:
-        # Update document status to failed if we have a document_id
-        if DATABASE_AVAILABLE and database and document_id:
-            try:
-                database.update_document_status(document_id, 'failed', error_message="HTTP Exception during processing")
-            except Exception as db_err:
-                print(f"Warning: Could not update document status in database: {str(db_err)}")
+    except HTTPException as e:
+        # Record the failed document if processing had started
+        if processing and document_id is None:
+            await record_document_outcome(
+                filename, file.content_type or file_extension, total_size, document_type, processing_started_at,
+                user_id, user_email, error_message=str(e.detail)[:500], file_sha256=upload.sha256,
+                document_type_forced=bool(requested_document_type)
+            )
         raise
     except Exception as e:
         import traceback
@@ -3070,103 +3224,658 @@ async def process_file(
         print(f"Error processing file: {error_message}")
         traceback.print_exc()
         
-        # Update document status to failed if we have a document_id
-        if DATABASE_AVAILABLE and database and document_id:
-            try:
-                database.update_document_status(document_id, 'failed', error_message=error_message[:500])  # Limit error message length
-            except Exception as db_err:
-                print(f"Warning: Could not update document status in database: {str(db_err)}")
+        # Record the failed document if processing had started
+        if processing and document_id is None:
+            await record_document_outcome(
+                filename, file.content_type or file_extension, total_size, document_type, processing_started_at,
+                user_id, user_email, error_message=error_message[:500],  # Limit error message length
+                file_sha256=upload.sha256, document_type_forced=bool(requested_document_type)
+            )
         
         raise HTTPException(status_code=500, detail=f"Error processing file: {error_message}")
     
     finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
+        if admitted:
+            admission_controller.release(user_key)
+        if idem_key:
+            # Request failed or was rejected: let the next retry start over
+            idempotency.release(redis_client, idem_key)
+        # Remove the request workspace and everything spooled into it
+        workspace.cleanup()
+
+
+@app.post("/process/async")
+async def process_file_async(
+    request: Request,
+    file: UploadFile = File(...),
+    document_type: Optional[str] = Form(None),
+    user_id: Optional[str] = Form(None),
+    user_email: Optional[str] = Form(None),
+    priority: Optional[str] = Form("interactive"),
+    webhook_url: Optional[str] = Form(None),
+    idempotency_key_header: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Queue a document on the job backend and return a job ID.
+    On Celery, OCR, extraction and report generation run on separate worker
+    pools; without Celery/Redis the local process pool runs them in turn.
+    Poll /job/{job_id}/status and fetch /job/{job_id}/result.
+    Cached documents are returned immediately without queueing.
+    
+    With FAIR_SCHEDULING=true the job waits in a per-user sub-queue and is
+    dispatched by fair_scheduler.py. priority is "interactive" (default) or
+    "bulk"; bulk uploads should use "bulk" so they do not delay other users.
+    
+    Retries with the same Idempotency-Key (or same file, user and type)
+    return the original job_id instead of queueing a second job.
+    
+    webhook_url (or the user's registered webhook, see POST /webhooks) is
+    called when the job finishes, so clients need not poll.
+    """
+    lane = (priority or "interactive").lower()
+    if lane not in fair_scheduler.LANES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid priority '{priority}'. Allowed values: {', '.join(fair_scheduler.LANES)}"
+        )
+
+    workspace = RequestWorkspace("process_async")
+    try:
+        return await _queue_single_upload(
+            request, file, document_type, user_id, user_email, lane, idempotency_key_header, workspace, webhook_url
+        )
+    finally:
+        workspace.cleanup()
+
+
+async def _queue_single_upload(request: Request, file: UploadFile, document_type: Optional[str],
+                               user_id: Optional[str], user_email: Optional[str], lane: str,
+                               idempotency_key_header: Optional[str], workspace: RequestWorkspace,
+                               webhook_url: Optional[str] = None):
+    """Body of /process/async; the upload is spooled into workspace and handed off mapped"""
+    webhook = resolve_webhook(request, admission_key(request, user_id, user_email), webhook_url)
+    upload = await ingest_upload(file, dest_dir=workspace.root)
+    filename = upload.filename
+
+    if not job_queue_has_capacity():
+        raise_overloaded("queue")
+
+    if REDIS_AVAILABLE and redis_client:
+        try:
+            doc_cache_key = get_document_cache_key_for_hash(upload.sha256, document_type)
+            cached_result = result_store.load_cached(redis_client, doc_cache_key)
+            if cached_result is not None:
+                print(f"✓ CACHE HIT: Returning cached result for document (key: {doc_cache_key[:30]}...)")
+                return stored_result_response(cached_result)
+        except Exception as e:
+            print(f"Cache check error (continuing with queueing): {str(e)}")
+
+    user_key = admission_key(request, user_id, user_email)
+    idem_key = None
+    if REDIS_AVAILABLE and redis_client:
+        existing = None
+        try:
+            candidate_key = idempotency.idempotency_key(
+                user_key, idempotency_key_header, upload.sha256, document_type
+            )
+            existing = idempotency.claim(redis_client, candidate_key)
+            idem_key = candidate_key
+        except Exception as e:
+            print(f"Idempotency check error (continuing without it): {str(e)}")
+        if existing:
+            idem_key = None
+            replay = await attach_to_idempotent_request(candidate_key, existing)
+            if replay is not None:
+                return replay
+            idem_key = candidate_key
+
+    try:
+        job_id = queue_document_job(
+            workspace.map(upload.path), filename, document_type, user_key, lane,
+            file_hash=upload.sha256, webhook=webhook
+        )
+    except Exception as e:
+        print(f"Error queueing document {filename}: {str(e)}")
+        if idem_key:
+            idempotency.release(redis_client, idem_key)
+        raise HTTPException(status_code=503, detail=f"Could not queue document for processing: {str(e)}")
+
+    if idem_key:
+        idempotency.mark_queued(redis_client, idem_key, job_id)
+
+    print(f"✓ Queued staged pipeline for {filename} (job: {job_id})")
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job_id,
+            "status": "queued",
+            "message": "Document processing started. Use /job/{job_id}/status to check progress.",
+            "filename": filename
+        }
+    )
+
+
+def persist_report(document_id: str, report_name: str, report: Any) -> None:
+    """Save a report generated after processing with the document's result (best effort)"""
+    if not DATABASE_AVAILABLE or not database:
+        return
+    try:
+        database.save_report_section(document_id, report_name, report)
+    except Exception as e:
+        print(f"Warning: Could not save report {report_name} for document {document_id}: {str(e)}")
+
+
+@app.get("/documents/{document_id}/reports/{report_name}")
+async def get_document_report(document_id: str, report_name: str):
+    """
+    One report for a processed document, generated on first access and
+    cached (see lazy_reports.py) and saved with the document's result.
+    Documents saved to the database can be reported on after their Redis
+    context has expired, except for reports built from the OCR text (410).
+    """
+    if not REDIS_AVAILABLE or not redis_client:
+        raise HTTPException(status_code=503, detail="Lazy reports need Redis. Please start Redis.")
+    
+    cached = lazy_reports.get_cached(redis_client, document_id, report_name)
+    if cached is not None:
+        return JSONResponse(content={"document_id": document_id, "report": report_name, "data": cached})
+    
+    context = lazy_reports.load_context(redis_client, document_id)
+    if context is None and DATABASE_AVAILABLE and database:
+        try:
+            document = await database.get_document_async(document_id)
+            # Everything but the other reports, which may be megabytes
+            stored = await database.get_processing_result_async(
+                document_id, columns=["extracted_data"],
+                sections=database.RESULT_SECTION_KEYS + (f"reports.{report_name}",)
+            ) if document else None
+            if stored and stored.get("extracted_data"):
+                extracted = stored["extracted_data"]
+                if isinstance(extracted, str):
+                    extracted = json.loads(extracted)
+                lazy_reports.save_context(redis_client, document_id, document.get("document_type"), extracted, "",
+                                          extracted.get("reports") if isinstance(extracted.get("reports"), dict) else None)
+                context = lazy_reports.load_context(redis_client, document_id)
+        except Exception as e:
+            print(f"Warning: Could not load document {document_id} from database: {str(e)}")
+    if context is None:
+        raise HTTPException(status_code=404, detail=f"Document {document_id} not found or its report context has expired.")
+    
+    if report_name not in lazy_reports.available_reports(context["document_type"]):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown report '{report_name}' for {context['document_type']}. "
+                   f"Available: {', '.join(lazy_reports.available_reports(context['document_type']))}"
+        )
+    
+    loop = asyncio.get_event_loop()
+    try:
+        report = await loop.run_in_executor(
+            None, lazy_reports.generate, redis_client, document_id, report_name, context, persist_report
+        )
+    except lazy_reports.ReportBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "5"})
+    except lazy_reports.ReportUnavailableError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating report {report_name}: {str(e)}")
+    return JSONResponse(content={"document_id": document_id, "report": report_name, "data": report})
+
+
+@app.post("/process/segmented")
+async def process_segmented(
+    request: Request,
+    file: UploadFile = File(...),
+    document_type: Optional[str] = Form(None),
+    user_id: Optional[str] = Form(None),
+    user_email: Optional[str] = Form(None)
+):
+    """
+    Process a PDF that concatenates several documents (e.g. a run of
+    statements or dozens of invoices).
+    
+    Pages are OCR'd individually and split into documents using page-number
+    resets, changing invoice/account/PO/employee numbers and repeated
+    headers (see segmentation.py). Each segment is classified and extracted
+    on its own, in parallel, and returned in page order. Pass document_type
+    to skip per-segment classification when every document is the same kind.
+    Non-PDF files are processed as a single segment.
+    """
+    user_key = admission_key(request, user_id, user_email)
+    rejection = admission_controller.try_acquire(user_key)
+    if rejection:
+        raise_overloaded(rejection)
+
+    workspace = RequestWorkspace("segmented")
+    try:
+        upload = await ingest_upload(file, dest_dir=workspace.root)
+        cache_type = f"segmented_{document_type or 'auto'}"
+        if REDIS_AVAILABLE and redis_client:
             try:
-                os.unlink(temp_file_path)
-                print(f"Cleaned up temporary file: {temp_file_path}")
+                cached_result = result_store.load_cached(
+                    redis_client, get_document_cache_key_for_hash(upload.sha256, cache_type)
+                )
+                if cached_result is not None:
+                    print(f"✓ CACHE HIT: Returning cached segmentation for {upload.filename}")
+                    return stored_result_response(cached_result)
             except Exception as e:
-                print(f"Warning: Could not delete temporary file {temp_file_path}: {e}")
+                print(f"Cache check error (continuing with processing): {str(e)}")
+
+        loop = asyncio.get_event_loop()
+        if upload.extension == ".pdf":
+            pages = await loop.run_in_executor(None, extract_pages_from_pdf, upload.path)
+        else:
+            pages = [await loop.run_in_executor(None, extract_text_for_file, upload.path, upload.filename)]
 
+        segments = segmentation.segment_pages(pages)
+        print(f"✓ Segmented {upload.filename}: {len(pages)} pages → {len(segments)} documents")
+        results = await loop.run_in_executor(
+            None, segmentation.process_segments, pages, segments, document_type
+        )
 
-@app.get("/job/{job_id}/status")
-async def get_job_status(job_id: str):
-    """Get the status of a processing job"""
-    if not CELERY_AVAILABLE or not celery_app:
+        response = {
+            "filename": upload.filename,
+            "page_count": len(pages),
+            "segment_count": len(results),
+            "segments": results
+        }
+        if REDIS_AVAILABLE and redis_client and all(r["status"] == "completed" for r in results):
+            try:
+                redis_client.setex(get_document_cache_key_for_hash(upload.sha256, cache_type), 604800,
+                                  json.dumps(result_store.store(response)))
+            except Exception as e:
+                print(f"Cache write error (result still returned): {str(e)}")
+        return JSONResponse(content=response)
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error processing segmented document: {str(e)}")
+    finally:
+        admission_controller.release(user_key)
+        workspace.cleanup()
+
+
+def _require_upload_sessions():
+    if not REDIS_AVAILABLE or not redis_client:
         raise HTTPException(
             status_code=503,
-            detail="Job queue is not available. Please start Redis and Celery worker."
+            detail="Chunked uploads are not available. Please start Redis."
         )
+
+
+@app.post("/uploads")
+async def create_upload_session(
+    request: Request,
+    filename: str = Form(...),
+    total_size: int = Form(...),
+    chunk_size: Optional[int] = Form(None),
+    sha256: Optional[str] = Form(None),
+    document_type: Optional[str] = Form(None),
+    user_id: Optional[str] = Form(None),
+    user_email: Optional[str] = Form(None)
+):
+    """
+    Start a resumable chunked upload (for files over the 50MB /process limit,
+    up to MAX_CHUNKED_UPLOAD_SIZE, default 500MB).
     
+    Send each chunk with PUT /uploads/{session_id}/chunks/{index} and an
+    X-Chunk-SHA256 header, then call POST /uploads/{session_id}/complete.
+    Pass sha256 (of the whole file) to have the assembled file verified.
+    See upload_sessions.py for the full protocol.
+    """
+    _require_upload_sessions()
+    session = upload_sessions.create_session(
+        redis_client,
+        filename=filename,
+        total_size=total_size,
+        owner=admission_key(request, user_id, user_email),
+        chunk_size=chunk_size,
+        sha256=sha256,
+        document_type=document_type
+    )
+    return JSONResponse(status_code=201, content=upload_sessions.session_status(redis_client, session))
+
+
+@app.put("/uploads/{session_id}/chunks/{index}")
+async def upload_chunk(
+    session_id: str,
+    index: int,
+    request: Request,
+    chunk_sha256: Optional[str] = Header(None, alias="X-Chunk-SHA256")
+):
+    """Receive one chunk as the raw request body; re-sending a chunk replaces it"""
+    _require_upload_sessions()
+    session = upload_sessions.get_session(redis_client, session_id)
+    return await upload_sessions.write_chunk(redis_client, session, index, request.stream(), chunk_sha256)
+
+
+@app.get("/uploads/{session_id}")
+async def get_upload_session(session_id: str):
+    """Received and missing chunks, for resuming an interrupted upload"""
+    _require_upload_sessions()
+    session = upload_sessions.get_session(redis_client, session_id)
+    return upload_sessions.session_status(redis_client, session)
+
+
+@app.delete("/uploads/{session_id}")
+async def abort_upload_session(session_id: str):
+    """Abandon an upload and delete its chunks"""
+    _require_upload_sessions()
+    session = upload_sessions.get_session(redis_client, session_id)
+    upload_sessions.abort_session(redis_client, session)
+    return {"session_id": session_id, "status": "aborted"}
+
+
+@app.post("/uploads/{session_id}/complete")
+async def complete_upload_session(
+    request: Request,
+    session_id: str,
+    priority: Optional[str] = Form("interactive"),
+    webhook_url: Optional[str] = Form(None)
+):
+    """
+    Assemble the chunks and queue the document on the async pipeline.
+    Returns a job_id to poll with /job/{job_id}/status, or the cached result
+    if this exact document was processed before. Safe to retry: a completed
+    session returns its original job_id.
+    """
+    _require_upload_sessions()
+    lane = (priority or "interactive").lower()
+    if lane not in fair_scheduler.LANES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid priority '{priority}'. Allowed values: {', '.join(fair_scheduler.LANES)}"
+        )
+
+    session = upload_sessions.get_session(redis_client, session_id)
+    webhook = resolve_webhook(request, session["owner"], webhook_url)
+    if session.get("job_id"):
+        return JSONResponse(status_code=202, content={
+            "job_id": session["job_id"],
+            "status": "queued",
+            "session_id": session_id,
+            "filename": session["filename"]
+        })
+
+    # Sequential disk I/O over up to MAX_CHUNKED_UPLOAD_SIZE; keep it off the event loop
+    session = await asyncio.get_event_loop().run_in_executor(
+        None, upload_sessions.assemble, redis_client, session
+    )
+    document_type = session.get("document_type")
+
     try:
-        task = celery_app.AsyncResult(job_id)
-        
-        # Safely get task state - use ready() and successful() methods to avoid exceptions
-        task_state = 'PENDING'
-        task_ready = False
-        task_info = {}
-        
-        try:
-            # Check if task is ready (completed, failed, or revoked) - this doesn't throw exceptions
-            task_ready = task.ready()
-            
-            if task_ready:
-                # Task is done - check if successful or failed
-                if task.successful():
-                    task_state = 'SUCCESS'
-                elif task.failed():
-                    task_state = 'FAILURE'
-                else:
-                    # Try to get state, but don't fail if it throws
-                    try:
-                        task_state = task.state
-                    except Exception:
-                        task_state = 'UNKNOWN'
+        doc_cache_key = get_document_cache_key_for_hash(session["sha256"], document_type)
+        cached_result = result_store.load_cached(redis_client, doc_cache_key)
+        if cached_result is not None:
+            print(f"✓ CACHE HIT: Returning cached result for chunked upload (key: {doc_cache_key[:30]}...)")
+            return stored_result_response(cached_result)
+    except Exception as e:
+        print(f"Cache check error (continuing with queueing): {str(e)}")
+
+    if not job_queue_has_capacity():
+        raise_overloaded("queue")
+    if not upload_sessions.claim_dispatch(redis_client, session_id):
+        raise HTTPException(
+            status_code=409,
+            detail="Upload is already being queued. Please retry shortly.",
+            headers={"Retry-After": "2"}
+        )
+
+    try:
+        job_id = queue_document_job(
+            None, session["filename"], document_type, session["owner"], lane,
+            file_hash=session["sha256"], stored_path=session["stored_path"], webhook=webhook
+        )
+    except Exception as e:
+        print(f"Error queueing chunked upload {session_id}: {str(e)}")
+        upload_sessions.release_dispatch(redis_client, session_id)
+        raise HTTPException(status_code=503, detail=f"Could not queue document for processing: {str(e)}")
+    upload_sessions.record_job(redis_client, session, job_id)
+
+    print(f"✓ Queued chunked upload {session['filename']} (job: {job_id})")
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job_id,
+            "status": "queued",
+            "message": "Document processing started. Use /job/{job_id}/status to check progress.",
+            "session_id": session_id,
+            "filename": session["filename"],
+            "sha256": session["sha256"]
+        }
+    )
+
+
+@app.post("/process-archive")
+async def process_archive(
+    request: Request,
+    file: UploadFile = File(...),
+    document_type: Optional[str] = Form(None),
+    user_id: Optional[str] = Form(None),
+    user_email: Optional[str] = Form(None),
+    priority: Optional[str] = Form("bulk"),
+    response_format: Optional[str] = Form("batch"),
+    webhook_url: Optional[str] = Form(None)
+):
+    """
+    Ingest a ZIP of documents (e.g. a month-end pack) in one request.
+    
+    Entries are streamed out of the archive one at a time. Unsupported, empty
+    or corrupt entries are skipped, repeated files are processed once, and
+    documents already in the result cache are answered from it. Everything
+    else is queued on the async pipeline concurrently (priority defaults to
+    "bulk" so packs do not delay interactive uploads).
+    
+    response_format:
+    - "batch" (default): 202 with a batch_id; poll GET /batch/{batch_id} or
+      read GET /batch/{batch_id}/stream
+    - "ndjson": stream one JSON line per document as results arrive
+    """
+    if not REDIS_AVAILABLE or not redis_client:
+        raise HTTPException(
+            status_code=503,
+            detail="Archive batches need Redis. Please start Redis."
+        )
+    lane = (priority or "bulk").lower()
+    if lane not in fair_scheduler.LANES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid priority '{priority}'. Allowed values: {', '.join(fair_scheduler.LANES)}"
+        )
+    response_format = (response_format or "batch").lower()
+    if response_format not in ("batch", "ndjson"):
+        raise HTTPException(status_code=400, detail="response_format must be 'batch' or 'ndjson'.")
+    if not job_queue_has_capacity():
+        raise_overloaded("queue")
+
+    print(f"\n{'='*60}")
+    print(f"POST /process-archive - Processing archive: {file.filename}")
+    print(f"{'='*60}\n")
+
+    user_key = admission_key(request, user_id, user_email)
+    # Called once per queued document as each finishes
+    webhook = resolve_webhook(request, user_key, webhook_url)
+    workspace = RequestWorkspace("archive")
+    try:
+        upload = await ingest_upload(file, archives.ARCHIVE_EXTENSIONS, archives.MAX_ARCHIVE_SIZE, dest_dir=workspace.root)
+        loop = asyncio.get_event_loop()
+        extracted, skipped = await loop.run_in_executor(
+            None, archives.extract_entries, upload.path, workspace
+        )
+
+        # Dedupe within the archive, then against the document cache
+        entries = []
+        to_queue = []
+        first_index_by_hash = {}
+        for item in extracted:
+            entry = {"name": item.filename, "sha256": item.sha256}
+            if item.sha256 in first_index_by_hash:
+                first = first_index_by_hash[item.sha256]
+                entry.update({
+                    "status": archives.ENTRY_DUPLICATE,
+                    "duplicate_of": entries[first]["name"],
+                    "duplicate_of_index": first
+                })
+                entries.append(entry)
+                continue
+            first_index_by_hash[item.sha256] = len(entries)
+            cache_key = get_document_cache_key_for_hash(item.sha256, document_type)
+            # A cache entry whose result file was purged is a miss
+            if result_store.load_cached(redis_client, cache_key) is not None:
+                entry.update({"status": archives.ENTRY_CACHED, "cache_key": cache_key})
             else:
-                # Task is still running or pending - check state safely
-                try:
-                    # For in-progress tasks, try to get state
-                    task_state = task.state
-                    if task_state not in ['PENDING', 'PROCESSING', 'STARTED']:
-                        task_state = 'PENDING'
-                except Exception:
-                    task_state = 'PENDING'
-        except Exception as state_error:
-            print(f"ERROR getting task state for {job_id}: {str(state_error)}")
-            # Default to pending if we can't determine state
-            task_state = 'PENDING'
-            task_ready = False
-        
-        # Safely get task info/meta - only access if task is ready or use safe methods
-        if task_ready:
-            try:
-                # Use get() with propagate=False to safely retrieve result/info
-                task_info_raw = task.get(propagate=False)
-                if isinstance(task_info_raw, dict):
-                    task_info = task_info_raw
-                elif task_info_raw is not None:
-                    task_info = {'result': task_info_raw}
-            except Exception:
-                try:
-                    # Fallback: try to access info directly for failed tasks
-                    if task_state == 'FAILURE':
-                        info = task.info
-                        if isinstance(info, dict):
-                            task_info = info
-                        elif info is not None:
-                            task_info = {'error': str(info)}
-                except Exception:
-                    task_info = {}
-        else:
-            # For non-ready tasks, try to get progress updates
-            try:
-                info = task.info
-                if isinstance(info, dict):
-                    task_info = info
-                elif info is not None and info != 'None':
-                    task_info = {'info': str(info)}
-            except Exception:
-                task_info = {}
+                entry["status"] = archives.ENTRY_QUEUED
+                to_queue.append((entry, item))
+            entries.append(entry)
+        entries.extend({"name": s["name"], "status": archives.ENTRY_SKIPPED, "reason": s["reason"]} for s in skipped)
+
+        if not entries:
+            raise HTTPException(status_code=400, detail="The archive contains no files.")
+
+        # Hand entries to the pipeline concurrently; each upload goes to Redis from its mapped copy
+        job_ids = await asyncio.gather(*[
+            loop.run_in_executor(
+                None, queue_document_job, workspace.map(item.path), os.path.basename(item.filename),
+                document_type, user_key, lane, item.sha256, None, webhook
+            )
+            for _, item in to_queue
+        ])
+        for (entry, _), job_id in zip(to_queue, job_ids):
+            entry["job_id"] = job_id
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error processing archive: {str(e)}")
+    finally:
+        workspace.cleanup()
+
+    batch = archives.create_batch(redis_client, upload.filename, user_key, document_type, entries)
+    counts = {}
+    for entry in entries:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    print(f"✓ Archive {upload.filename}: batch {batch['batch_id']} {counts}")
+
+    if response_format == "ndjson":
+        return StreamingResponse(
+            archives.stream_batch(redis_client, get_job_backend(), batch),
+            media_type="application/x-ndjson",
+            headers={"X-Batch-Id": batch["batch_id"]}
+        )
+    return JSONResponse(
+        status_code=202,
+        content={
+            "batch_id": batch["batch_id"],
+            "status": "queued",
+            "message": "Archive accepted. Use /batch/{batch_id} or /batch/{batch_id}/stream for results.",
+            "archive": upload.filename,
+            "counts": counts,
+            "entries": [
+                {key: value for key, value in entry.items() if key not in ("cache_key", "duplicate_of_index")}
+                for entry in entries
+            ]
+        }
+    )
+
+
+@app.get("/batch/{batch_id}")
+async def get_batch_status(batch_id: str):
+    """Per-document state of an archive batch"""
+    if not REDIS_AVAILABLE or not redis_client:
+        raise HTTPException(
+            status_code=503,
+            detail="Archive batches need Redis. Please start Redis."
+        )
+    batch = archives.load_batch(redis_client, batch_id)
+    loop = asyncio.get_event_loop()
+    status = await loop.run_in_executor(None, archives.batch_status, redis_client, get_job_backend(), batch)
+    return JSONResponse(content=status)
+
+
+@app.get("/batch/{batch_id}/stream")
+async def stream_batch_results(batch_id: str):
+    """NDJSON: one line per document (with its result) as it finishes, then a summary line"""
+    if not REDIS_AVAILABLE or not redis_client:
+        raise HTTPException(
+            status_code=503,
+            detail="Archive batches need Redis. Please start Redis."
+        )
+    batch = archives.load_batch(redis_client, batch_id)
+    return StreamingResponse(archives.stream_batch(redis_client, get_job_backend(), batch), media_type="application/x-ndjson")
+
+
+def _require_webhook_store():
+    if not REDIS_AVAILABLE or not redis_client:
+        raise HTTPException(status_code=503, detail="Webhook registration needs Redis. Please start Redis.")
+
+
+@app.post("/webhooks")
+async def register_webhook(
+    request: Request,
+    url: str = Form(...),
+    user_id: Optional[str] = Form(None),
+    user_email: Optional[str] = Form(None)
+):
+    """
+    Register a webhook called whenever one of this user's jobs finishes.
+    The returned secret signs every delivery (X-FinSight-Signature) and is
+    not shown again. Replacing an existing registration requires its
+    current secret in the X-Webhook-Secret header.
+    """
+    _require_webhook_store()
+    user_key = admission_key(request, user_id, user_email)
+    loop = asyncio.get_event_loop()
+    try:
+        # Resolves the URL's host: off the event loop
+        registration = await loop.run_in_executor(
+            None, webhooks.register, redis_client, user_key, url, request.headers.get("X-Webhook-Secret")
+        )
+    except webhooks.WebhookAuthError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"✓ Webhook registered for {user_key}")
+    return JSONResponse(status_code=201, content={"url": registration["url"], "secret": registration["secret"]})
+
+
+@app.get("/webhooks")
+async def get_webhook(request: Request, user_id: Optional[str] = None, user_email: Optional[str] = None):
+    """The user's registered webhook (without its secret); needs the X-Webhook-Secret header"""
+    _require_webhook_store()
+    registration = webhooks.get_registration(redis_client, admission_key(request, user_id, user_email))
+    if not registration:
+        raise HTTPException(status_code=404, detail="No webhook registered.")
+    try:
+        webhooks.check_secret(registration, request.headers.get("X-Webhook-Secret"))
+    except webhooks.WebhookAuthError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    return {"url": registration["url"], "created_at": registration["created_at"]}
+
+
+@app.delete("/webhooks")
+async def delete_webhook(request: Request, user_id: Optional[str] = None, user_email: Optional[str] = None):
+    """Stop calling back for this user's jobs; needs the X-Webhook-Secret header"""
+    _require_webhook_store()
+    try:
+        deleted = webhooks.unregister(redis_client, admission_key(request, user_id, user_email),
+                                      request.headers.get("X-Webhook-Secret"))
+    except webhooks.WebhookAuthError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if not deleted:
+        raise HTTPException(status_code=404, detail="No webhook registered.")
+    return {"status": "deleted"}
+
+
+@app.get("/job/{job_id}/status")
+async def get_job_status(job_id: str):
+    """Get the status of a processing job (Celery or local job backend)"""
+    try:
+        job = get_job_backend().status(job_id)
+        task_state = job["state"]
+        meta = job["meta"] if isinstance(job["meta"], dict) else {}
         
         if task_state == 'PENDING':
             # Job is waiting to start
@@ -3178,7 +3887,6 @@ async def get_job_status(job_id: str):
             }
         elif task_state == 'PROCESSING':
             # Job is currently being processed
-            meta = task_info if isinstance(task_info, dict) else {}
             response = {
                 'job_id': job_id,
                 'status': 'processing',
@@ -3188,16 +3896,7 @@ async def get_job_status(job_id: str):
             }
         elif task_state == 'SUCCESS':
             # Job completed successfully
-            meta = task_info if isinstance(task_info, dict) else {}
-            # Safely get result
-            try:
-                result = meta.get('result') if isinstance(meta, dict) else None
-                if result is None:
-                    result = task.result if hasattr(task, 'result') else None
-            except Exception as result_error:
-                print(f"WARNING: Error getting task result for {job_id}: {str(result_error)}")
-                result = None
-            
+            result = job["result"]
             response = {
                 'job_id': job_id,
                 'status': 'completed',
@@ -3205,21 +3904,16 @@ async def get_job_status(job_id: str):
                 'progress': 100,
                 'message': 'Processing completed successfully'
             }
-            # Include result if available
-            if result:
+            # Large results stay in the result store: give the summary and where to fetch it
+            if result_store.is_pointer(result):
+                response['result_summary'] = result['summary']
+                response['result_url'] = f"/job/{job_id}/result"
+            elif result:
                 response['result'] = result
         elif task_state == 'FAILURE':
             # Job failed
-            meta = task_info if isinstance(task_info, dict) else {}
-            error_message = "Unknown error"
-            error_type = "UnknownError"
-            
-            if isinstance(meta, dict):
-                error_message = meta.get('error', str(task_info) if task_info else "Unknown error")
-                error_type = meta.get('error_type', 'UnknownError')
-            elif task_info:
-                error_message = str(task_info)
-            
+            error_message = meta.get('error') or "Unknown error"
+            error_type = meta.get('error_type') or 'UnknownError'
             response = {
                 'job_id': job_id,
                 'status': 'failed',
@@ -3255,73 +3949,30 @@ async def get_job_status(job_id: str):
 @app.get("/job/{job_id}/result")
 async def get_job_result(job_id: str):
     """Get the result of a completed processing job"""
-    if not CELERY_AVAILABLE or not celery_app:
-        raise HTTPException(
-            status_code=503,
-            detail="Job queue is not available. Please start Redis and Celery worker."
-        )
-    
     try:
-        task = celery_app.AsyncResult(job_id)
-        
-        # Safely get task state
-        try:
-            task_state = task.state
-        except Exception as state_error:
-            print(f"ERROR getting task state for result {job_id}: {str(state_error)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error accessing task state: {str(state_error)}"
-            )
+        job = get_job_backend().status(job_id)
+        task_state = job["state"]
         
         if task_state == 'PENDING':
             raise HTTPException(status_code=202, detail="Job is still pending")
-        elif task_state == 'PROCESSING':
+        elif task_state in ('PROCESSING', 'STARTED'):
             raise HTTPException(status_code=202, detail="Job is still processing")
         elif task_state == 'FAILURE':
-            try:
-                meta = task.info if task.info else {}
-                if isinstance(meta, dict):
-                    error_msg = meta.get('error', 'Unknown error')
-                else:
-                    error_msg = str(meta) if meta else 'Unknown error'
-            except Exception as e:
-                error_msg = f"Error retrieving failure info: {str(e)}"
+            meta = job["meta"] if isinstance(job["meta"], dict) else {}
+            error_msg = meta.get('error') or 'Unknown error'
             raise HTTPException(
-                    status_code=500,
+                status_code=500,
                 detail=f"Job failed: {error_msg}"
             )
         elif task_state == 'SUCCESS':
-            # Safely get result - try task.result first (most reliable)
-            result = None
-            try:
-                # Get result directly from task (this is the actual return value)
-                result = task.result
-                if result is None:
-                    # Fallback: try getting from task.info meta
-                    try:
-                        task_info = task.info if task.info else {}
-                        if isinstance(task_info, dict):
-                            result = task_info.get('result')
-                    except Exception:
-                        pass
-            except Exception as result_error:
-                print(f"ERROR getting task result for {job_id}: {str(result_error)}")
-                # Try fallback to meta
-                try:
-                    task_info = task.info if task.info else {}
-                    if isinstance(task_info, dict):
-                        result = task_info.get('result')
-                except Exception:
-                    pass
-            
-            if result is None:
+            result = job["result"]
+            if result is None or not result_store.exists(result):
                 raise HTTPException(
                     status_code=404,
                     detail="Job completed but result is not available. The task may have completed but result was not properly stored."
                 )
             
-            return JSONResponse(content=result)
+            return stored_result_response(result)
         else:
             raise HTTPException(status_code=500, detail=f"Unknown job state: {task_state}")
     
@@ -3336,9 +3987,31 @@ async def get_job_result(job_id: str):
 
 @app.get("/health")
 async def health():
-    """Health check endpoint"""
+    """Health check endpoint with current processing load"""
     redis_status = "available" if REDIS_AVAILABLE else "unavailable"
-    return {"status": "healthy", "redis": redis_status}
+    return {
+        "status": "healthy",
+        "redis": redis_status,
+        "job_backend": get_job_backend().name,
+        "database_pools": database.pool_status() if DATABASE_AVAILABLE else None,
+        "load": admission_controller.stats(redis_client if REDIS_AVAILABLE else None)
+    }
+
+@app.get("/metrics")
+async def metrics(top: int = 20):
+    """
+    Database query metrics: per-statement latency histograms, rows and pool
+    wait (top statements by total time), the slow-query log with captured
+    plans, and pool usage
+    """
+    if not DATABASE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Database is not configured")
+    return {
+        "database": {
+            "queries": database.query_metrics.snapshot(top=max(1, min(top, 200))),
+            "pools": database.pool_status()
+        }
+    }
 
 @app.get("/cache/stats")
 async def cache_stats():
@@ -3460,43 +4133,14 @@ async def process_and_export_to_tally(
     
     # First, process the document using existing logic
     # We'll reuse the /process endpoint logic
-    temp_file_path = None
+    workspace = RequestWorkspace("tally")
     
     try:
-        # Read and validate file
-        content = await file.read()
-        filename = file.filename
-        
-        # Validate file size and type (reuse validation logic)
-        MAX_FILE_SIZE = 50 * 1024 * 1024
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=413,
-                detail=f"File size exceeds maximum allowed size of 50MB"
-            )
-        
-        # Save to temporary file
-        import tempfile
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, f"finsight_tally_{filename}")
-        
-        with open(temp_file_path, "wb") as temp:
-            temp.write(content)
+        # Stream the upload into the request workspace with size and type validation
+        upload = await ingest_upload(file, dest_dir=workspace.root)
         
         # Extract text (reuse existing logic)
-        text = ""
-        if filename.lower().endswith(".pdf"):
-            text = extract_text_from_pdf(temp_file_path)
-        elif filename.lower().endswith((".docx", ".doc")):
-            text = extract_text_from_docx(temp_file_path)
-        elif filename.lower().endswith((".jpg", ".jpeg", ".png")):
-            text = extract_text_from_image(temp_file_path)
-        elif filename.lower().endswith((".xlsx", ".xls")):
-            excel_data = extract_excel_data(temp_file_path)
-            text = excel_data.get("summary_text", "")
-        else:
-            with open(temp_file_path, "r", encoding="utf-8") as f:
-                text = f.read()
+        text = extract_text_for_file(upload.path, upload.filename)
         
         # Normalize document type
         if document_type:
@@ -3521,6 +4165,7 @@ async def process_and_export_to_tally(
         xml_content = export_to_tally_xml(result, document_type, company)
         
         # Create response file
+        import tempfile
         temp_xml_file = tempfile.NamedTemporaryFile(mode='w', suffix='.xml', delete=False, encoding='utf-8')
         temp_xml_file.write(xml_content)
         temp_xml_file.close()
@@ -3545,12 +4190,8 @@ async def process_and_export_to_tally(
             detail=f"Error processing and exporting to Tally: {str(e)}"
         )
     finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except Exception:
-                pass
+        # Clean up the request workspace
+        workspace.cleanup()
 
 
 @app.get("/cache/clear")
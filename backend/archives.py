@@ -0,0 +1,287 @@
+"""
+ZIP archive ingestion and batch tracking
+
+A month-end pack arrives as one ZIP. Entries are streamed one at a time from
+the spooled archive into the request workspace (the archive is never
+unpacked in memory), then each supported document is queued on the staged
+job backend. The batch record in Redis maps every entry to its job, its cached
+result, or the reason it was skipped, so clients can poll GET /batch/{id}
+or read results as NDJSON from GET /batch/{id}/stream as jobs finish.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import zipfile
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+from uploads import SpooledUpload, DOCUMENT_EXTENSIONS, MAX_FILE_SIZE, CHUNK_SIZE, check_signature
+from workspace import RequestWorkspace
+import result_store
+
+load_dotenv()
+
+ARCHIVE_EXTENSIONS = {'.zip'}
+MAX_ARCHIVE_SIZE = int(os.getenv("MAX_ARCHIVE_SIZE", 200 * 1024 * 1024))  # 200MB compressed
+MAX_ARCHIVE_ENTRIES = int(os.getenv("MAX_ARCHIVE_ENTRIES", 200))
+# Guards against zip bombs: total bytes extracted across all entries
+MAX_ARCHIVE_UNCOMPRESSED = int(os.getenv("MAX_ARCHIVE_UNCOMPRESSED", 1024 * 1024 * 1024))  # 1GB
+BATCH_TTL_SECONDS = int(os.getenv("BATCH_TTL", 7 * 24 * 60 * 60))
+BATCH_STREAM_TIMEOUT = float(os.getenv("BATCH_STREAM_TIMEOUT", 30 * 60))
+BATCH_POLL_SECONDS = 1.0
+
+BATCH_PREFIX = "archive_batch"
+
+ENTRY_QUEUED = "queued"
+ENTRY_CACHED = "cached"
+ENTRY_DUPLICATE = "duplicate"
+ENTRY_SKIPPED = "skipped"
+
+
+def _is_hidden(name: str) -> bool:
+    base = os.path.basename(name)
+    return name.startswith("__MACOSX/") or base.startswith(".") or base in ("Thumbs.db", "desktop.ini")
+
+
+def _extract_entry(archive: zipfile.ZipFile, info: zipfile.ZipInfo, dest_path: str,
+                   max_entry_size: int, budget: int) -> Tuple[int, str]:
+    """Stream one entry to dest_path; returns (size, sha256)"""
+    extension = os.path.splitext(info.filename)[1].lower()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with archive.open(info) as src, open(dest_path, "wb") as out:
+            while True:
+                data = src.read(CHUNK_SIZE)
+                if not data:
+                    break
+                if size == 0:
+                    check_signature(os.path.basename(info.filename), extension, data)
+                size += len(data)
+                if size > max_entry_size:
+                    raise ValueError(f"larger than {max_entry_size // (1024 * 1024)}MB")
+                if size > budget:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Archive expands to more than {MAX_ARCHIVE_UNCOMPRESSED // (1024 * 1024)}MB."
+                    )
+                digest.update(data)
+                out.write(data)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.unlink(dest_path)
+        raise
+    if size == 0:
+        os.unlink(dest_path)
+        raise ValueError("empty file")
+    return size, digest.hexdigest()
+
+
+def extract_entries(
+    archive_path: str,
+    workspace: RequestWorkspace,
+    allowed_extensions=DOCUMENT_EXTENSIONS,
+    max_entry_size: int = MAX_FILE_SIZE
+) -> Tuple[List[SpooledUpload], List[Dict[str, str]]]:
+    """
+    Stream supported entries of a ZIP into workspace
+
+    Returns:
+        (extracted entries in archive order, skipped entries with a reason)
+    """
+    try:
+        archive = zipfile.ZipFile(archive_path)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="The uploaded file is not a valid ZIP archive.")
+
+    entries: List[SpooledUpload] = []
+    skipped: List[Dict[str, str]] = []
+    budget = MAX_ARCHIVE_UNCOMPRESSED
+    with archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        # OS metadata (__MACOSX/, dotfiles, Thumbs.db) is reported but not counted against the limit
+        documents = sum(1 for info in members if not _is_hidden(info.filename))
+        if documents > MAX_ARCHIVE_ENTRIES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Archive has {documents} files; at most {MAX_ARCHIVE_ENTRIES} are allowed per upload."
+            )
+        for position, info in enumerate(members):
+            name = info.filename
+            if _is_hidden(name):
+                skipped.append({"name": name, "reason": "hidden"})
+                continue
+            extension = os.path.splitext(name)[1].lower()
+            if extension not in allowed_extensions:
+                skipped.append({"name": name, "reason": f"unsupported file type '{extension or 'none'}'"})
+                continue
+            if info.flag_bits & 0x1:
+                skipped.append({"name": name, "reason": "encrypted"})
+                continue
+            # Prefix with the position: archives often repeat file names across folders
+            dest_path = workspace.path(f"{position:04d}_{os.path.basename(name)}")
+            try:
+                size, sha256 = _extract_entry(archive, info, dest_path, max_entry_size, budget)
+            except HTTPException as e:
+                if e.status_code == 413:
+                    raise
+                skipped.append({"name": name, "reason": str(e.detail)})
+                continue
+            except (ValueError, zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+                skipped.append({"name": name, "reason": str(e)})
+                continue
+            budget -= size
+            entries.append(SpooledUpload(name, dest_path, size, sha256, None))
+
+    print(f"✓ Archive extracted: {len(entries)} documents, {len(skipped)} skipped")
+    return entries, skipped
+
+
+def _batch_key(batch_id: str) -> str:
+    return f"{BATCH_PREFIX}:{batch_id}"
+
+
+def create_batch(redis_client, archive_name: str, owner: str, document_type: Optional[str],
+                 entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Persist the entry-to-job mapping for an ingested archive"""
+    batch = {
+        "batch_id": uuid.uuid4().hex,
+        "archive": archive_name,
+        "owner": owner,
+        "document_type": document_type,
+        "created_at": time.time(),
+        "entries": entries,
+    }
+    redis_client.set(_batch_key(batch["batch_id"]), json.dumps(batch), ex=BATCH_TTL_SECONDS)
+    return batch
+
+
+def load_batch(redis_client, batch_id: str) -> Dict[str, Any]:
+    raw = redis_client.get(_batch_key(batch_id)) if batch_id.isalnum() else None
+    if not raw:
+        raise HTTPException(status_code=404, detail=f"Batch '{batch_id}' not found or expired.")
+    return json.loads(raw)
+
+
+def job_snapshot(job_backend, job_id: str) -> Dict[str, Any]:
+    """Coarse status of a pipeline job: pending, processing, completed or failed"""
+    try:
+        job = job_backend.status(job_id)
+    except Exception as e:
+        return {"status": "failed", "error": str(e)}
+    state, meta, result = job["state"], job["meta"], job["result"]
+    if state == "PROCESSING":
+        return {"status": "processing", "progress": meta.get("progress", 0)}
+    if state == "FAILURE":
+        return {"status": "failed", "error": meta.get("error"), "error_type": meta.get("error_type")}
+    if state != "SUCCESS":
+        return {"status": "pending"}
+    if isinstance(result, dict) and result.get("status") == "failed":
+        return {"status": "failed", "error": result.get("error"), "error_type": result.get("error_type")}
+    return {"status": "completed", "result": result}
+
+
+def _cached_result(redis_client, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return result_store.load_cached(redis_client, entry["cache_key"]) if entry.get("cache_key") else None
+
+
+def entry_state(redis_client, job_backend, batch: Dict[str, Any], entry: Dict[str, Any],
+                include_result: bool = False) -> Dict[str, Any]:
+    """Current state of one entry, following duplicates to the entry they repeat"""
+    state = {key: entry[key] for key in ("name", "status") if key in entry}
+    for key in ("sha256", "job_id", "duplicate_of", "reason"):
+        if entry.get(key):
+            state[key] = entry[key]
+
+    source = entry
+    if entry["status"] == ENTRY_DUPLICATE:
+        source = batch["entries"][entry["duplicate_of_index"]]
+
+    if source["status"] == ENTRY_SKIPPED:
+        state["state"] = "skipped"
+    elif source["status"] == ENTRY_CACHED:
+        result = _cached_result(redis_client, source)
+        state["state"] = "completed" if result is not None else "expired"
+        if include_result and result is not None:
+            state["result"] = result_store.load(result)
+    else:
+        snapshot = job_snapshot(job_backend, source["job_id"])
+        result = snapshot.pop("result", None)
+        state["state"] = snapshot.pop("status")
+        state.update(snapshot)
+        if state["state"] == "completed" and not result_store.exists(result):
+            state["state"] = "expired"
+        elif include_result and result is not None:
+            # NDJSON lines carry the full result, read from the result store one entry at a time
+            state["result"] = result_store.load(result)
+    return state
+
+
+def _safe_entry_state(redis_client, job_backend, batch: Dict[str, Any], entry: Dict[str, Any],
+                      include_result: bool = False) -> Dict[str, Any]:
+    """entry_state, with a result purged mid-read reported as expired and other errors as failed"""
+    try:
+        return entry_state(redis_client, job_backend, batch, entry, include_result=include_result)
+    except KeyError:
+        return {"name": entry["name"], "job_id": entry.get("job_id"), "state": "expired"}
+    except Exception as e:
+        print(f"Warning: Could not read batch entry {entry['name']}: {str(e)}")
+        return {"name": entry["name"], "job_id": entry.get("job_id"), "state": "failed", "error": str(e)}
+
+
+def batch_status(redis_client, job_backend, batch: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-entry states and counts for GET /batch/{batch_id}"""
+    entries = [_safe_entry_state(redis_client, job_backend, batch, entry) for entry in batch["entries"]]
+    counts: Dict[str, int] = {}
+    for entry in entries:
+        counts[entry["state"]] = counts.get(entry["state"], 0) + 1
+    done = sum(counts.get(state, 0) for state in ("completed", "failed", "skipped", "expired"))
+    return {
+        "batch_id": batch["batch_id"],
+        "archive": batch["archive"],
+        "total": len(entries),
+        "done": done,
+        "finished": done == len(entries),
+        "counts": counts,
+        "entries": entries,
+    }
+
+
+async def stream_batch(redis_client, job_backend, batch: Dict[str, Any],
+                       timeout: float = BATCH_STREAM_TIMEOUT) -> AsyncIterator[bytes]:
+    """
+    Yield one NDJSON line per entry as its result becomes available,
+    then a final summary line
+    """
+    loop = asyncio.get_event_loop()
+    pending = list(range(len(batch["entries"])))
+    deadline = time.monotonic() + timeout
+    counts: Dict[str, int] = {}
+    while pending:
+        still_pending = []
+        for index in pending:
+            # Redis, job backend and result file reads are blocking: keep them off the event loop
+            state = await loop.run_in_executor(
+                None, _safe_entry_state, redis_client, job_backend, batch, batch["entries"][index], True
+            )
+            if state["state"] in ("pending", "processing"):
+                still_pending.append(index)
+                continue
+            counts[state["state"]] = counts.get(state["state"], 0) + 1
+            yield (json.dumps(state) + "\n").encode("utf-8")
+        pending = still_pending
+        if not pending or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(BATCH_POLL_SECONDS)
+
+    for index in pending:
+        entry = batch["entries"][index]
+        counts["timed_out"] = counts.get("timed_out", 0) + 1
+        yield (json.dumps({"name": entry["name"], "job_id": entry.get("job_id"), "state": "timed_out"}) + "\n").encode("utf-8")
+    summary = {"batch_id": batch["batch_id"], "summary": True, "total": len(batch["entries"]), "counts": counts}
+    yield (json.dumps(summary) + "\n").encode("utf-8")
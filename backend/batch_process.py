@@ -0,0 +1,315 @@
+"""
+Offline batch processing for directory-scale backfills
+
+Runs the same stages as the Celery pipeline (tasks/pipeline.py) across a
+local process pool, without going through HTTP:
+
+    python batch_process.py /data/statements --output results.jsonl --workers 8
+    python batch_process.py --manifest files.txt --output results.jsonl --parquet results.parquet
+
+- Input: a directory (walked recursively for supported files) or a manifest
+  with one path per line, or JSONL lines {"path": ..., "document_type": ...}.
+- Output: one JSON line per document, flushed as each finishes. The output
+  file doubles as the checkpoint: re-running the same command skips every
+  document already recorded as completed or cached, so an interrupted
+  backfill resumes where it stopped (add --retry-failed to redo failures).
+- Caches: with Redis configured, finished documents are looked up in and
+  written to the same document cache /process uses, and LLM calls go
+  through the Gemini response cache as usual.
+- At the end, prints docs/sec and per-stage timings (count, mean, p95).
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.doc', '.xlsx', '.xls', '.jpg', '.jpeg', '.png'}
+STAGES = ("hash", "cache", "ocr", "classify", "extract", "reports")
+DOCUMENT_CACHE_TTL = 604800  # 7 days, as in /process
+
+
+# ------------------------------
+# Worker side
+# ------------------------------
+
+_use_cache = True
+_with_reports = True
+
+
+def _init_worker(use_cache: bool, with_reports: bool, verbose: bool) -> None:
+    """Pool initializer: silence per-document logging and load the app once per process"""
+    global _use_cache, _with_reports
+    _use_cache = use_cache
+    _with_reports = with_reports
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    import app  # noqa: F401  (configures OCR, the LLM client and Redis)
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def process_file(path: str, document_type: Optional[str] = None) -> Dict[str, Any]:
+    """Run one document through every stage; never raises"""
+    from app import redis_client, REDIS_AVAILABLE, get_document_cache_key_for_hash
+    import result_store
+    from tasks.pipeline import extract_text_for_file, resolve_document_type, extract_structured_data, generate_reports
+
+    record: Dict[str, Any] = {"path": path, "requested_type": document_type}
+    timings: Dict[str, float] = {}
+    stage_start = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[stage] = round(now - stage_start, 4)
+        stage_start = now
+
+    try:
+        record["sha256"] = _file_sha256(path)
+        lap("hash")
+
+        cache_key = None
+        if _use_cache and REDIS_AVAILABLE and redis_client:
+            cache_key = get_document_cache_key_for_hash(record["sha256"], document_type)
+            try:
+                cached = result_store.load_cached(redis_client, cache_key)
+            except Exception:
+                cached = None
+            lap("cache")
+            if cached is not None:
+                result = result_store.load(cached)
+                record.update({"status": "cached", "document_type": result.get("document_type"), "result": result})
+                return record
+
+        filename = os.path.basename(path)
+        text = extract_text_for_file(path, filename)
+        lap("ocr")
+        resolved_type = resolve_document_type(text, document_type)
+        lap("classify")
+        extracted = extract_structured_data(text, resolved_type)
+        lap("extract")
+        reports = generate_reports(extracted, text, resolved_type) if _with_reports else {}
+        if _with_reports:
+            lap("reports")
+
+        result = {
+            "extracted_data": extracted,
+            "reports": reports,
+            "document_type": resolved_type,
+            "filename": filename
+        }
+        if cache_key and _with_reports:
+            try:
+                redis_client.setex(cache_key, DOCUMENT_CACHE_TTL, json.dumps(result_store.store(result)))
+            except Exception:
+                pass
+        record.update({"status": "completed", "document_type": resolved_type, "result": result})
+    except Exception as e:
+        record.update({"status": "failed", "error": str(getattr(e, "detail", None) or e), "error_type": type(e).__name__})
+    finally:
+        record["timings"] = timings
+    return record
+
+
+# ------------------------------
+# Driver side
+# ------------------------------
+
+def iter_inputs(directory: Optional[str], manifest: Optional[str],
+                default_type: Optional[str]) -> Iterator[Tuple[str, Optional[str]]]:
+    """Yield (absolute path, document type) for every input document"""
+    if directory:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for name in sorted(files):
+                if name.startswith("."):
+                    continue
+                if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                    yield os.path.abspath(os.path.join(root, name)), default_type
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("{"):
+                    item = json.loads(line)
+                    path, doc_type = item["path"], item.get("document_type") or default_type
+                else:
+                    path, doc_type = line, default_type
+                yield os.path.abspath(os.path.join(base, path)), doc_type
+
+
+def load_checkpoint(output_path: str, retry_failed: bool) -> set:
+    """Paths already finished in a previous run of the same output file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    finished = {"completed", "cached"} if retry_failed else {"completed", "cached", "failed"}
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Last line of an interrupted run
+                continue
+            if record.get("status") in finished:
+                done.add(record["path"])
+    return done
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def print_summary(records: List[Dict[str, Any]], elapsed: float, resumed: int) -> None:
+    statuses: Dict[str, int] = {}
+    for record in records:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    processed = len(records)
+    print(f"\n{'='*60}")
+    print("Batch processing summary")
+    print(f"{'='*60}")
+    print(f"Documents this run: {processed} ({', '.join(f'{k}: {v}' for k, v in sorted(statuses.items())) or 'none'})")
+    if resumed:
+        print(f"Skipped (already in checkpoint): {resumed}")
+    print(f"Wall time: {elapsed:.1f}s | Throughput: {processed / elapsed if elapsed > 0 else 0:.2f} docs/sec")
+    print(f"\n{'stage':<10}{'count':>8}{'mean s':>10}{'p95 s':>10}{'total s':>11}")
+    for stage in STAGES:
+        values = [r["timings"][stage] for r in records if stage in r.get("timings", {})]
+        if values:
+            print(f"{stage:<10}{len(values):>8}{sum(values) / len(values):>10.3f}"
+                  f"{_percentile(values, 95):>10.3f}{sum(values):>11.1f}")
+
+
+def write_parquet(jsonl_path: str, parquet_path: str) -> None:
+    """Flatten the JSONL results into a Parquet file (requires pyarrow or fastparquet)"""
+    import pandas as pd
+
+    rows = []
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            row = {key: record.get(key) for key in ("path", "sha256", "status", "requested_type", "document_type", "error", "error_type")}
+            for stage in STAGES:
+                row[f"{stage}_seconds"] = record.get("timings", {}).get(stage)
+            row["result_json"] = json.dumps(record["result"]) if record.get("result") is not None else None
+            rows.append(row)
+    try:
+        pd.DataFrame(rows).to_parquet(parquet_path, index=False)
+    except ImportError as e:
+        print(f"❌ Could not write Parquet ({e}). Install pyarrow: pip install pyarrow")
+        return
+    print(f"✓ Wrote {len(rows)} rows to {parquet_path}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", help="Directory to walk for documents")
+    parser.add_argument("--manifest", help="File listing documents (paths or JSONL with path/document_type)")
+    parser.add_argument("--output", required=True, help="JSONL results file (also the resume checkpoint)")
+    parser.add_argument("--parquet", help="Also write all results to this Parquet file at the end")
+    parser.add_argument("--document-type", help="Document type for every input (default: classify each)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Process pool size")
+    parser.add_argument("--retry-failed", action="store_true", help="Reprocess documents that failed in earlier runs")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the document cache")
+    parser.add_argument("--no-reports", action="store_true", help="Skip report generation (extraction only)")
+    parser.add_argument("--verbose", action="store_true", help="Show per-document logs from workers")
+    args = parser.parse_args(argv)
+
+    if not args.directory and not args.manifest:
+        parser.error("give a directory, --manifest, or both")
+
+    done = load_checkpoint(args.output, args.retry_failed)
+    pending = []
+    resumed = 0
+    seen = set()
+    for path, doc_type in iter_inputs(args.directory, args.manifest, args.document_type):
+        if path in seen:
+            continue
+        seen.add(path)
+        if path in done:
+            resumed += 1
+        else:
+            pending.append((path, doc_type))
+
+    print(f"\n{'='*60}")
+    print(f"Batch processing {len(pending)} documents with {args.workers} workers")
+    if resumed:
+        print(f"Resuming: {resumed} documents already in {args.output}")
+    print(f"{'='*60}\n")
+
+    records: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+    # Bounded in-flight window keeps memory flat and Ctrl-C responsive for huge inputs
+    window = max(args.workers * 4, 1)
+    queue = iter(pending)
+    with open(args.output, "a", encoding="utf-8") as out, ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=_init_worker,
+        initargs=(not args.no_cache, not args.no_reports, args.verbose)
+    ) as pool:
+        in_flight = set()
+        try:
+            while True:
+                while len(in_flight) < window:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    in_flight.add(pool.submit(process_file, *item))
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    record = future.result()
+                    out.write(json.dumps(record) + "\n")
+                    out.flush()
+                    records.append({"status": record["status"], "timings": record["timings"]})
+                    if record["status"] == "failed":
+                        print(f"❌ {record['path']}: {record.get('error')}")
+                    if len(records) % 100 == 0:
+                        rate = len(records) / (time.perf_counter() - start)
+                        print(f"  {len(records)}/{len(pending)} done ({rate:.2f} docs/sec)")
+        except KeyboardInterrupt:
+            print("\n⚠️ Interrupted; finished documents are saved. Re-run the same command to resume.")
+            for future in in_flight:
+                future.cancel()
+            pool.shutdown(wait=False)
+            print_summary(records, time.perf_counter() - start, resumed)
+            return 130
+        except BrokenProcessPool:
+            # A worker died abruptly (e.g. killed for running out of memory)
+            print("\n❌ A worker process died; finished documents are saved. Re-run the same command to resume.")
+            pool.shutdown(wait=False)
+            print_summary(records, time.perf_counter() - start, resumed)
+            return 1
+
+    print_summary(records, time.perf_counter() - start, resumed)
+    if args.parquet:
+        write_parquet(args.output, args.parquet)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
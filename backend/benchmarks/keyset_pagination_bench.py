@@ -0,0 +1,138 @@
+"""
+Benchmark: page-N latency of OFFSET vs keyset pagination for a heavy user
+
+Seeds a scratch schema (bench_keyset) with one user owning --rows documents
+plus some noise from other users, builds the same composite index as
+database/migrations/001_keyset_pagination_indexes.sql, then times fetching
+page N both ways:
+
+- OFFSET: ORDER BY created_at DESC LIMIT 50 OFFSET N*50 (what
+  get_user_documents does) - gets slower the deeper the page
+- keyset: WHERE (created_at, document_id) < cursor (what
+  get_user_documents_page does) - constant
+
+The scratch schema is dropped at the end (--keep to inspect it).
+
+Usage:
+    python benchmarks/keyset_pagination_bench.py [--rows 100000] [--page-size 50]
+Needs SUPABASE_DB_URL / DATABASE_URL pointing at a Postgres you can create
+a schema in.
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+
+from database import _resolve_database_url
+
+SCHEMA = "bench_keyset"
+HEAVY_USER = "00000000-0000-0000-0000-000000000001"
+
+
+def seed(cur, rows: int, noise_users: int) -> None:
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"""
+        CREATE TABLE {SCHEMA}.documents (
+            document_id UUID PRIMARY KEY,
+            user_id UUID NOT NULL,
+            original_filename VARCHAR(500) NOT NULL,
+            document_type VARCHAR(100),
+            processing_status VARCHAR(50) DEFAULT 'completed',
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL
+        )""")
+    # The heavy user: one document a minute, going back in time
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.documents (document_id, user_id, original_filename, document_type, created_at)
+        SELECT md5('heavy' || g)::uuid, %s, 'invoice_' || g || '.pdf', 'invoice',
+               now() - g * interval '1 minute'
+        FROM generate_series(1, %s) AS g""", (HEAVY_USER, rows))
+    # Everyone else, interleaved in time
+    cur.execute(f"""
+        INSERT INTO {SCHEMA}.documents (document_id, user_id, original_filename, document_type, created_at)
+        SELECT md5('noise' || g)::uuid, md5('user' || (g %% %s))::uuid, 'statement_' || g || '.pdf',
+               'bank_statement', now() - g * interval '37 seconds'
+        FROM generate_series(1, %s) AS g""", (noise_users, rows))
+    cur.execute(f"""
+        CREATE INDEX idx_documents_user_created
+        ON {SCHEMA}.documents(user_id, created_at DESC, document_id DESC)""")
+    cur.execute(f"ANALYZE {SCHEMA}.documents")
+
+
+def time_query(cur, query: str, params: tuple, repeats: int) -> float:
+    """Median wall time in ms"""
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        cur.execute(query, params)
+        cur.fetchall()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def cursor_before_page(cur, page: int, page_size: int):
+    """(created_at, document_id) of the last row of the previous page"""
+    if page == 0:
+        return None
+    cur.execute(f"""
+        SELECT created_at, document_id FROM {SCHEMA}.documents
+        WHERE user_id = %s
+        ORDER BY created_at DESC, document_id DESC
+        LIMIT 1 OFFSET %s""", (HEAVY_USER, page * page_size - 1))
+    return cur.fetchone()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OFFSET vs keyset pagination latency")
+    parser.add_argument("--rows", type=int, default=100000, help="documents owned by the heavy user")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--noise-users", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--keep", action="store_true", help="keep the bench_keyset schema")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(_resolve_database_url())
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        print(f"Seeding {args.rows} documents for one user (+{args.rows} for {args.noise_users} others)...")
+        started = time.time()
+        seed(cur, args.rows, args.noise_users)
+        print(f"✓ Seeded in {time.time() - started:.1f}s\n")
+
+        offset_query = f"""
+            SELECT * FROM {SCHEMA}.documents WHERE user_id = %s
+            ORDER BY created_at DESC, document_id DESC LIMIT %s OFFSET %s"""
+        keyset_query = f"""
+            SELECT * FROM {SCHEMA}.documents WHERE user_id = %s AND (created_at, document_id) < (%s, %s)
+            ORDER BY created_at DESC, document_id DESC LIMIT %s"""
+        first_query = f"""
+            SELECT * FROM {SCHEMA}.documents WHERE user_id = %s
+            ORDER BY created_at DESC, document_id DESC LIMIT %s"""
+
+        last_page = args.rows // args.page_size - 1
+        pages = sorted({0, 10, 100, last_page // 4, last_page // 2, last_page})
+        print(f"{'page':>8} {'OFFSET ms':>12} {'keyset ms':>12}")
+        for page in pages:
+            offset_ms = time_query(cur, offset_query, (HEAVY_USER, args.page_size, page * args.page_size), args.repeats)
+            boundary = cursor_before_page(cur, page, args.page_size)
+            if boundary is None:
+                keyset_ms = time_query(cur, first_query, (HEAVY_USER, args.page_size), args.repeats)
+            else:
+                keyset_ms = time_query(cur, keyset_query, (HEAVY_USER, boundary[0], boundary[1], args.page_size),
+                                       args.repeats)
+            print(f"{page:>8} {offset_ms:>12.2f} {keyset_ms:>12.2f}")
+    finally:
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
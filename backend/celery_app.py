@@ -3,6 +3,7 @@ Celery configuration for async job processing
 """
 import os
 from celery import Celery
+from celery.signals import worker_init
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,7 +16,7 @@ celery_app = Celery(
     "finsight",
     broker=redis_url,
     backend=redis_url,
-    include=["tasks.document_processing"]
+    include=["tasks.document_processing", "tasks.webhooks"]
 )
 
 # Celery configuration
@@ -34,6 +35,17 @@ celery_app.conf.update(
     task_reject_on_worker_lost=True,  # Re-queue tasks if worker dies
     result_expires=3600,  # Results expire after 1 hour
     task_routes={
+        # Staged pipeline: each stage goes to a pool sized for its bottleneck
+        "tasks.document_processing.ocr_stage_task": {"queue": "ocr"},
+        "tasks.document_processing.extract_stage_task": {"queue": "llm_extraction"},
+        "tasks.document_processing.report_stage_task": {"queue": "llm_reports"},
+        # Multi-file jobs: per-file extraction fans out, aggregation is LLM-bound
+        "tasks.document_processing.extract_gst_file_task": {"queue": "ocr"},
+        "tasks.document_processing.extract_audit_file_task": {"queue": "ocr"},
+        "tasks.document_processing.aggregate_gst_files_task": {"queue": "llm_reports"},
+        "tasks.document_processing.aggregate_audit_files_task": {"queue": "llm_reports"},
+        # Webhook callbacks: network-bound, kept off the pipeline queues
+        "tasks.webhooks.deliver_webhook_task": {"queue": "webhooks"},
         "tasks.document_processing.*": {"queue": "document_processing"},
         "tasks.document_processing.process_document_task": {"queue": "document_processing"},
     },
@@ -42,5 +54,19 @@ celery_app.conf.update(
     task_default_routing_key="document_processing",
 )
 
+
+
+@worker_init.connect
+def require_shared_storage(**kwargs):
+    """Workers exchange files with the API by path: refuse to start on host-local defaults"""
+    from job_backend import check_shared_storage, SharedStorageError
+
+    try:
+        check_shared_storage()
+    except SharedStorageError as e:
+        print(f"❌ {str(e)}")
+        # SystemExit, not an exception: Celery logs and ignores exceptions raised by signal handlers
+        raise SystemExit(1)
+
 # Tasks will be imported when needed to avoid circular imports
 
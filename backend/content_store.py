@@ -0,0 +1,102 @@
+"""
+Content-addressed file store
+
+Files are kept once per SHA-256 under CONTENT_STORE_DIR/<aa>/<sha256>, so a
+document uploaded twice occupies disk once and any process that knows the
+hash can open it. Point CONTENT_STORE_DIR at a volume shared by the API and
+the Celery ocr workers so stored files can be handed to the pipeline by path.
+
+Files not committed again for CONTENT_STORE_TTL seconds are deleted by
+purge_expired, which commit() runs at most once an hour.
+"""
+
+import os
+import time
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CONTENT_STORE_DIR = os.getenv(
+    "CONTENT_STORE_DIR",
+    os.path.join(tempfile.gettempdir(), "finsight_content_store")
+)
+# Outlives an upload session plus its wait in the fair queue (24h each)
+CONTENT_STORE_TTL = int(os.getenv("CONTENT_STORE_TTL", 3 * 24 * 60 * 60))
+PURGE_INTERVAL_SECONDS = 60 * 60
+
+_last_purge = 0.0
+
+
+def path_for(sha256: str) -> str:
+    """Where the file with this hash lives (whether or not it exists yet)"""
+    sha256 = sha256.lower()
+    if len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256):
+        raise ValueError(f"Invalid SHA-256 digest: {sha256!r}")
+    return os.path.join(CONTENT_STORE_DIR, sha256[:2], sha256)
+
+
+def exists(sha256: str) -> bool:
+    return os.path.exists(path_for(sha256))
+
+
+def staging_file() -> tuple:
+    """Open a temp file on the store's filesystem so commit() is a rename"""
+    os.makedirs(CONTENT_STORE_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=".incoming_", dir=CONTENT_STORE_DIR)
+    return os.fdopen(fd, "wb"), path
+
+
+def commit(staged_path: str, sha256: str) -> str:
+    """
+    Move a fully written staging file into place under its hash
+
+    If the content is already stored the staging file is discarded.
+
+    Returns:
+        The stored file's path
+    """
+    _maybe_purge()
+    target = path_for(sha256)
+    if os.path.exists(target):
+        os.unlink(staged_path)
+        # Refresh the mtime so purge_expired keeps it for its newest upload
+        os.utime(target, None)
+        return target
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(staged_path, target)
+    return target
+
+
+def purge_expired(max_age: int = CONTENT_STORE_TTL) -> int:
+    """Delete stored files (and abandoned staging files) not written for max_age seconds"""
+    cutoff = time.time() - max_age
+    removed = 0
+    if not os.path.isdir(CONTENT_STORE_DIR):
+        return 0
+    for name in os.listdir(CONTENT_STORE_DIR):
+        path = os.path.join(CONTENT_STORE_DIR, name)
+        paths = [os.path.join(path, entry) for entry in os.listdir(path)] if os.path.isdir(path) else [path]
+        for file_path in paths:
+            try:
+                if os.path.getmtime(file_path) < cutoff:
+                    os.unlink(file_path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    if removed:
+        print(f"✓ Purged {removed} expired stored uploads")
+    return removed
+
+
+def _maybe_purge() -> None:
+    global _last_purge
+    now = time.time()
+    if now - _last_purge < PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = now
+    try:
+        purge_expired()
+    except Exception as e:
+        print(f"Warning: Could not purge stored uploads: {str(e)}")
+
@@ -0,0 +1,21 @@
+-- FinSight migration 001: composite indexes for keyset pagination
+--
+-- database.get_user_documents_page / get_user_history_page seek on
+-- (user_id, timestamp DESC, id DESC). These indexes serve that seek and also
+-- plain user_id lookups, so the single-column user_id indexes are dropped.
+--
+-- CONCURRENTLY avoids locking writes on large tables but cannot run inside a
+-- transaction block: run this file with psql (psql "$SUPABASE_DB_URL" -f ...),
+-- not as one transaction in the SQL editor.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_documents_user_created
+    ON documents(user_id, created_at DESC, document_id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_history_user_timestamp
+    ON processing_history(user_id, action_timestamp DESC, history_id DESC);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_documents_user_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_history_user_id;
+
+ANALYZE documents;
+ANALYZE processing_history;
@@ -0,0 +1,37 @@
+-- FinSight migration 002: normalized transactions table
+--
+-- database.copy_transactions fills it (via COPY) whenever a processing
+-- result is saved. Documents processed before this migration are not
+-- backfilled.
+
+-- Transactions Table (normalized from bank statements, invoices and purchase orders)
+-- Hash-partitioned by user: every query is per user, so each touches one partition
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id BIGSERIAL,
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    document_id UUID NOT NULL REFERENCES documents(document_id) ON DELETE CASCADE,
+    source_type VARCHAR(100) NOT NULL,
+    txn_date DATE,
+    description TEXT,
+    amount NUMERIC(18,2) NOT NULL,
+    direction VARCHAR(10),
+    balance NUMERIC(18,2),
+    category VARCHAR(100),
+    counterparty VARCHAR(500),
+    reference VARCHAR(200),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, transaction_id)
+) PARTITION BY HASH (user_id);
+
+CREATE TABLE IF NOT EXISTS transactions_p0 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 0);
+CREATE TABLE IF NOT EXISTS transactions_p1 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 1);
+CREATE TABLE IF NOT EXISTS transactions_p2 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 2);
+CREATE TABLE IF NOT EXISTS transactions_p3 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 3);
+CREATE TABLE IF NOT EXISTS transactions_p4 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 4);
+CREATE TABLE IF NOT EXISTS transactions_p5 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 5);
+CREATE TABLE IF NOT EXISTS transactions_p6 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 6);
+CREATE TABLE IF NOT EXISTS transactions_p7 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 7);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions(user_id, txn_date DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_category_date ON transactions(user_id, category, txn_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_document_id ON transactions(document_id);
@@ -0,0 +1,21 @@
+-- FinSight migration 003: store large result sections apart
+--
+-- database.save_processing_result / record_document_lifecycle move each
+-- report and the transaction list / dashboard (when over
+-- RESULT_SECTION_MIN_BYTES) out of processing_results.extracted_data into
+-- processing_result_sections, zlib-compressed. processing_results.sections
+-- maps each stored section to its uncompressed size. Existing rows keep
+-- everything inline and read back unchanged.
+
+ALTER TABLE processing_results ADD COLUMN IF NOT EXISTS sections JSONB;
+
+CREATE TABLE IF NOT EXISTS processing_result_sections (
+    result_id UUID NOT NULL REFERENCES processing_results(result_id) ON DELETE CASCADE,
+    section VARCHAR(200) NOT NULL,
+    payload BYTEA NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    PRIMARY KEY (result_id, section)
+);
+
+-- Payloads are already compressed: don't let TOAST try again
+ALTER TABLE processing_result_sections ALTER COLUMN payload SET STORAGE EXTERNAL;
@@ -0,0 +1,117 @@
+-- FinSight migration 004: daily analytics rollups
+--
+-- analytics_daily is kept current by a trigger on analytics, so dashboards
+-- (database.get_user_daily_analytics / summarize_user_analytics) read one
+-- row per user, day and document type instead of one per document. Days are
+-- in the database session time zone (UTC on Supabase).
+--
+-- Run as one transaction: the backfill at the end locks analytics against
+-- inserts, so no row is counted twice.
+
+BEGIN;
+
+-- Daily analytics rollups: per user/day/document_type counts and a latency
+-- sketch (log-spaced buckets, 2% relative error: bucket i covers
+-- (gamma^(i-1), gamma^i] ms with gamma = 1.02/0.98; mergeable by adding
+-- counts). Maintained from analytics by the statement-level trigger below.
+CREATE TABLE IF NOT EXISTS analytics_daily (
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    document_type VARCHAR(100) NOT NULL,
+    documents INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    total_processing_ms BIGINT NOT NULL DEFAULT 0,
+    latency_sketch JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, day, document_type)
+);
+
+-- Must match database.LATENCY_SKETCH_ACCURACY
+CREATE OR REPLACE FUNCTION analytics_latency_bucket(ms INTEGER)
+RETURNS INTEGER AS $$
+    SELECT CASE WHEN ms IS NULL THEN NULL
+                WHEN ms <= 1 THEN 0
+                ELSE ceil(ln(ms) / ln(1.02 / 0.98))::integer END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION analytics_merge_sketches(a JSONB, b JSONB)
+RETURNS JSONB AS $$
+    SELECT COALESCE(jsonb_object_agg(bucket, total), '{}'::jsonb)
+    FROM (
+        SELECT key AS bucket, SUM(value::bigint) AS total
+        FROM (SELECT * FROM jsonb_each_text(COALESCE(a, '{}'::jsonb))
+              UNION ALL
+              SELECT * FROM jsonb_each_text(COALESCE(b, '{}'::jsonb))) AS counts
+        GROUP BY key
+    ) AS merged
+$$ LANGUAGE sql IMMUTABLE;
+
+-- A row with success_rate = 0 is a failed document; latency covers successes only
+CREATE OR REPLACE FUNCTION analytics_rollup_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO analytics_daily AS d
+        (user_id, day, document_type, documents, failures, total_processing_ms, latency_sketch)
+    SELECT user_id, day, document_type, SUM(documents), SUM(failures), SUM(total_ms),
+           COALESCE(jsonb_object_agg(bucket, documents - failures)
+                    FILTER (WHERE bucket IS NOT NULL AND documents > failures), '{}'::jsonb)
+    FROM (
+        SELECT user_id, created_at::date AS day, COALESCE(document_type, 'unknown') AS document_type,
+               analytics_latency_bucket(processing_time_ms) AS bucket,
+               COUNT(*) AS documents,
+               COUNT(*) FILTER (WHERE success_rate = 0) AS failures,
+               COALESCE(SUM(processing_time_ms) FILTER (WHERE success_rate IS DISTINCT FROM 0), 0) AS total_ms
+        FROM new_rows
+        WHERE user_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    ) AS buckets
+    GROUP BY user_id, day, document_type
+    ON CONFLICT (user_id, day, document_type) DO UPDATE SET
+        documents = d.documents + EXCLUDED.documents,
+        failures = d.failures + EXCLUDED.failures,
+        total_processing_ms = d.total_processing_ms + EXCLUDED.total_processing_ms,
+        latency_sketch = analytics_merge_sketches(d.latency_sketch, EXCLUDED.latency_sketch),
+        updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS analytics_rollup ON analytics;
+CREATE TRIGGER analytics_rollup AFTER INSERT ON analytics
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION analytics_rollup_insert();
+
+-- Recompute rollups from raw analytics for days >= since (backfill/repair;
+-- the trigger does not see UPDATEs or DELETEs)
+CREATE OR REPLACE FUNCTION rebuild_analytics_daily(since DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    rebuilt INTEGER;
+BEGIN
+    LOCK TABLE analytics IN SHARE MODE;
+    DELETE FROM analytics_daily WHERE day >= since;
+    INSERT INTO analytics_daily
+        (user_id, day, document_type, documents, failures, total_processing_ms, latency_sketch)
+    SELECT user_id, day, document_type, SUM(documents), SUM(failures), SUM(total_ms),
+           COALESCE(jsonb_object_agg(bucket, documents - failures)
+                    FILTER (WHERE bucket IS NOT NULL AND documents > failures), '{}'::jsonb)
+    FROM (
+        SELECT user_id, created_at::date AS day, COALESCE(document_type, 'unknown') AS document_type,
+               analytics_latency_bucket(processing_time_ms) AS bucket,
+               COUNT(*) AS documents,
+               COUNT(*) FILTER (WHERE success_rate = 0) AS failures,
+               COALESCE(SUM(processing_time_ms) FILTER (WHERE success_rate IS DISTINCT FROM 0), 0) AS total_ms
+        FROM analytics
+        WHERE user_id IS NOT NULL AND created_at >= since
+        GROUP BY 1, 2, 3, 4
+    ) AS buckets
+    GROUP BY user_id, day, document_type;
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill from existing analytics rows
+SELECT rebuild_analytics_daily('-infinity');
+
+COMMIT;
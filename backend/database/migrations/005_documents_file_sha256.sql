@@ -0,0 +1,27 @@
+-- FinSight migration 005: durable document dedup by file hash
+--
+-- /process stores the SHA-256 of each upload on its document and, when the
+-- Redis document cache misses, serves the stored result of a completed
+-- document with the same hash for the same user (see
+-- database.get_result_by_sha256) instead of processing the file again.
+-- Documents processed before this migration have no hash and are not
+-- deduplicated.
+--
+-- document_type_forced records whether the type was given by the client or
+-- detected. A request without a type only reuses documents whose type was
+-- detected, so a type forced on an earlier upload is never served as the
+-- auto-detected one.
+--
+-- The index is unique per user, file and document type (a file may be
+-- processed again with a different type forced) and covers completed
+-- documents only, so failed attempts never block a retry.
+--
+-- CONCURRENTLY cannot run inside a transaction block: run this file with
+-- psql (psql "$SUPABASE_DB_URL" -f ...).
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS file_sha256 CHAR(64);
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS document_type_forced BOOLEAN;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_documents_user_sha256
+    ON documents(user_id, file_sha256, document_type)
+    WHERE file_sha256 IS NOT NULL AND processing_status = 'completed';
@@ -27,6 +27,8 @@ CREATE TABLE IF NOT EXISTS documents (
     processing_started_at TIMESTAMP WITH TIME ZONE,
     processing_completed_at TIMESTAMP WITH TIME ZONE,
     error_message TEXT,
+    file_sha256 CHAR(64),
+    document_type_forced BOOLEAN,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -40,9 +42,20 @@ CREATE TABLE IF NOT EXISTS processing_results (
     summary_stats JSONB,
     anomalies JSONB,
     output_files JSONB,
+    sections JSONB,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Large sections of processing results (reports, transaction lists), zlib-compressed JSON
+CREATE TABLE IF NOT EXISTS processing_result_sections (
+    result_id UUID NOT NULL REFERENCES processing_results(result_id) ON DELETE CASCADE,
+    section VARCHAR(200) NOT NULL,
+    payload BYTEA NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    PRIMARY KEY (result_id, section)
+);
+ALTER TABLE processing_result_sections ALTER COLUMN payload SET STORAGE EXTERNAL;
+
 -- Processing History Table
 CREATE TABLE IF NOT EXISTS processing_history (
     history_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -87,14 +100,150 @@ CREATE TABLE IF NOT EXISTS analytics (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Daily analytics rollups: per user/day/document_type counts and a latency
+-- sketch (log-spaced buckets, 2% relative error: bucket i covers
+-- (gamma^(i-1), gamma^i] ms with gamma = 1.02/0.98; mergeable by adding
+-- counts). Maintained from analytics by the statement-level trigger below.
+CREATE TABLE IF NOT EXISTS analytics_daily (
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    document_type VARCHAR(100) NOT NULL,
+    documents INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    total_processing_ms BIGINT NOT NULL DEFAULT 0,
+    latency_sketch JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, day, document_type)
+);
+
+-- Must match database.LATENCY_SKETCH_ACCURACY
+CREATE OR REPLACE FUNCTION analytics_latency_bucket(ms INTEGER)
+RETURNS INTEGER AS $$
+    SELECT CASE WHEN ms IS NULL THEN NULL
+                WHEN ms <= 1 THEN 0
+                ELSE ceil(ln(ms) / ln(1.02 / 0.98))::integer END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION analytics_merge_sketches(a JSONB, b JSONB)
+RETURNS JSONB AS $$
+    SELECT COALESCE(jsonb_object_agg(bucket, total), '{}'::jsonb)
+    FROM (
+        SELECT key AS bucket, SUM(value::bigint) AS total
+        FROM (SELECT * FROM jsonb_each_text(COALESCE(a, '{}'::jsonb))
+              UNION ALL
+              SELECT * FROM jsonb_each_text(COALESCE(b, '{}'::jsonb))) AS counts
+        GROUP BY key
+    ) AS merged
+$$ LANGUAGE sql IMMUTABLE;
+
+-- A row with success_rate = 0 is a failed document; latency covers successes only
+CREATE OR REPLACE FUNCTION analytics_rollup_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO analytics_daily AS d
+        (user_id, day, document_type, documents, failures, total_processing_ms, latency_sketch)
+    SELECT user_id, day, document_type, SUM(documents), SUM(failures), SUM(total_ms),
+           COALESCE(jsonb_object_agg(bucket, documents - failures)
+                    FILTER (WHERE bucket IS NOT NULL AND documents > failures), '{}'::jsonb)
+    FROM (
+        SELECT user_id, created_at::date AS day, COALESCE(document_type, 'unknown') AS document_type,
+               analytics_latency_bucket(processing_time_ms) AS bucket,
+               COUNT(*) AS documents,
+               COUNT(*) FILTER (WHERE success_rate = 0) AS failures,
+               COALESCE(SUM(processing_time_ms) FILTER (WHERE success_rate IS DISTINCT FROM 0), 0) AS total_ms
+        FROM new_rows
+        WHERE user_id IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    ) AS buckets
+    GROUP BY user_id, day, document_type
+    ON CONFLICT (user_id, day, document_type) DO UPDATE SET
+        documents = d.documents + EXCLUDED.documents,
+        failures = d.failures + EXCLUDED.failures,
+        total_processing_ms = d.total_processing_ms + EXCLUDED.total_processing_ms,
+        latency_sketch = analytics_merge_sketches(d.latency_sketch, EXCLUDED.latency_sketch),
+        updated_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS analytics_rollup ON analytics;
+CREATE TRIGGER analytics_rollup AFTER INSERT ON analytics
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION analytics_rollup_insert();
+
+-- Recompute rollups from raw analytics for days >= since (backfill/repair;
+-- the trigger does not see UPDATEs or DELETEs)
+CREATE OR REPLACE FUNCTION rebuild_analytics_daily(since DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    rebuilt INTEGER;
+BEGIN
+    LOCK TABLE analytics IN SHARE MODE;
+    DELETE FROM analytics_daily WHERE day >= since;
+    INSERT INTO analytics_daily
+        (user_id, day, document_type, documents, failures, total_processing_ms, latency_sketch)
+    SELECT user_id, day, document_type, SUM(documents), SUM(failures), SUM(total_ms),
+           COALESCE(jsonb_object_agg(bucket, documents - failures)
+                    FILTER (WHERE bucket IS NOT NULL AND documents > failures), '{}'::jsonb)
+    FROM (
+        SELECT user_id, created_at::date AS day, COALESCE(document_type, 'unknown') AS document_type,
+               analytics_latency_bucket(processing_time_ms) AS bucket,
+               COUNT(*) AS documents,
+               COUNT(*) FILTER (WHERE success_rate = 0) AS failures,
+               COALESCE(SUM(processing_time_ms) FILTER (WHERE success_rate IS DISTINCT FROM 0), 0) AS total_ms
+        FROM analytics
+        WHERE user_id IS NOT NULL AND created_at >= since
+        GROUP BY 1, 2, 3, 4
+    ) AS buckets
+    GROUP BY user_id, day, document_type;
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transactions Table (normalized from bank statements, invoices and purchase orders)
+-- Hash-partitioned by user: every query is per user, so each touches one partition
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id BIGSERIAL,
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    document_id UUID NOT NULL REFERENCES documents(document_id) ON DELETE CASCADE,
+    source_type VARCHAR(100) NOT NULL,
+    txn_date DATE,
+    description TEXT,
+    amount NUMERIC(18,2) NOT NULL,
+    direction VARCHAR(10),
+    balance NUMERIC(18,2),
+    category VARCHAR(100),
+    counterparty VARCHAR(500),
+    reference VARCHAR(200),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, transaction_id)
+) PARTITION BY HASH (user_id);
+
+CREATE TABLE IF NOT EXISTS transactions_p0 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 0);
+CREATE TABLE IF NOT EXISTS transactions_p1 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 1);
+CREATE TABLE IF NOT EXISTS transactions_p2 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 2);
+CREATE TABLE IF NOT EXISTS transactions_p3 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 3);
+CREATE TABLE IF NOT EXISTS transactions_p4 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 4);
+CREATE TABLE IF NOT EXISTS transactions_p5 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 5);
+CREATE TABLE IF NOT EXISTS transactions_p6 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 6);
+CREATE TABLE IF NOT EXISTS transactions_p7 PARTITION OF transactions FOR VALUES WITH (MODULUS 8, REMAINDER 7);
+
 -- Indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id);
+-- Keyset pagination of a user's documents/history (newest first); also serves user_id lookups
+CREATE INDEX IF NOT EXISTS idx_documents_user_created ON documents(user_id, created_at DESC, document_id DESC);
 CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(processing_status);
+-- Durable dedup: one completed document per user, file and type
+CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_user_sha256 ON documents(user_id, file_sha256, document_type)
+    WHERE file_sha256 IS NOT NULL AND processing_status = 'completed';
 CREATE INDEX IF NOT EXISTS idx_documents_created_at ON documents(created_at);
 CREATE INDEX IF NOT EXISTS idx_processing_results_document_id ON processing_results(document_id);
-CREATE INDEX IF NOT EXISTS idx_history_user_id ON processing_history(user_id);
+CREATE INDEX IF NOT EXISTS idx_history_user_timestamp ON processing_history(user_id, action_timestamp DESC, history_id DESC);
 CREATE INDEX IF NOT EXISTS idx_history_document_id ON processing_history(document_id);
 CREATE INDEX IF NOT EXISTS idx_support_tickets_user_id ON support_tickets(user_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_date ON transactions(user_id, txn_date DESC);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_category_date ON transactions(user_id, category, txn_date);
+CREATE INDEX IF NOT EXISTS idx_transactions_document_id ON transactions(document_id);
 CREATE INDEX IF NOT EXISTS idx_support_tickets_status ON support_tickets(status);
 CREATE INDEX IF NOT EXISTS idx_analytics_user_id ON analytics(user_id);
 CREATE INDEX IF NOT EXISTS idx_analytics_created_at ON analytics(created_at);
@@ -0,0 +1,182 @@
+"""
+Per-statement database query metrics
+
+database.execute_query, execute_query_async, unit_of_work statements and
+the write-behind inserts record every query here:
+duration, rows, and the time spent waiting for a pooled connection, keyed
+by statement fingerprint (the SQL with literals and placeholders replaced
+by ?). Queries slower than DB_SLOW_QUERY_MS go to a bounded slow-query log,
+with their EXPLAIN plan captured at most once per fingerprint every
+DB_SLOW_QUERY_EXPLAIN_INTERVAL seconds. Served by GET /metrics.
+"""
+
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 500))
+DB_SLOW_QUERY_LOG_SIZE = int(os.getenv("DB_SLOW_QUERY_LOG_SIZE", 50))
+DB_SLOW_QUERY_EXPLAIN = os.getenv("DB_SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+DB_SLOW_QUERY_EXPLAIN_INTERVAL = int(os.getenv("DB_SLOW_QUERY_EXPLAIN_INTERVAL", 300))
+# Statements beyond this many distinct fingerprints are counted under "other"
+DB_QUERY_METRICS_MAX_STATEMENTS = int(os.getenv("DB_QUERY_METRICS_MAX_STATEMENTS", 500))
+
+# Upper bounds (ms) of the duration histogram buckets; the last is +Inf
+HISTOGRAM_BOUNDS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+EXPLAINABLE = ("select", "with", "insert", "update", "delete", "values")
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|\$\d+")
+_VALUE_LISTS = re.compile(r"\(\?(?:\s*,\s*\?)+\)")
+
+
+def fingerprint(query: str) -> tuple:
+    """(short id, normalized text) of a statement: whitespace collapsed, literals and placeholders as ?"""
+    text = _VALUE_LISTS.sub("(?, ...)", _LITERALS.sub("?", " ".join(query.split())))
+    return hashlib.md5(text.encode("utf-8")).hexdigest()[:12], text
+
+
+def _bucket(duration_ms: float) -> int:
+    for index, bound in enumerate(HISTOGRAM_BOUNDS_MS):
+        if duration_ms <= bound:
+            return index
+    return len(HISTOGRAM_BOUNDS_MS)
+
+
+def _histogram(counts: List[int]) -> Dict[str, int]:
+    labels = [f"le_{bound}" for bound in HISTOGRAM_BOUNDS_MS] + ["le_inf"]
+    return dict(zip(labels, counts))
+
+
+class _StatementStats:
+    def __init__(self, text: str):
+        self.text = text
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.pool_wait_ms = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def snapshot(self, fingerprint_id: str) -> Dict[str, Any]:
+        return {
+            "fingerprint": fingerprint_id,
+            "statement": self.text[:500],
+            "calls": self.calls,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 1),
+            "avg_ms": round(self.total_ms / self.calls, 2) if self.calls else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "avg_pool_wait_ms": round(self.pool_wait_ms / self.calls, 2) if self.calls else 0.0,
+            "histogram_ms": _histogram(self.histogram),
+        }
+
+
+class QueryMetrics:
+    """Thread-safe query timings, histograms and slow-query log"""
+
+    def __init__(self, slow_ms: float = DB_SLOW_QUERY_MS, log_size: int = DB_SLOW_QUERY_LOG_SIZE,
+                 max_statements: int = DB_QUERY_METRICS_MAX_STATEMENTS):
+        self.slow_ms = slow_ms
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._statements: Dict[str, _StatementStats] = {}
+        self._histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self._slow = deque(maxlen=log_size)
+        self._explained_at: Dict[str, float] = {}
+        self._started = time.time()
+
+    def record(self, query: str, duration: float, rows: int, pool_wait: Optional[float],
+               error: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Record one query (durations in seconds)
+
+        Returns:
+            its slow-query log entry if it was slow (attach_plan can add the
+            plan later), else None
+        """
+        fingerprint_id, text = fingerprint(query)
+        duration_ms = duration * 1000
+        pool_wait_ms = (pool_wait or 0.0) * 1000
+        with self._lock:
+            stats = self._statements.get(fingerprint_id)
+            if stats is None:
+                if len(self._statements) >= self.max_statements:
+                    fingerprint_id, text = "other", "(statements beyond DB_QUERY_METRICS_MAX_STATEMENTS)"
+                stats = self._statements.setdefault(fingerprint_id, _StatementStats(text))
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.rows += rows
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.pool_wait_ms += pool_wait_ms
+            stats.histogram[_bucket(duration_ms)] += 1
+            self._histogram[_bucket(duration_ms)] += 1
+            if duration_ms < self.slow_ms:
+                return None
+            entry = {
+                "at": datetime.utcnow().isoformat() + "Z",
+                "fingerprint": fingerprint_id,
+                "statement": text[:2000],
+                "duration_ms": round(duration_ms, 1),
+                "pool_wait_ms": round(pool_wait_ms, 1),
+                "rows": rows,
+                "error": error,
+                "plan": None,
+            }
+            self._slow.append(entry)
+        print(f"⚠️ Slow query {duration_ms:.0f}ms (pool wait {pool_wait_ms:.0f}ms, {rows} rows) "
+              f"[{fingerprint_id}]: {text[:200]}")
+        return entry
+
+    def should_explain(self, entry: Dict[str, Any], query: str) -> bool:
+        """Whether to capture a plan for this slow entry (rate-limited per fingerprint)"""
+        if not DB_SLOW_QUERY_EXPLAIN or entry["error"] or not query.lstrip().lower().startswith(EXPLAINABLE):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained_at.get(entry["fingerprint"])
+            if last is not None and now - last < DB_SLOW_QUERY_EXPLAIN_INTERVAL:
+                return False
+            self._explained_at[entry["fingerprint"]] = now
+        return True
+
+    def attach_plan(self, entry: Dict[str, Any], plan: Any) -> None:
+        with self._lock:
+            entry["plan"] = plan
+
+    def snapshot(self, top: int = 20) -> Dict[str, Any]:
+        """Totals, overall histogram, the top statements by total time, and the slow-query log"""
+        with self._lock:
+            statements = sorted(self._statements.items(), key=lambda item: item[1].total_ms, reverse=True)
+            calls = sum(stats.calls for _, stats in statements)
+            return {
+                "since": datetime.utcfromtimestamp(self._started).isoformat() + "Z",
+                "queries": calls,
+                "errors": sum(stats.errors for _, stats in statements),
+                "total_ms": round(sum(stats.total_ms for _, stats in statements), 1),
+                "histogram_ms": _histogram(self._histogram),
+                "slow_threshold_ms": self.slow_ms,
+                "statements": [stats.snapshot(fingerprint_id) for fingerprint_id, stats in statements[:top]],
+                "slow_queries": [dict(entry) for entry in reversed(self._slow)],
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._statements.clear()
+            self._histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+            self._slow.clear()
+            self._explained_at.clear()
+            self._started = time.time()
+
+
+query_metrics = QueryMetrics()
@@ -0,0 +1,212 @@
+"""
+Tenant-aware fair scheduling in front of the Celery document pipeline
+
+Jobs wait in per-tenant sub-queues split into priority lanes instead of going
+straight onto the FIFO Celery queue. A single dispatcher process feeds Celery
+only as fast as the OCR pool drains, picking the next job by:
+
+1. Lane: weighted round robin between lanes ("interactive" gets
+   LANE_WEIGHTS["interactive"] turns for every "bulk" turn).
+2. Tenant: weighted round robin across tenants with queued work in that lane,
+   so one tenant's 2,000 invoices cannot starve another's single statement.
+3. Job: within a tenant sub-queue, smallest page count first with aging
+   (score = enqueue time + pages * PAGE_AGING_SECONDS), so large documents
+   still make progress.
+
+Run the dispatcher with:  python fair_scheduler.py
+"""
+
+import os
+import json
+import time
+import heapq
+import itertools
+from typing import Optional, Dict, List, Any
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LANES = ("interactive", "bulk")
+LANE_WEIGHTS = {
+    "interactive": int(os.getenv("FAIR_LANE_WEIGHT_INTERACTIVE", 4)),
+    "bulk": int(os.getenv("FAIR_LANE_WEIGHT_BULK", 1)),
+}
+# Each page delays a job as if it had been submitted this many seconds later
+PAGE_AGING_SECONDS = float(os.getenv("FAIR_PAGE_AGING_SECONDS", 30))
+# Keep at most this many jobs waiting in the Celery ocr queue
+DISPATCH_TARGET_DEPTH = int(os.getenv("FAIR_DISPATCH_TARGET_DEPTH", 8))
+DISPATCH_POLL_SECONDS = float(os.getenv("FAIR_DISPATCH_POLL_SECONDS", 0.5))
+# Uploads of fair-queued jobs must outlive their wait in the sub-queue
+QUEUED_UPLOAD_TTL = int(os.getenv("FAIR_QUEUED_UPLOAD_TTL", 24 * 60 * 60))
+
+FAIR_QUEUE_PREFIX = "fair_queue"
+
+
+def job_score(enqueued_at: float, page_count: int) -> float:
+    """Ordering key within a tenant sub-queue (lower runs first)"""
+    return enqueued_at + max(page_count, 1) * PAGE_AGING_SECONDS
+
+
+class MemoryQueueStore:
+    """In-process sub-queue store, used by tests and the simulation benchmark"""
+
+    def __init__(self):
+        self._queues: Dict[tuple, list] = {}
+        self._counter = itertools.count()
+
+    def push(self, lane: str, tenant: str, score: float, job: Dict[str, Any]) -> None:
+        heapq.heappush(self._queues.setdefault((lane, tenant), []), (score, next(self._counter), job))
+
+    def active_tenants(self, lane: str) -> List[str]:
+        return sorted(tenant for (job_lane, tenant), queue in self._queues.items() if job_lane == lane and queue)
+
+    def pop(self, lane: str, tenant: str) -> Optional[Dict[str, Any]]:
+        queue = self._queues.get((lane, tenant))
+        if not queue:
+            return None
+        return heapq.heappop(queue)[2]
+
+    def depth(self) -> Dict[str, int]:
+        depths = {lane: 0 for lane in LANES}
+        for (lane, _), queue in self._queues.items():
+            depths[lane] += len(queue)
+        return depths
+
+
+class RedisQueueStore:
+    """
+    Redis-backed sub-queues shared by API processes and the dispatcher
+
+    Each (lane, tenant) is a sorted set scored by job_score; the set of
+    tenants with queued work per lane is kept alongside it.
+    """
+
+    # Pop and drop the tenant from the active set atomically, so a
+    # concurrent push cannot be orphaned
+    _POP_SCRIPT = """
+    local item = redis.call('ZPOPMIN', KEYS[1])
+    if redis.call('ZCARD', KEYS[1]) == 0 then
+        redis.call('SREM', KEYS[2], ARGV[1])
+    end
+    return item[1]
+    """
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._pop = redis_client.register_script(self._POP_SCRIPT)
+
+    def _queue_key(self, lane: str, tenant: str) -> str:
+        return f"{FAIR_QUEUE_PREFIX}:{lane}:{tenant}"
+
+    def _tenants_key(self, lane: str) -> str:
+        return f"{FAIR_QUEUE_PREFIX}:{lane}:tenants"
+
+    def push(self, lane: str, tenant: str, score: float, job: Dict[str, Any]) -> None:
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.zadd(self._queue_key(lane, tenant), {json.dumps(job): score})
+        pipe.sadd(self._tenants_key(lane), tenant)
+        pipe.execute()
+
+    def active_tenants(self, lane: str) -> List[str]:
+        return sorted(self.redis.smembers(self._tenants_key(lane)))
+
+    def pop(self, lane: str, tenant: str) -> Optional[Dict[str, Any]]:
+        raw = self._pop(keys=[self._queue_key(lane, tenant), self._tenants_key(lane)], args=[tenant])
+        return json.loads(raw) if raw else None
+
+    def depth(self) -> Dict[str, int]:
+        return {
+            lane: sum(self.redis.zcard(self._queue_key(lane, tenant)) for tenant in self.active_tenants(lane))
+            for lane in LANES
+        }
+
+
+class FairScheduler:
+    """Weighted round robin over lanes, then tenants, then shortest-job-first with aging"""
+
+    def __init__(self, store, lane_weights: Optional[Dict[str, int]] = None,
+                 tenant_weights: Optional[Dict[str, int]] = None):
+        self.store = store
+        self.lane_weights = lane_weights or LANE_WEIGHTS
+        self.tenant_weights = tenant_weights or {}
+        # Lane schedule, e.g. interactive x4 then bulk x1
+        self._lane_cycle = [lane for lane in LANES for _ in range(max(self.lane_weights.get(lane, 1), 1))]
+        self._lane_pos = 0
+        # Per-lane round robin position: (last tenant served, turns used)
+        self._tenant_turn: Dict[str, tuple] = {}
+
+    def submit(self, tenant: str, job: Dict[str, Any], lane: str = "interactive",
+               page_count: int = 1, enqueued_at: Optional[float] = None) -> None:
+        """Add a job to the tenant's sub-queue in the given lane"""
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane '{lane}'. Expected one of: {', '.join(LANES)}")
+        enqueued_at = time.time() if enqueued_at is None else enqueued_at
+        self.store.push(lane, tenant, job_score(enqueued_at, page_count), job)
+
+    def _next_tenant(self, lane: str, tenants: List[str]) -> str:
+        last, used = self._tenant_turn.get(lane, (None, 0))
+        if last in tenants and used < max(self.tenant_weights.get(last, 1), 1):
+            tenant, used = last, used + 1
+        else:
+            # Advance to the first tenant after the last one served
+            later = [t for t in tenants if last is None or t > last]
+            tenant, used = (later[0] if later else tenants[0]), 1
+        self._tenant_turn[lane] = (tenant, used)
+        return tenant
+
+    def next_job(self) -> Optional[Dict[str, Any]]:
+        """Pick the next job to dispatch, or None if every sub-queue is empty"""
+        for _ in range(len(self._lane_cycle)):
+            lane = self._lane_cycle[self._lane_pos]
+            self._lane_pos = (self._lane_pos + 1) % len(self._lane_cycle)
+
+            tenants = self.store.active_tenants(lane)
+            if not tenants:
+                continue
+            job = self.store.pop(lane, self._next_tenant(lane, tenants))
+            if job is not None:
+                return job
+        return None
+
+
+_scheduler: Optional[FairScheduler] = None
+
+
+def fair_scheduling_enabled() -> bool:
+    return os.getenv("FAIR_SCHEDULING", "false").lower() == "true"
+
+
+def get_scheduler(redis_client) -> FairScheduler:
+    """Return the process-wide Redis-backed scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        # e.g. FAIR_TENANT_WEIGHTS={"email:bigcustomer@example.com": 3}
+        tenant_weights = json.loads(os.getenv("FAIR_TENANT_WEIGHTS", "{}"))
+        _scheduler = FairScheduler(RedisQueueStore(redis_client), tenant_weights=tenant_weights)
+    return _scheduler
+
+
+def run_dispatcher(redis_client, ocr_queue: str = "ocr") -> None:
+    """Feed queued jobs to Celery, keeping the ocr queue at DISPATCH_TARGET_DEPTH"""
+    from tasks.document_processing import dispatch_document_job
+
+    scheduler = get_scheduler(redis_client)
+    print(f"✓ Fair scheduler dispatcher started (target depth: {DISPATCH_TARGET_DEPTH}, lanes: {LANE_WEIGHTS})")
+    while True:
+        try:
+            depth = redis_client.llen(ocr_queue)
+            while depth < DISPATCH_TARGET_DEPTH:
+                job = scheduler.next_job()
+                if job is None:
+                    break
+                dispatch_document_job(job)
+                depth += 1
+        except Exception as e:
+            print(f"Dispatcher error (retrying): {str(e)}")
+        time.sleep(DISPATCH_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    import redis
+    redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    run_dispatcher(redis.from_url(redis_url, decode_responses=True))
@@ -0,0 +1,124 @@
+"""
+Idempotency records for document processing requests
+
+A client retry (same Idempotency-Key header, or same file + user + document
+type when no header is sent) attaches to the original request instead of
+re-running OCR/LLM work and inserting duplicate database rows. Records live
+in Redis and hold references (document cache key, document id, job id),
+never the result itself.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+from typing import Optional, Dict, Any
+from dotenv import load_dotenv
+
+import result_store
+
+load_dotenv()
+
+IDEMPOTENCY_PREFIX = "idempotency"
+# How long a claimed request may run before another attempt can take over
+IN_FLIGHT_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_IN_FLIGHT_TTL", 35 * 60))
+# How long completed requests can be replayed
+COMPLETED_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL", 24 * 60 * 60))
+# How long a retry waits for the original in-flight request before giving up
+ATTACH_TIMEOUT_SECONDS = float(os.getenv("IDEMPOTENCY_ATTACH_TIMEOUT", 120))
+ATTACH_POLL_SECONDS = 1.0
+
+STATUS_IN_FLIGHT = "in_flight"
+STATUS_QUEUED = "queued"
+STATUS_COMPLETED = "completed"
+
+
+def idempotency_key(user_key: str, header_key: Optional[str], file_hash: str,
+                    document_type: Optional[str]) -> str:
+    """Build the record key, scoped to the caller so keys never collide across users"""
+    if header_key:
+        basis = f"{user_key}:header:{header_key}"
+    else:
+        basis = f"{user_key}:file:{file_hash}:{document_type or 'auto'}"
+    return f"{IDEMPOTENCY_PREFIX}:{hashlib.sha256(basis.encode()).hexdigest()}"
+
+
+def claim(redis_client, key: str) -> Optional[Dict[str, Any]]:
+    """
+    Claim key for this request
+
+    Returns:
+        None if this request now owns the key, otherwise the existing record
+    """
+    record = {"status": STATUS_IN_FLIGHT, "claimed_at": time.time()}
+    if redis_client.set(key, json.dumps(record), nx=True, ex=IN_FLIGHT_TTL_SECONDS):
+        return None
+    existing = redis_client.get(key)
+    if existing is None:
+        # Expired between SET and GET; try once more
+        if redis_client.set(key, json.dumps(record), nx=True, ex=IN_FLIGHT_TTL_SECONDS):
+            return None
+        existing = redis_client.get(key)
+    return json.loads(existing) if existing else None
+
+
+def mark_queued(redis_client, key: str, job_id: str) -> None:
+    """
+    Record that the request was handed to the async pipeline as job_id
+
+    Retries replay the job id while the job is alive; once it has failed or
+    is unknown the next retry takes the key over (see app.attach_to_idempotent_request).
+    """
+    record = {"status": STATUS_QUEUED, "job_id": job_id}
+    redis_client.set(key, json.dumps(record), ex=COMPLETED_TTL_SECONDS)
+
+
+def complete(redis_client, key: str, result_key: Optional[str], document_id: Optional[str]) -> None:
+    """Record where the finished result can be loaded from"""
+    record = {"status": STATUS_COMPLETED, "result_key": result_key, "document_id": document_id}
+    redis_client.set(key, json.dumps(record), ex=COMPLETED_TTL_SECONDS)
+
+
+def release(redis_client, key: str) -> None:
+    """Drop an in-flight claim after a failure so the next retry recomputes"""
+    try:
+        redis_client.delete(key)
+    except Exception as e:
+        print(f"Warning: Could not release idempotency key: {str(e)}")
+
+
+async def wait_for_completion(redis_client, key: str,
+                              timeout: float = ATTACH_TIMEOUT_SECONDS) -> Optional[Dict[str, Any]]:
+    """
+    Wait for an in-flight request to finish
+
+    Returns:
+        The final record, or None if the original request failed (claim
+        released) or is still running after timeout
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        raw = redis_client.get(key)
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        if record.get("status") != STATUS_IN_FLIGHT:
+            return record
+        await asyncio.sleep(ATTACH_POLL_SECONDS)
+    return None
+
+
+def load_result(redis_client, record: Dict[str, Any], database=None) -> Optional[Dict[str, Any]]:
+    """Load a completed request's result (or its result_store pointer) from the document cache, then the database"""
+    result_key = record.get("result_key")
+    if result_key:
+        # Inline result or result_store pointer
+        cached = result_store.load_cached(redis_client, result_key)
+        if cached is not None:
+            return cached
+    if database is not None and record.get("document_id"):
+        stored = database.get_processing_result(record["document_id"])
+        if stored and stored.get("extracted_data") is not None:
+            return stored["extracted_data"]
+    return None
@@ -0,0 +1,553 @@
+"""
+Pluggable backend for single-document async jobs
+
+/process/async, /job/{job_id}/status and /job/{job_id}/result talk to a
+JobBackend rather than to Celery directly:
+
+- CeleryJobBackend: the staged Celery chain (tasks.document_processing),
+  used when Celery and Redis are both available.
+- LocalJobBackend: an in-process process pool with job state in a SQLite
+  table, for single-node deployments or when Redis is down. It runs the
+  same stage functions (tasks/pipeline.py) and reports the same states
+  (PENDING, PROCESSING, SUCCESS, FAILURE) and progress messages, so clients
+  cannot tell the two apart.
+
+JOB_BACKEND selects one explicitly ("celery" or "local"); the default
+"auto" picks Celery when it is usable and the local pool otherwise.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+
+import result_store
+
+load_dotenv()
+
+JOB_BACKEND = os.getenv("JOB_BACKEND", "auto").lower()
+LOCAL_JOB_DB = os.getenv("LOCAL_JOB_DB", os.path.join(tempfile.gettempdir(), "finsight_jobs.sqlite3"))
+# Uploads waiting for a local worker are spooled here (removed when the job ends)
+LOCAL_JOB_DIR = os.getenv("LOCAL_JOB_DIR", os.path.join(tempfile.gettempdir(), "finsight_local_jobs"))
+LOCAL_JOB_WORKERS = int(os.getenv("LOCAL_JOB_WORKERS", 2))
+# Finished jobs are kept as long as Celery keeps results (result_expires)
+LOCAL_JOB_TTL = int(os.getenv("LOCAL_JOB_TTL", 3600))
+
+# Files are handed between the API and Celery workers by path, so with Celery
+# these must name volumes every API and worker host mounts (the defaults are
+# host-local temp directories)
+SHARED_STORAGE_SETTINGS = ("RESULT_STORE_DIR", "CONTENT_STORE_DIR", "UPLOAD_SESSION_DIR")
+
+STATE_PENDING = "PENDING"
+STATE_PROCESSING = "PROCESSING"
+STATE_SUCCESS = "SUCCESS"
+STATE_FAILURE = "FAILURE"
+
+
+class SharedStorageError(RuntimeError):
+    """A directory the API shares with Celery workers is left at its host-local default"""
+
+
+def check_shared_storage() -> None:
+    """
+    Raises:
+        SharedStorageError: a SHARED_STORAGE_SETTINGS variable is not set
+    """
+    missing = [name for name in SHARED_STORAGE_SETTINGS if not os.getenv(name)]
+    if missing:
+        raise SharedStorageError(
+            f"{', '.join(missing)} must be set to a volume shared by the API and the Celery workers "
+            f"(the default is a host-local temp directory)"
+        )
+
+
+class JobBackend(ABC):
+    """Interface shared by the Celery and local job backends"""
+    name = "base"
+    # Only the Celery backend can hand jobs to the fair scheduler's dispatcher
+    supports_fair_scheduling = False
+
+    @abstractmethod
+    def submit_document(self, content: Optional[bytes], filename: str, document_type: Optional[str],
+                        file_hash: Optional[str] = None, stored_path: Optional[str] = None,
+                        webhook: Optional[Dict[str, str]] = None) -> str:
+        """
+        Queue one document and return its job id
+
+        Pass stored_path instead of content for files in the content store,
+        and webhook ({"url", "user_key"}, see webhooks.py) to be called back
+        when the job finishes.
+        """
+
+    @abstractmethod
+    def status(self, job_id: str) -> Dict[str, Any]:
+        """
+        Current state of a job
+
+        Returns:
+            {"state": PENDING | PROCESSING | SUCCESS | FAILURE | other,
+             "meta": progress info or error details,
+             "result": final result, usually a result_store pointer}
+            Unknown job ids are PENDING, as with Celery.
+        """
+
+    def queue_depth(self) -> Optional[int]:
+        """Jobs waiting to start, or None if unknown"""
+        return None
+
+    def shutdown(self) -> None:
+        pass
+
+
+# ------------------------------
+# Celery
+# ------------------------------
+
+class CeleryJobBackend(JobBackend):
+    name = "celery"
+    supports_fair_scheduling = True
+
+    def __init__(self, celery_app):
+        self.celery_app = celery_app
+
+    def submit_document(self, content, filename, document_type, file_hash=None, stored_path=None, webhook=None):
+        from tasks.document_processing import prepare_document_job, prepare_stored_document_job, dispatch_document_job
+
+        if stored_path:
+            context = prepare_stored_document_job(stored_path, filename, document_type, file_hash)
+        else:
+            context = prepare_document_job(content, filename, document_type, file_hash=file_hash)
+        # report_stage_task queues the callback when the chain finishes
+        context["webhook"] = webhook
+        return dispatch_document_job(context)
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        task = self.celery_app.AsyncResult(job_id)
+
+        # ready()/successful()/failed() do not raise, unlike task.state on a broken result
+        task_state = STATE_PENDING
+        task_ready = False
+        try:
+            task_ready = task.ready()
+            if task_ready:
+                if task.successful():
+                    task_state = STATE_SUCCESS
+                elif task.failed():
+                    task_state = STATE_FAILURE
+                else:
+                    try:
+                        task_state = task.state
+                    except Exception:
+                        task_state = "UNKNOWN"
+            else:
+                try:
+                    task_state = task.state
+                    if task_state not in (STATE_PENDING, STATE_PROCESSING, "STARTED"):
+                        task_state = STATE_PENDING
+                except Exception:
+                    task_state = STATE_PENDING
+        except Exception as state_error:
+            print(f"ERROR getting task state for {job_id}: {str(state_error)}")
+            task_state = STATE_PENDING
+            task_ready = False
+
+        meta: Dict[str, Any] = {}
+        result = None
+        if task_ready:
+            try:
+                # propagate=False returns the exception instead of raising it
+                raw = task.get(propagate=False)
+                if task_state == STATE_SUCCESS:
+                    result = raw
+                elif isinstance(raw, dict):
+                    meta = raw
+                elif raw is not None:
+                    meta = {"error": str(raw)}
+            except Exception:
+                try:
+                    info = task.info
+                    if task_state == STATE_FAILURE:
+                        meta = info if isinstance(info, dict) else ({"error": str(info)} if info is not None else {})
+                    elif isinstance(info, dict):
+                        result = info.get("result")
+                except Exception:
+                    pass
+        else:
+            try:
+                info = task.info
+                if isinstance(info, dict):
+                    meta = info
+                elif info is not None and info != 'None':
+                    meta = {"info": str(info)}
+            except Exception:
+                meta = {}
+
+        return {"state": task_state, "meta": meta, "result": result}
+
+    def queue_depth(self) -> Optional[int]:
+        # Broker queue depth is read by the admission controller from Redis
+        return None
+
+
+# ------------------------------
+# Local process pool + SQLite
+# ------------------------------
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _init_db(db_path: str) -> None:
+    directory = os.path.dirname(os.path.abspath(db_path))
+    os.makedirs(directory, exist_ok=True)
+    with _connect(db_path) as conn:
+        # WAL lets the API read job state while workers write it
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                progress INTEGER NOT NULL DEFAULT 0,
+                message TEXT,
+                result TEXT,
+                error TEXT,
+                error_type TEXT,
+                filename TEXT,
+                owner TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state_updated ON jobs (state, updated_at)")
+
+
+def _update_job(db_path: str, job_id: str, **fields) -> None:
+    fields["updated_at"] = time.time()
+    assignments = ", ".join(f"{column} = ?" for column in fields)
+    with _connect(db_path) as conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", list(fields.values()) + [job_id])
+
+
+def _start_time(pid: int) -> Optional[str]:
+    """Process start time (clock ticks since boot) from /proc, None where unavailable"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+_instance_ids: Dict[int, str] = {}
+
+
+def _owner() -> str:
+    """
+    host:pid:start_time:random id. PIDs repeat (PID 1 in every container
+    start), so the start time and a per-process random id tell this process
+    apart from an earlier one with the same host and PID.
+    """
+    pid = os.getpid()
+    if pid not in _instance_ids:
+        _instance_ids[pid] = f"{_start_time(pid) or '-'}:{uuid.uuid4().hex[:12]}"
+    return f"{socket.gethostname()}:{pid}:{_instance_ids[pid]}"
+
+
+def _owner_exited(owner: str) -> bool:
+    """Whether the process that wrote owner (see _owner) on this host is gone"""
+    parts = owner.split(":")
+    if len(parts) not in (2, 4) or parts[0] != socket.gethostname() or not parts[1].isdigit():
+        return False
+    pid = int(parts[1])
+    if pid == os.getpid():
+        # Older host:pid owners included
+        return owner != _owner()
+    if len(parts) == 4:
+        current = _start_time(pid)
+        if parts[2] != "-" and current is not None and current != parts[2]:
+            return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def _init_worker() -> None:
+    """Pool initializer: load the app once per process (OCR, LLM client, Redis cache)"""
+    import app  # noqa: F401
+
+
+def run_document_job(db_path: str, job_id: str, file_path: str, filename: str,
+                     document_type: Optional[str], file_hash: str) -> None:
+    """
+    Worker side: run every pipeline stage for one document, recording
+    progress and the final result in the job table
+    """
+    from tasks.pipeline import extract_text_for_file, resolve_document_type, extract_structured_data, generate_reports
+
+    def progress(message: str, percent: int) -> None:
+        _update_job(db_path, job_id, state=STATE_PROCESSING, message=message, progress=percent)
+
+    try:
+        progress('Extracting text...', 10)
+        text = extract_text_for_file(file_path, filename)
+        print(f"Text extracted: {len(text)} characters")
+
+        if not document_type:
+            progress('Classifying document type...', 20)
+        resolved_type = resolve_document_type(text, document_type)
+
+        progress('Extracting structured data...', 40)
+        extracted = extract_structured_data(text, resolved_type)
+
+        progress('Generating reports...', 70)
+        reports = generate_reports(extracted, text, resolved_type)
+
+        final_result = {
+            "extracted_data": extracted,
+            "reports": reports,
+            "document_type": resolved_type,
+            "filename": filename
+        }
+        # The job row and the document cache hold the same result_store pointer
+        final_result = result_store.store(final_result)
+        _cache_document_result(file_hash, document_type, final_result)
+    except Exception as e:
+        print(f"ERROR in local job {job_id}: {type(e).__name__}: {str(e)}")
+        # Same shape the Celery stages return (not raise) on error
+        final_result = {
+            'status': 'failed',
+            'error': str(e),
+            'error_type': type(e).__name__,
+            'result': None
+        }
+    _update_job(db_path, job_id, state=STATE_SUCCESS, progress=100, message=None, result=json.dumps(final_result))
+
+
+def _cache_document_result(file_hash: str, document_type: Optional[str], stored_result: Dict) -> None:
+    """Cache the stored result under the same key /process looks up, if Redis is up"""
+    from app import redis_client, REDIS_AVAILABLE, get_document_cache_key_for_hash
+
+    if not (REDIS_AVAILABLE and redis_client):
+        return
+    try:
+        redis_client.setex(get_document_cache_key_for_hash(file_hash, document_type), 604800, json.dumps(stored_result))
+    except Exception as cache_error:
+        print(f"Warning: Could not cache result in local job: {str(cache_error)}")
+
+
+class LocalJobBackend(JobBackend):
+    name = "local"
+
+    def __init__(self, db_path: str = LOCAL_JOB_DB, spool_dir: str = LOCAL_JOB_DIR,
+                 max_workers: int = LOCAL_JOB_WORKERS, ttl: int = LOCAL_JOB_TTL, redis_client=None):
+        self.db_path = db_path
+        self.redis_client = redis_client
+        self.spool_dir = spool_dir
+        self.max_workers = max(1, max_workers)
+        self.ttl = ttl
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._webhooks = None
+        self._lock = threading.Lock()
+        _init_db(db_path)
+        self._fail_orphaned_jobs()
+
+    def _get_pool(self, replace: bool = False) -> ProcessPoolExecutor:
+        with self._lock:
+            if replace and self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            if self._pool is None:
+                # Started on first use so importing app in a worker does not start another pool
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker)
+            return self._pool
+
+    def _fail_orphaned_jobs(self) -> None:
+        """Jobs whose owning API process on this host has exited will never finish"""
+        with _connect(self.db_path) as conn:
+            rows = conn.execute(
+                "SELECT job_id, owner FROM jobs WHERE state IN (?, ?)", (STATE_PENDING, STATE_PROCESSING)
+            ).fetchall()
+        orphaned = [row["job_id"] for row in rows if _owner_exited(row["owner"] or "")]
+        for job_id in orphaned:
+            _update_job(self.db_path, job_id, state=STATE_FAILURE,
+                        error="Job was interrupted: the server restarted before it finished",
+                        error_type="JobInterrupted")
+        if orphaned:
+            print(f"⚠️ Marked {len(orphaned)} interrupted local jobs as failed")
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl
+        with _connect(self.db_path) as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?", (STATE_SUCCESS, STATE_FAILURE, cutoff)
+            )
+
+    def submit_document(self, content, filename, document_type, file_hash=None, stored_path=None, webhook=None):
+        job_id = str(uuid.uuid4())
+        job_dir = None
+        if stored_path:
+            # Content-store file: read in place, it outlives the job
+            file_path = stored_path
+        else:
+            job_dir = os.path.join(self.spool_dir, job_id)
+            os.makedirs(job_dir, exist_ok=True)
+            file_path = os.path.join(job_dir, os.path.basename(filename) or "upload")
+            with open(file_path, "wb") as f:
+                f.write(content)
+            file_hash = file_hash or hashlib.sha256(content).hexdigest()
+
+        now = time.time()
+        self._purge_expired()
+        with _connect(self.db_path) as conn:
+            # Visible as queued straight away, like prepare_document_job on the Celery path
+            conn.execute(
+                "INSERT INTO jobs (job_id, state, progress, message, filename, owner, created_at, updated_at) "
+                "VALUES (?, ?, 0, 'Queued...', ?, ?, ?, ?)",
+                (job_id, STATE_PROCESSING, filename, _owner(), now, now)
+            )
+
+        args = (self.db_path, job_id, file_path, filename, document_type, file_hash)
+        try:
+            future = self._get_pool().submit(run_document_job, *args)
+        except BrokenProcessPool:
+            print("⚠️ Local job pool was broken (a worker died); starting a new one")
+            future = self._get_pool(replace=True).submit(run_document_job, *args)
+        except Exception:
+            self._job_finished(job_id, job_dir, None)
+            raise
+        future.add_done_callback(lambda f: self._job_finished(job_id, job_dir, f, webhook))
+        return job_id
+
+    def _job_finished(self, job_id: str, job_dir: Optional[str], future,
+                      webhook: Optional[Dict[str, str]] = None) -> None:
+        """Remove the spooled upload, record jobs that died with their worker, fire the webhook"""
+        if job_dir:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        error = None
+        if future is None:
+            error = RuntimeError("Job could not be submitted to the local pool")
+        elif future.cancelled():
+            error = RuntimeError("Job was cancelled")
+        else:
+            error = future.exception()
+        if error is not None:
+            print(f"ERROR in local job {job_id}: {type(error).__name__}: {str(error)}")
+            _update_job(self.db_path, job_id, state=STATE_FAILURE, error=str(error), error_type=type(error).__name__)
+        if webhook:
+            self._notify(job_id, webhook)
+
+    def _notify(self, job_id: str, webhook: Dict[str, str]) -> None:
+        import webhooks
+
+        try:
+            job = self.status(job_id)
+            error = job["meta"] if job["state"] == STATE_FAILURE else None
+            with self._lock:
+                if self._webhooks is None:
+                    self._webhooks = webhooks.LocalDeliveryWorker(self.redis_client)
+            self._webhooks.submit(webhook, webhooks.build_event(job_id, job["result"], error))
+        except Exception as e:
+            print(f"Warning: Could not queue webhook for job {job_id}: {str(e)}")
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        with _connect(self.db_path) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return {"state": STATE_PENDING, "meta": {}, "result": None}
+        if row["state"] == STATE_SUCCESS:
+            return {"state": STATE_SUCCESS, "meta": {}, "result": json.loads(row["result"]) if row["result"] else None}
+        if row["state"] == STATE_FAILURE:
+            return {"state": STATE_FAILURE, "meta": {"error": row["error"], "error_type": row["error_type"]}, "result": None}
+        return {
+            "state": row["state"],
+            "meta": {"status": row["message"], "progress": row["progress"]},
+            "result": None
+        }
+
+    def queue_depth(self) -> Optional[int]:
+        with _connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = ? AND message = 'Queued...' AND owner = ?",
+                (STATE_PROCESSING, _owner())
+            ).fetchone()
+        return row[0]
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            if self._webhooks is not None:
+                self._webhooks.shutdown()
+                self._webhooks = None
+
+
+def create_job_backend(celery_app=None, redis_client=None) -> JobBackend:
+    """Pick the job backend from JOB_BACKEND and what is reachable (redis_client is None if Redis is down)"""
+    celery_usable = celery_app is not None and redis_client is not None
+    if celery_usable and JOB_BACKEND != "local":
+        try:
+            check_shared_storage()
+        except SharedStorageError as e:
+            if JOB_BACKEND == "celery":
+                # Workers on other hosts could not open the API's files (or the API theirs)
+                raise
+            print(f"⚠️ Not using Celery: {str(e)}")
+            celery_usable = False
+    if JOB_BACKEND == "celery" or (JOB_BACKEND == "auto" and celery_usable):
+        if celery_usable:
+            print("✓ Job backend: Celery")
+            return CeleryJobBackend(celery_app)
+        print("⚠️ JOB_BACKEND=celery but Celery/Redis is not available; using the local process pool")
+    elif JOB_BACKEND not in ("auto", "local"):
+        print(f"⚠️ Unknown JOB_BACKEND '{JOB_BACKEND}'; using auto selection")
+        if celery_usable:
+            print("✓ Job backend: Celery")
+            return CeleryJobBackend(celery_app)
+    backend = LocalJobBackend(redis_client=redis_client)
+    print(f"✓ Job backend: local process pool ({backend.max_workers} workers, jobs in {backend.db_path})")
+    return backend
+
+
+_backend: Optional[JobBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_job_backend(celery_app=None, redis_client=None) -> JobBackend:
+    """
+    The process-wide job backend, created on first call
+
+    Lazy so that processes which only import app (Celery workers, batch CLI
+    workers, local pool workers) never open the job DB or fail another
+    process's jobs as orphaned.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_job_backend(celery_app, redis_client)
+        return _backend
+
+
+def shutdown_job_backend() -> None:
+    """Shut down the backend if this process created one"""
+    global _backend
+    with _backend_lock:
+        if _backend is not None:
+            _backend.shutdown()
+            _backend = None
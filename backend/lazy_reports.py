@@ -0,0 +1,211 @@
+"""
+Reports generated on first access
+
+/process can return a document's extracted data without waiting for every
+report (reports=none, or reports=name,name,...). The extracted data and OCR
+text are kept in Redis as the document's report context, and
+
+    GET /documents/{document_id}/reports/{report_name}
+
+generates a report from it the first time it is requested and caches it.
+A per-report lock makes concurrent first requests share one generation, so
+each report's LLM calls run at most once per document.
+"""
+
+import os
+import json
+import time
+import uuid
+from typing import Dict, Any, Callable, Iterable, List, Optional, Set
+from dotenv import load_dotenv
+
+from report_generators import REPORT_NAMES, TEXT_DEPENDENT_REPORTS
+
+load_dotenv()
+
+REPORT_CONTEXT_TTL = int(os.getenv("REPORT_CONTEXT_TTL", 7 * 24 * 60 * 60))
+# Longest a single report generation may hold its lock
+REPORT_LOCK_SECONDS = int(os.getenv("REPORT_LOCK_SECONDS", 300))
+POLL_INTERVAL_SECONDS = 0.5
+
+CONTEXT_PREFIX = "report_context"
+REPORT_PREFIX = "document_report"
+
+DOCUMENT_TYPE_ALIASES = {
+    "gst_document": "gst_return",
+    "p&l": "profit_loss",
+    "po": "purchase_order",
+    "payslip": "salary_slip",
+    "audit": "audit_papers",
+    "agreement": "agreement_contract",
+    "contract": "agreement_contract",
+}
+
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class ReportBusyError(Exception):
+    """Another request is still generating the report"""
+
+
+class ReportUnavailableError(Exception):
+    """The report needs the OCR text, which is no longer kept for this document"""
+
+
+def canonical_type(document_type: Optional[str]) -> Optional[str]:
+    return DOCUMENT_TYPE_ALIASES.get(document_type, document_type)
+
+
+def available_reports(document_type: Optional[str]) -> List[str]:
+    return list(REPORT_NAMES.get(canonical_type(document_type), []))
+
+
+def needs_text(document_type: Optional[str], report_name: str) -> bool:
+    """Whether the report is generated from the OCR text rather than the extracted data"""
+    return report_name in TEXT_DEPENDENT_REPORTS.get(canonical_type(document_type), ())
+
+
+def parse_selection(value: Optional[str], document_type: Optional[str]) -> Optional[Set[str]]:
+    """
+    Parse a reports= parameter: "all" (or empty) -> None, "none" -> empty set,
+    otherwise a comma-separated list of report names
+
+    Raises:
+        ValueError: a name is not a report of this document type
+    """
+    value = (value or "").strip().lower()
+    if value in ("", "all"):
+        return None
+    if value == "none":
+        return set()
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names - set(available_reports(document_type))
+    if unknown:
+        raise ValueError(
+            f"Unknown report(s) for {document_type or 'this document'}: {', '.join(sorted(unknown))}. "
+            f"Available: {', '.join(available_reports(document_type)) or 'none'}"
+        )
+    return names
+
+
+def selection_covered(value: Optional[str], pending: Iterable[str]) -> bool:
+    """
+    Whether a result with these reports still pending satisfies a reports=
+    parameter (unparsed, so it can be checked before the type is known)
+    """
+    pending = set(pending)
+    if not pending:
+        return True
+    value = (value or "").strip().lower()
+    if value in ("", "all"):
+        return False
+    if value == "none":
+        return True
+    return not ({name.strip() for name in value.split(",")} & pending)
+
+
+def report_url(document_id: str, report_name: str) -> str:
+    return f"/documents/{document_id}/reports/{report_name}"
+
+
+def _context_key(document_id: str) -> str:
+    return f"{CONTEXT_PREFIX}:{document_id}"
+
+
+def _report_key(document_id: str, report_name: str) -> str:
+    return f"{REPORT_PREFIX}:{document_id}:{report_name}"
+
+
+def save_context(redis_client, document_id: str, document_type: str, extracted_data: Dict[str, Any],
+                 text: str, reports: Optional[Dict[str, Any]] = None) -> None:
+    """Keep what later report generation needs, plus any reports already generated"""
+    context = {
+        "document_type": canonical_type(document_type),
+        "extracted_data": {k: v for k, v in extracted_data.items() if k != "reports"},
+        "text": text or "",
+    }
+    pipe = redis_client.pipeline()
+    pipe.setex(_context_key(document_id), REPORT_CONTEXT_TTL, json.dumps(context))
+    for name, report in (reports or {}).items():
+        pipe.setex(_report_key(document_id, name), REPORT_CONTEXT_TTL, json.dumps(report))
+    pipe.execute()
+
+
+def load_context(redis_client, document_id: str) -> Optional[Dict[str, Any]]:
+    raw = redis_client.get(_context_key(document_id))
+    return json.loads(raw) if raw else None
+
+
+def get_cached(redis_client, document_id: str, report_name: str) -> Optional[Any]:
+    raw = redis_client.get(_report_key(document_id, report_name))
+    return json.loads(raw) if raw else None
+
+
+def generate(redis_client, document_id: str, report_name: str, context: Dict[str, Any],
+             persist: Optional[Callable[[str, str, Any], Any]] = None) -> Any:
+    """
+    Return the report, generating and caching it on first access (blocking)
+
+    persist(document_id, report_name, report) is called with a newly
+    generated report so it outlives the Redis cache (e.g. in the database).
+
+    Raises:
+        ReportBusyError: another request held the lock for REPORT_LOCK_SECONDS
+        ReportUnavailableError: the report needs OCR text the context lacks
+    """
+    from tasks.pipeline import generate_reports
+
+    cached = get_cached(redis_client, document_id, report_name)
+    if cached is not None:
+        return cached
+    if not context.get("text") and needs_text(context["document_type"], report_name):
+        raise ReportUnavailableError(
+            f"Report {report_name} is generated from the document text, which is no longer kept. "
+            f"Process the document again with reports={report_name}."
+        )
+
+    lock_key = f"{_report_key(document_id, report_name)}:lock"
+    token = uuid.uuid4().hex
+    deadline = time.time() + REPORT_LOCK_SECONDS
+    while not redis_client.set(lock_key, token, nx=True, ex=REPORT_LOCK_SECONDS):
+        # Someone else is generating it: wait for their result, or take the
+        # lock over once it is gone (released, expired, or its holder died)
+        if time.time() >= deadline:
+            raise ReportBusyError(f"Report {report_name} is still being generated")
+        time.sleep(POLL_INTERVAL_SECONDS)
+        cached = get_cached(redis_client, document_id, report_name)
+        if cached is not None:
+            return cached
+
+    try:
+        # The previous holder may have cached it just before releasing
+        cached = get_cached(redis_client, document_id, report_name)
+        if cached is not None:
+            return cached
+        started = time.time()
+        reports = generate_reports(
+            context["extracted_data"], context.get("text", ""), context["document_type"], only={report_name}
+        )
+        if report_name not in reports:
+            raise ValueError(f"Could not generate report {report_name}")
+        report = reports[report_name]
+        pipe = redis_client.pipeline()
+        pipe.setex(_report_key(document_id, report_name), REPORT_CONTEXT_TTL, json.dumps(report))
+        pipe.expire(_context_key(document_id), REPORT_CONTEXT_TTL)
+        pipe.execute()
+        print(f"✓ Generated report {report_name} for document {document_id} in {time.time() - started:.1f}s")
+        if persist is not None:
+            try:
+                persist(document_id, report_name, report)
+            except Exception as e:
+                print(f"Warning: Could not persist report {report_name} for document {document_id}: {str(e)}")
+        return report
+    finally:
+        # Only our own lock: after it expired, another request may hold a new one
+        redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, lock_key, token)
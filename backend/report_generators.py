@@ -187,7 +187,43 @@ def generate_content_vertexai(prompt: str, require_json: bool = False, max_retri
         raise ValueError(f"Failed to generate content: {str(e)}")
 
 
-def generate_bank_statement_reports(base_data, text):
+# Reports each generator produces, by document type
+REPORT_NAMES = {
+    "bank_statement": ["cash_flow_statement", "ledger_entries", "payment_receipt_summary",
+                       "anomaly_suspicious_transaction_report", "bank_reconciliation"],
+    "gst_return": ["gst_reconciliation", "itc_utilization_report", "output_vs_input_tax_summary",
+                   "gst_liability_statement", "gstr_vs_invoice_match_report"],
+    "invoice": ["sales_ledger", "customer_outstanding_summary", "gst_breakdown", "invoice_aging",
+                "payment_due_summary"],
+    "purchase_order": ["vendor_ledger", "purchase_summary", "category_spend_report", "po_vs_invoice_matching",
+                       "payables_summary"],
+    "salary_slip": ["salary_summary", "allowances_deductions_report", "pf_esi_tds_summary",
+                    "employee_cost_report", "payroll_journal_entries"],
+    "profit_loss": ["profitability_summary", "revenue_vs_expense_analysis", "margin_kpis",
+                    "operating_vs_non_operating_split", "period_wise_profit_trend"],
+    "trial_balance": ["profit_loss", "balance_sheet", "cash_flow", "accounting_ratios", "management_report"],
+    "balance_sheet": ["asset_liability_schedules", "net_worth_statement", "solvency_liquidity_summary",
+                      "equity_movement_statement", "financial_position_report"],
+    "audit_papers": ["audit_ready_summary", "supporting_schedules", "adjustment_notes", "working_papers",
+                     "final_audit_pack"],
+    "agreement_contract": ["contract_summary", "key_clause_extraction", "risk_obligation_analysis",
+                           "term_compliance_summary", "contract_analysis"],
+}
+
+# Reports built from the OCR text rather than the extracted data: they cannot
+# be generated once only the stored extracted data is left
+TEXT_DEPENDENT_REPORTS = {
+    "audit_papers": {"audit_ready_summary"},
+    "agreement_contract": set(REPORT_NAMES["agreement_contract"]),
+}
+
+
+def _wanted(only, report_name):
+    """Whether a generator should compute report_name (only=None means every report)"""
+    return only is None or report_name in only
+
+
+def generate_bank_statement_reports(base_data, text, only=None):
     """Generate all 5 reports for Bank Statement"""
     reports = {}
     transactions = base_data.get("transactions", [])
@@ -223,11 +259,12 @@ def generate_bank_statement_reports(base_data, text):
 Base Data: {json.dumps(base_data, indent=2)[:3000]}
 Return ONLY JSON."""
     
-    try:
-        content = generate_content_vertexai(cash_flow_prompt, require_json=True)
-        reports["cash_flow_statement"] = json.loads(content)
-    except Exception as e:
-        reports["cash_flow_statement"] = {"error": f"Could not generate: {str(e)}"}
+    if _wanted(only, "cash_flow_statement"):
+        try:
+            content = generate_content_vertexai(cash_flow_prompt, require_json=True)
+            reports["cash_flow_statement"] = json.loads(content)
+        except Exception as e:
+            reports["cash_flow_statement"] = {"error": f"Could not generate: {str(e)}"}
     
     # 2. Ledger Entries
     ledger_entries = []
@@ -304,11 +341,12 @@ Return JSON:
 Transactions: {json.dumps(transactions[:100], indent=2)[:4000]}
 Return ONLY JSON."""
     
-    try:
-        content = generate_content_vertexai(anomaly_prompt, require_json=True)
-        reports["anomaly_suspicious_transaction_report"] = json.loads(content)
-    except Exception as e:
-        reports["anomaly_suspicious_transaction_report"] = {"error": f"Could not generate: {str(e)}"}
+    if _wanted(only, "anomaly_suspicious_transaction_report"):
+        try:
+            content = generate_content_vertexai(anomaly_prompt, require_json=True)
+            reports["anomaly_suspicious_transaction_report"] = json.loads(content)
+        except Exception as e:
+            reports["anomaly_suspicious_transaction_report"] = {"error": f"Could not generate: {str(e)}"}
     
     # 5. Bank Reconciliation Sheet
     reports["bank_reconciliation"] = {
@@ -326,7 +364,7 @@ Return ONLY JSON."""
     return reports
 
 
-def generate_gst_return_reports(base_data, text):
+def generate_gst_return_reports(base_data, text, only=None):
     """Generate all 5 reports for GST Return"""
     reports = {}
     
@@ -423,6 +461,8 @@ Return ONLY JSON."""
     }
     
     for report_name, prompt in prompts.items():
+        if not _wanted(only, report_name):
+            continue
         try:
             content = generate_content_vertexai(prompt, require_json=True)
             reports[report_name] = json.loads(content)
@@ -729,7 +769,7 @@ Return ONLY valid JSON with REAL extracted data. No explanations or markdown for
         }
 
 
-def generate_invoice_reports(base_data, text):
+def generate_invoice_reports(base_data, text, only=None):
     """Generate all 5 reports for Invoice"""
     reports = {}
     
@@ -818,7 +858,7 @@ def generate_invoice_reports(base_data, text):
     return reports
 
 
-def generate_purchase_order_reports(base_data, text):
+def generate_purchase_order_reports(base_data, text, only=None):
     """Generate all 5 reports for Purchase Order"""
     reports = {}
     
@@ -890,7 +930,7 @@ def generate_purchase_order_reports(base_data, text):
     return reports
 
 
-def generate_salary_slip_reports(base_data, text):
+def generate_salary_slip_reports(base_data, text, only=None):
     """Generate all 5 reports for Salary Slip"""
     reports = {}
     
@@ -998,7 +1038,7 @@ def generate_salary_slip_reports(base_data, text):
     return reports
 
 
-def generate_profit_loss_reports(base_data, text):
+def generate_profit_loss_reports(base_data, text, only=None):
     """Generate all 5 reports for Profit & Loss Statement"""
     reports = {}
     
@@ -1067,7 +1107,7 @@ def generate_profit_loss_reports(base_data, text):
     return reports
 
 
-def generate_trial_balance_reports(base_data, text):
+def generate_trial_balance_reports(base_data, text, only=None):
     """Generate all 5 reports for Trial Balance with comprehensive financial analysis"""
     reports = {}
     
@@ -1491,13 +1531,12 @@ Provide a detailed analysis covering:
 
 Return as a single comprehensive text analysis (not JSON)."""
     
-    try:
+    analysis_text = ""
+    if _wanted(only, "management_report"):
         try:
             analysis_text = generate_content_vertexai(analysis_prompt, require_json=False)
         except Exception as e:
             analysis_text = f"Analysis generation error: {str(e)}"
-    except Exception as e:
-        analysis_text = f"Analysis generation error: {str(e)}"
     
     reports["management_report"] = {
         "entity_name": base_data.get("entity_name", ""),
@@ -1649,7 +1688,7 @@ def calculate_trial_balance_ratios(current_assets, current_liabilities, cash, in
     }
 
 
-def generate_balance_sheet_reports(base_data, text):
+def generate_balance_sheet_reports(base_data, text, only=None):
     """Generate all 5 reports for Balance Sheet"""
     reports = {}
     
@@ -1739,7 +1778,7 @@ def generate_balance_sheet_reports(base_data, text):
     return reports
 
 
-def generate_audit_papers_reports(base_data, text):
+def generate_audit_papers_reports(base_data, text, only=None):
     """Generate all 5 reports for Audit Papers"""
     reports = {}
     
@@ -1759,11 +1798,13 @@ Base Data: {json.dumps(base_data, indent=2)[:3000] if base_data else "None"}
 OCR Text: {text[:4000]}
 Return ONLY JSON."""
     
-    try:
-        content = generate_content_vertexai(audit_prompt, require_json=True)
-        audit_summary = json.loads(content)
-    except Exception as e:
-        audit_summary = {"error": f"Could not generate audit summary: {str(e)}"}
+    audit_summary = {}
+    if _wanted(only, "audit_ready_summary"):
+        try:
+            content = generate_content_vertexai(audit_prompt, require_json=True)
+            audit_summary = json.loads(content)
+        except Exception as e:
+            audit_summary = {"error": f"Could not generate audit summary: {str(e)}"}
     
     reports["audit_ready_summary"] = audit_summary
     reports["supporting_schedules"] = {"schedules": []}
@@ -1935,7 +1976,7 @@ Return ONLY valid JSON. No explanations or markdown formatting."""
         }
 
 
-def generate_agreement_contract_reports(base_data, text):
+def generate_agreement_contract_reports(base_data, text, only=None):
     """Generate all 5 reports for Agreements/Contracts"""
     reports = {}
     
@@ -1,12 +1,10 @@
 #!/bin/bash
-# Restart Celery worker
+# Restart Celery workers
 
 echo "Stopping existing Celery workers..."
-pkill -f "celery.*worker.*document_processing" || true
+pkill -f "celery.*worker" || true
 sleep 2
 
-echo "Starting Celery worker..."
+echo "Starting Celery workers..."
 cd "$(dirname "$0")"
-source venv/bin/activate
-celery -A celery_app worker --loglevel=info --concurrency=2 --queues=document_processing --hostname=worker@%h
-
+./start_celery_worker.sh
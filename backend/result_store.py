@@ -0,0 +1,167 @@
+"""
+Store for complete document results
+
+A finished document (extracted data plus every report) is often hundreds of
+KB of JSON. It is written once, as a file under RESULT_STORE_DIR named by the
+SHA-256 of its bytes, and everything else (the Celery task result, the
+local job table, the document cache) holds a small pointer:
+
+    {"result_ref": "<sha256>", "size": <bytes>, "summary": {...}}
+
+/job/{job_id}/result and cache hits stream the file back without loading it.
+Results smaller than RESULT_INLINE_MAX_BYTES (e.g. error results) are not
+worth a file and stay inline. RESULT_STORE_DIR must be a volume shared by
+the API and the Celery report workers; the Celery job backend and workers
+refuse to start without it (job_backend.check_shared_storage).
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+from typing import Dict, Any, Iterator, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RESULT_STORE_DIR = os.getenv(
+    "RESULT_STORE_DIR",
+    os.path.join(tempfile.gettempdir(), "finsight_result_store")
+)
+RESULT_INLINE_MAX_BYTES = int(os.getenv("RESULT_INLINE_MAX_BYTES", 16 * 1024))
+# Outlives the 7-day document cache entries that point at it
+RESULT_STORE_TTL = int(os.getenv("RESULT_STORE_TTL", 8 * 24 * 60 * 60))
+READ_CHUNK_SIZE = 64 * 1024
+PURGE_INTERVAL_SECONDS = 60 * 60
+
+_last_purge = 0.0
+
+
+def summarize(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Small description of a result, kept alongside its pointer"""
+    extracted = result.get("extracted_data")
+    reports = result.get("reports")
+    return {
+        "document_type": result.get("document_type"),
+        "filename": result.get("filename"),
+        "status": result.get("status", "completed"),
+        "extracted_fields": len(extracted) if isinstance(extracted, dict) else None,
+        "reports": sorted(reports) if isinstance(reports, dict) else [],
+        "pending_reports": sorted(result.get("pending_reports") or {}),
+    }
+
+
+def is_pointer(value: Any) -> bool:
+    return isinstance(value, dict) and "result_ref" in value and "extracted_data" not in value
+
+
+def _path_for(ref: str) -> str:
+    ref = ref.lower()
+    if len(ref) != 64 or any(c not in "0123456789abcdef" for c in ref):
+        raise ValueError(f"Invalid result reference: {ref!r}")
+    return os.path.join(RESULT_STORE_DIR, ref[:2], f"{ref}.json")
+
+
+def store(result: Any, inline_max: int = RESULT_INLINE_MAX_BYTES) -> Any:
+    """
+    Write a result once and return its pointer, or the result itself if small
+
+    Identical results (e.g. the same document processed twice) share a file.
+    """
+    data = json.dumps(result).encode("utf-8")
+    if len(data) <= inline_max or not isinstance(result, dict):
+        return result
+
+    ref = hashlib.sha256(data).hexdigest()
+    path = _path_for(ref)
+    if os.path.exists(path):
+        # Refresh the mtime so purge_expired keeps it as long as its newest pointer
+        os.utime(path, None)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, staged = tempfile.mkstemp(prefix=".incoming_", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(staged, path)
+        except BaseException:
+            if os.path.exists(staged):
+                os.unlink(staged)
+            raise
+    _maybe_purge()
+    return {"result_ref": ref, "size": len(data), "summary": summarize(result)}
+
+
+def exists(value: Any) -> bool:
+    """False for a pointer whose file has been purged (or is on another host)"""
+    return not is_pointer(value) or os.path.exists(_path_for(value["result_ref"]))
+
+
+def load(value: Any) -> Any:
+    """The full result for a pointer (inline results are returned as is)"""
+    if not is_pointer(value):
+        return value
+    try:
+        with open(_path_for(value["result_ref"]), "rb") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise KeyError(f"Stored result not found or expired: {value['result_ref']}")
+
+
+def iter_bytes(value: Any, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """The result's JSON in chunks, read from disk for pointers"""
+    if not is_pointer(value):
+        yield json.dumps(value).encode("utf-8")
+        return
+    with open(_path_for(value["result_ref"]), "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            yield block
+
+
+def purge_expired(max_age: int = RESULT_STORE_TTL) -> int:
+    """Delete result files not written or re-stored for max_age seconds"""
+    cutoff = time.time() - max_age
+    removed = 0
+    if not os.path.isdir(RESULT_STORE_DIR):
+        return 0
+    for shard in os.listdir(RESULT_STORE_DIR):
+        shard_dir = os.path.join(RESULT_STORE_DIR, shard)
+        if not os.path.isdir(shard_dir):
+            continue
+        for name in os.listdir(shard_dir):
+            path = os.path.join(shard_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    if removed:
+        print(f"✓ Purged {removed} expired stored results")
+    return removed
+
+
+def _maybe_purge() -> None:
+    global _last_purge
+    now = time.time()
+    if now - _last_purge < PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = now
+    try:
+        purge_expired()
+    except Exception as e:
+        print(f"Warning: Could not purge stored results: {str(e)}")
+
+
+def load_cached(redis_client, cache_key: str) -> Optional[Any]:
+    """
+    Read a document cache entry (inline result or pointer)
+
+    Returns None on a miss, including a pointer whose file is gone.
+    """
+    raw = redis_client.get(cache_key)
+    if not raw:
+        return None
+    value = json.loads(raw)
+    return value if exists(value) else None
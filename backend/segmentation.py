@@ -0,0 +1,197 @@
+"""
+Split a multi-document PDF into its component documents
+
+Scanned packs often concatenate several statements or dozens of invoices
+into one PDF. Boundaries are detected from page-level OCR text:
+
+- page-number resets ("Page 1 of 3" after "Page 3 of 3")
+- a change in a document identifier (invoice, PO, account or employee number)
+- a document title ("TAX INVOICE", "SALARY SLIP", ...) following a page that
+  closed the previous document ("Grand Total", "Closing Balance", ...)
+- the opening page's header repeating after such a closing page
+
+Each signal carries a weight (SIGNAL_WEIGHTS); a page starts a new segment
+when its signals reach BOUNDARY_THRESHOLD. The signals that follow a closing
+page are weak on their own: statements print a running "Closing Balance"
+and repeat their title and header on every page, so each needs a second
+signal. A continuing page number (page N after page N-1) vetoes a boundary,
+and so does an unchanged document id for the closing-page signals. Segments
+are then classified and extracted independently, in parallel.
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BOUNDARY_THRESHOLD = 2
+SIGNAL_WEIGHTS = {
+    "page_number_reset": 2,
+    "document_id_changed": 2,
+    "title_after_closing": 1,
+    "header_repeat_after_closing": 1,
+}
+# Segments are extracted concurrently (LLM calls are network-bound)
+SEGMENT_WORKERS = int(os.getenv("SEGMENT_WORKERS", 8))
+HEADER_LINES = 3
+
+PAGE_NUMBER_PATTERNS = [
+    re.compile(r"\bpage\s*(\d{1,3})\s*(?:of|/)\s*\d{1,3}\b", re.IGNORECASE),
+    re.compile(r"^\s*page\s*[:\-]?\s*(\d{1,3})\s*$", re.IGNORECASE | re.MULTILINE),
+    re.compile(r"^\s*(\d{1,3})\s*/\s*\d{1,3}\s*$", re.MULTILINE),
+]
+
+DOCUMENT_ID_PATTERNS = {
+    "invoice_number": re.compile(r"\b(?:invoice|bill)\s*(?:no|number|#)\.?\s*[:\-]?\s*([A-Z0-9][A-Z0-9\-/]{2,})", re.IGNORECASE),
+    "po_number": re.compile(r"\b(?:purchase\s*order|p\.?\s?o\.?)\s*(?:no|number|#)\.?\s*[:\-]?\s*([A-Z0-9][A-Z0-9\-/]{2,})", re.IGNORECASE),
+    "account_number": re.compile(r"\b(?:a/?c|account)\s*(?:no|number|#)\.?\s*[:\-]?\s*([0-9X*][0-9X*\- ]{5,}[0-9])", re.IGNORECASE),
+    "employee_id": re.compile(r"\b(?:employee|emp)\.?\s*(?:id|code|no)\.?\s*[:\-]?\s*([A-Z0-9][A-Z0-9\-/]{1,})", re.IGNORECASE),
+}
+
+TITLE_PATTERN = re.compile(
+    r"\b(tax\s+invoice|invoice|statement\s+of\s+account|account\s+statement|bank\s+statement|"
+    r"salary\s+slip|pay\s*slip|purchase\s+order|balance\s+sheet|trial\s+balance|profit\s+(?:and|&)\s+loss)\b",
+    re.IGNORECASE
+)
+
+CLOSING_PATTERN = re.compile(
+    r"\b(grand\s+total|closing\s+balance|amount\s+in\s+words|authori[sz]ed\s+signatory|"
+    r"end\s+of\s+statement|net\s+pay(?:able)?|total\s+amount\s+payable)\b",
+    re.IGNORECASE
+)
+
+
+def _header_signature(text: str) -> str:
+    """First few non-empty lines, with digits removed so dates and page numbers do not matter"""
+    lines = [line.strip().lower() for line in text.splitlines() if line.strip()]
+    return re.sub(r"[\d\W_]+", " ", " ".join(lines[:HEADER_LINES])).strip()
+
+
+def page_signals(text: str) -> Dict[str, Any]:
+    """Boundary-relevant features of one page's OCR text"""
+    page_number = None
+    for pattern in PAGE_NUMBER_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            page_number = int(match.group(1))
+            break
+
+    document_ids = {}
+    for kind, pattern in DOCUMENT_ID_PATTERNS.items():
+        match = pattern.search(text)
+        if match:
+            document_ids[kind] = re.sub(r"\s+", "", match.group(1)).upper()
+
+    top = "\n".join([line for line in text.splitlines() if line.strip()][:8])
+    title = TITLE_PATTERN.search(top)
+    # Only the bottom of the page can close a document
+    tail = text[-600:]
+    return {
+        "blank": not text.strip(),
+        "page_number": page_number,
+        "document_ids": document_ids,
+        "title": title.group(1).lower() if title else None,
+        "closing": bool(CLOSING_PATTERN.search(tail)),
+        "header": _header_signature(text),
+    }
+
+
+def segment_pages(pages: List[str]) -> List[Dict[str, Any]]:
+    """
+    Group pages into documents
+
+    Returns:
+        Segments as {"start", "end" (0-based, inclusive), "signals" (why the
+        segment starts where it does)}
+    """
+    if not pages:
+        return []
+
+    signals = [page_signals(text) for text in pages]
+    segments = [{"start": 0, "end": 0, "signals": ["first_page"]}]
+    segment_ids = dict(signals[0]["document_ids"])
+    segment_header = signals[0]["header"]
+
+    for index in range(1, len(pages)):
+        page = signals[index]
+        previous = signals[index - 1]
+        if page["blank"]:
+            segments[-1]["end"] = index
+            continue
+
+        # Page N right after page N-1 continues the same document
+        continuing = (page["page_number"] is not None and page["page_number"] > 1
+                      and previous["page_number"] == page["page_number"] - 1)
+        same_id = any(segment_ids.get(kind) == value for kind, value in page["document_ids"].items())
+
+        reasons = []
+        score = 0
+        if page["page_number"] == 1 and previous["page_number"] != 1:
+            reasons.append("page_number_reset")
+            score += SIGNAL_WEIGHTS["page_number_reset"]
+        for kind, value in page["document_ids"].items():
+            if kind in segment_ids and segment_ids[kind] != value:
+                reasons.append(f"{kind}_changed")
+                score += SIGNAL_WEIGHTS["document_id_changed"]
+                break
+        if previous["closing"] and not same_id:
+            if page["title"]:
+                reasons.append("title_after_closing")
+                score += SIGNAL_WEIGHTS["title_after_closing"]
+            if segment_header and page["header"] == segment_header:
+                reasons.append("header_repeat_after_closing")
+                score += SIGNAL_WEIGHTS["header_repeat_after_closing"]
+
+        if score >= BOUNDARY_THRESHOLD and not continuing:
+            segments.append({"start": index, "end": index, "signals": reasons})
+            segment_ids = dict(page["document_ids"])
+            segment_header = page["header"]
+        else:
+            segments[-1]["end"] = index
+            for kind, value in page["document_ids"].items():
+                segment_ids.setdefault(kind, value)
+
+    return segments
+
+
+def _process_segment(text: str, document_type: Optional[str]) -> Dict[str, Any]:
+    from tasks.pipeline import resolve_document_type, extract_structured_data, generate_reports
+
+    try:
+        resolved_type = resolve_document_type(text, document_type)
+        extracted = extract_structured_data(text, resolved_type)
+        return {
+            "document_type": resolved_type,
+            "extracted_data": extracted,
+            "reports": generate_reports(extracted, text, resolved_type)
+        }
+    except Exception as e:
+        return {
+            "document_type": document_type,
+            "status": "failed",
+            "error": str(getattr(e, "detail", None) or e),
+            "error_type": type(e).__name__
+        }
+
+
+def process_segments(pages: List[str], segments: List[Dict[str, Any]], document_type: Optional[str] = None,
+                     max_workers: int = SEGMENT_WORKERS) -> List[Dict[str, Any]]:
+    """Classify and extract every segment concurrently; results keep segment order"""
+    texts = ["\n".join(pages[segment["start"]:segment["end"] + 1]) for segment in segments]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(segments)))) as pool:
+        outcomes = list(pool.map(lambda text: _process_segment(text, document_type), texts))
+
+    results = []
+    for number, (segment, outcome) in enumerate(zip(segments, outcomes), start=1):
+        result = {
+            "segment": number,
+            "pages": [segment["start"] + 1, segment["end"] + 1],
+            "boundary_signals": segment["signals"],
+        }
+        result.update(outcome)
+        result.setdefault("status", "completed")
+        results.append(result)
+    return results
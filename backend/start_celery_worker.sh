@@ -1,7 +1,16 @@
 #!/bin/bash
-# Script to start Celery worker for document processing
+# Script to start Celery workers for document processing
+#
+# The staged pipeline uses one pool per bottleneck:
+#   ocr                             - CPU-bound OCR, prefork, ~1 process per core
+#   llm_extraction, llm_reports     - network-bound LLM calls, many threads
+#   webhooks                        - job-finished callbacks (same threaded worker)
+#   document_processing             - legacy single-task jobs and batch jobs
+#
+# Pool sizes can be overridden with OCR_CONCURRENCY, LLM_CONCURRENCY and
+# DOCUMENT_CONCURRENCY.
 
-echo "Starting Celery worker for document processing..."
+echo "Starting Celery workers for document processing..."
 echo "Make sure Redis is running: redis-server"
 
 # Activate virtual environment if it exists
@@ -9,10 +18,33 @@ if [ -d "venv" ]; then
     source venv/bin/activate
 fi
 
-# Start Celery worker
+OCR_CONCURRENCY=${OCR_CONCURRENCY:-$(nproc 2>/dev/null || echo 2)}
+LLM_CONCURRENCY=${LLM_CONCURRENCY:-32}
+DOCUMENT_CONCURRENCY=${DOCUMENT_CONCURRENCY:-2}
+
+# OCR worker: one task per process at a time
+celery -A celery_app worker \
+    --loglevel=info \
+    --pool=prefork \
+    --concurrency=$OCR_CONCURRENCY \
+    --prefetch-multiplier=1 \
+    --queues=ocr \
+    --hostname=ocr@%h &
+
+# LLM worker: threads spend most of their time waiting on the model API
+celery -A celery_app worker \
+    --loglevel=info \
+    --pool=threads \
+    --concurrency=$LLM_CONCURRENCY \
+    --prefetch-multiplier=4 \
+    --queues=llm_extraction,llm_reports,webhooks \
+    --hostname=llm@%h &
+
+# Legacy single-task queue
 celery -A celery_app worker \
     --loglevel=info \
-    --concurrency=2 \
+    --concurrency=$DOCUMENT_CONCURRENCY \
     --queues=document_processing \
-    --hostname=worker@%h
+    --hostname=worker@%h &
 
+wait
@@ -0,0 +1,72 @@
+"""
+Intermediate artefact store for the staged document pipeline.
+
+Stage tasks hand each other references (Redis keys) instead of embedding
+file bytes, OCR text or extracted data in task messages. This keeps broker
+messages small and lets each stage run on a different worker pool.
+"""
+import os
+import json
+import uuid
+from typing import Any, Optional
+
+import redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Artefacts only need to outlive the pipeline run (task_time_limit is 30 min)
+ARTIFACT_TTL_SECONDS = int(os.getenv("PIPELINE_ARTIFACT_TTL", 2 * 60 * 60))
+ARTIFACT_PREFIX = "pipeline_artifact"
+
+_artifact_client: Optional[redis.Redis] = None
+
+
+def get_artifact_client() -> redis.Redis:
+    """Return a binary-safe Redis client for artefact storage"""
+    global _artifact_client
+    if _artifact_client is None:
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        # No decode_responses: uploads are stored as raw bytes
+        _artifact_client = redis.from_url(redis_url)
+    return _artifact_client
+
+
+def new_artifact_ref(job_id: str, name: str) -> str:
+    """Build an artefact reference scoped to a pipeline job"""
+    return f"{ARTIFACT_PREFIX}:{job_id}:{name}:{uuid.uuid4().hex[:8]}"
+
+
+def put_bytes(ref: str, data: bytes, ttl: int = ARTIFACT_TTL_SECONDS) -> str:
+    """Store raw bytes under ref and return the ref"""
+    get_artifact_client().setex(ref, ttl, data)
+    return ref
+
+
+def get_bytes(ref: str) -> bytes:
+    """Load raw bytes for ref, raising if the artefact has expired"""
+    data = get_artifact_client().get(ref)
+    if data is None:
+        raise KeyError(f"Pipeline artefact not found or expired: {ref}")
+    return data
+
+
+def put_json(ref: str, value: Any, ttl: int = ARTIFACT_TTL_SECONDS) -> str:
+    """Store a JSON-serialisable value under ref and return the ref"""
+    return put_bytes(ref, json.dumps(value).encode("utf-8"), ttl)
+
+
+def get_json(ref: str) -> Any:
+    """Load a JSON value stored with put_json"""
+    return json.loads(get_bytes(ref).decode("utf-8"))
+
+
+def delete_artifacts(*refs: Optional[str]) -> None:
+    """Delete artefacts once the pipeline no longer needs them"""
+    keys = [ref for ref in refs if ref]
+    if not keys:
+        return
+    try:
+        get_artifact_client().delete(*keys)
+    except Exception as e:
+        print(f"Warning: Could not delete pipeline artefacts: {str(e)}")
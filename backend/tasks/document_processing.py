@@ -1,16 +1,41 @@
 """
 Background tasks for document processing using Celery
+
+Single documents run as a chain of stage tasks, each routed to its own queue
+(see celery_app.task_routes):
+
+    ocr_stage_task (queue: ocr, prefork CPU workers)
+      -> extract_stage_task (queue: llm_extraction, threaded workers)
+      -> report_stage_task (queue: llm_reports, threaded workers)
+
+Stages pass a small context dict holding artefact references (see
+tasks.artifacts) rather than file bytes or OCR text.
 """
 import os
 import json
-import tempfile
-from celery import Task
+import hashlib
+import uuid
+from celery import Task, chain, chord, group
 from celery_app import celery_app
 from typing import Dict, List, Optional
 import base64
 
-# Import processing functions - using lazy imports to avoid circular dependencies
-# These will be imported when the task runs, not at module load time
+from tasks import artifacts
+from tasks.webhooks import notify_job_finished
+import result_store
+from workspace import RequestWorkspace
+from tasks.pipeline import (
+    extract_text_for_file,
+    resolve_document_type,
+    extract_structured_data,
+    generate_reports,
+    audit_document_type,
+    extract_audit_file,
+    extract_gst_file
+)
+
+# Complete document results are cached for 7 days (604800 seconds)
+DOCUMENT_CACHE_TTL = 604800
 
 
 class ProcessingTask(Task):
@@ -23,10 +48,230 @@ class ProcessingTask(Task):
         print(f"Task {task_id} completed successfully")
 
 
+def _failed_result(error: Exception) -> Dict:
+    """Build the error result returned (not raised) by document tasks"""
+    return {
+        'status': 'failed',
+        'error': str(error),
+        'error_type': type(error).__name__,
+        'result': None
+    }
+
+
+def _cache_document_result(file_hash: str, document_type: Optional[str], stored_result: Dict) -> None:
+    """Cache the stored result (usually a result_store pointer) under the key /process looks up"""
+    try:
+        import redis
+        from dotenv import load_dotenv
+        load_dotenv()
+        
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        redis_client_cache = redis.from_url(redis_url, decode_responses=True)
+        
+        doc_type_str = document_type or "auto"
+        doc_cache_key = f"document_cache:{file_hash}:{doc_type_str}"
+        
+        redis_client_cache.setex(doc_cache_key, DOCUMENT_CACHE_TTL, json.dumps(stored_result))
+        print(f"✓ Cached complete document result in task (key: {doc_cache_key[:30]}..., TTL: 7 days)")
+    except Exception as cache_error:
+        print(f"Warning: Could not cache result in task: {str(cache_error)}")
+
+
+def prepare_document_job(file_content: bytes, filename: str, document_type: Optional[str] = None,
+                         upload_ttl: int = artifacts.ARTIFACT_TTL_SECONDS,
+                         file_hash: Optional[str] = None) -> Dict:
+    """
+    Store the upload once and build the pipeline context for a new job
+    
+    The job is visible as queued under its job id straight away, whether it
+    is dispatched immediately or waits in the fair scheduler. file_content
+    may be any bytes-like buffer (e.g. a RequestWorkspace mapping); pass
+    file_hash when the upload was already hashed while streaming.
+    """
+    job_id = str(uuid.uuid4())
+    upload_ref = artifacts.put_bytes(artifacts.new_artifact_ref(job_id, "upload"), file_content, upload_ttl)
+    
+    celery_app.backend.store_result(job_id, {'status': 'Queued...', 'progress': 0}, 'PROCESSING')
+    
+    return {
+        "job_id": job_id,
+        "filename": filename,
+        "requested_type": document_type,
+        "file_hash": file_hash or hashlib.sha256(file_content).hexdigest(),
+        "upload_ref": upload_ref,
+    }
+
+
+def prepare_stored_document_job(stored_path: str, filename: str, document_type: Optional[str],
+                                file_hash: str) -> Dict:
+    """
+    Build the pipeline context for a file already in the content store
+    
+    The ocr stage reads stored_path directly, so large chunked uploads are
+    never copied through Redis. CONTENT_STORE_DIR must be shared with the
+    ocr workers.
+    """
+    job_id = str(uuid.uuid4())
+    celery_app.backend.store_result(job_id, {'status': 'Queued...', 'progress': 0}, 'PROCESSING')
+    
+    return {
+        "job_id": job_id,
+        "filename": filename,
+        "requested_type": document_type,
+        "file_hash": file_hash,
+        "upload_path": stored_path,
+    }
+
+
+def dispatch_document_job(context: Dict) -> str:
+    """
+    Send a prepared job through the staged Celery chain
+    
+    The final stage runs under the job id, so /job/{job_id}/status and
+    /job/{job_id}/result work unchanged.
+    """
+    job_id = context["job_id"]
+    chain(
+        ocr_stage_task.s(context),
+        extract_stage_task.s(),
+        report_stage_task.s().set(task_id=job_id)
+    ).apply_async()
+    return job_id
+
+
+def start_document_pipeline(file_content: bytes, filename: str, document_type: Optional[str] = None,
+                            file_hash: Optional[str] = None) -> str:
+    """
+    Queue the staged pipeline for a single document immediately
+    
+    Only the upload's artefact reference travels through the broker.
+    
+    Returns:
+        The job id to poll
+    """
+    return dispatch_document_job(prepare_document_job(file_content, filename, document_type, file_hash=file_hash))
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.ocr_stage_task")
+def ocr_stage_task(self, context: Dict) -> Dict:
+    """
+    OCR stage (CPU-bound): materialize the upload and extract raw text
+    
+    Returns:
+        The pipeline context with text_ref added
+    """
+    job_id = context["job_id"]
+    filename = context["filename"]
+    print(f"\n{'='*60}")
+    print(f"Starting OCR stage for job: {job_id}")
+    print(f"Filename: {filename}")
+    print(f"{'='*60}\n")
+    
+    workspace = RequestWorkspace(job_id)
+    try:
+        self.update_state(task_id=job_id, state='PROCESSING', meta={'status': 'Extracting text...', 'progress': 10})
+        
+        if context.get("upload_path"):
+            # Content-store file: read in place, it outlives the job
+            temp_file_path = context["upload_path"]
+        else:
+            temp_file_path = workspace.write_bytes(filename, artifacts.get_bytes(context["upload_ref"]))
+        text = extract_text_for_file(temp_file_path, filename)
+        print(f"Text extracted: {len(text)} characters")
+        
+        context["text_ref"] = artifacts.put_json(artifacts.new_artifact_ref(job_id, "text"), text)
+        return context
+    except Exception as e:
+        print(f"ERROR in ocr_stage_task {job_id}: {type(e).__name__}: {str(e)}")
+        context["error"] = _failed_result(e)
+        return context
+    finally:
+        artifacts.delete_artifacts(context.get("upload_ref"))
+        workspace.cleanup()
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.extract_stage_task")
+def extract_stage_task(self, context: Dict) -> Dict:
+    """
+    Classification and extraction stage (LLM, network-bound)
+    
+    Returns:
+        The pipeline context with document_type and extracted_ref added
+    """
+    if context.get("error"):
+        return context
+    
+    job_id = context["job_id"]
+    try:
+        text = artifacts.get_json(context["text_ref"])
+        
+        if not context.get("requested_type"):
+            self.update_state(task_id=job_id, state='PROCESSING', meta={'status': 'Classifying document type...', 'progress': 20})
+        document_type = resolve_document_type(text, context.get("requested_type"))
+        
+        self.update_state(task_id=job_id, state='PROCESSING', meta={'status': 'Extracting structured data...', 'progress': 40})
+        result = extract_structured_data(text, document_type)
+        
+        context["document_type"] = document_type
+        context["extracted_ref"] = artifacts.put_json(artifacts.new_artifact_ref(job_id, "extracted"), result)
+        return context
+    except Exception as e:
+        print(f"ERROR in extract_stage_task {job_id}: {type(e).__name__}: {str(e)}")
+        context["error"] = _failed_result(e)
+        artifacts.delete_artifacts(context.get("text_ref"))
+        return context
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.report_stage_task")
+def report_stage_task(self, context: Dict) -> Dict:
+    """
+    Report generation stage (many LLM calls). Runs under the job id.
+    
+    Returns:
+        A result_store pointer to the final processing result, or the error
+        result of an earlier stage
+    """
+    if context.get("error"):
+        notify_job_finished(context.get("webhook"), context["job_id"], context["error"])
+        return context["error"]
+    
+    job_id = context["job_id"]
+    try:
+        text = artifacts.get_json(context["text_ref"])
+        result = artifacts.get_json(context["extracted_ref"])
+        document_type = context["document_type"]
+        
+        self.update_state(state='PROCESSING', meta={'status': 'Generating reports...', 'progress': 70})
+        reports = generate_reports(result, text, document_type)
+        
+        final_result = {
+            "extracted_data": result,
+            "reports": reports,
+            "document_type": document_type,
+            "filename": context["filename"]
+        }
+        # Written once; the task result and the document cache hold the same pointer
+        stored_result = result_store.store(final_result)
+        _cache_document_result(context["file_hash"], context.get("requested_type"), stored_result)
+        notify_job_finished(context.get("webhook"), job_id, stored_result)
+        return stored_result
+    except Exception as e:
+        print(f"ERROR in report_stage_task {job_id}: {type(e).__name__}: {str(e)}")
+        failed = _failed_result(e)
+        notify_job_finished(context.get("webhook"), job_id, failed)
+        return failed
+    finally:
+        artifacts.delete_artifacts(context.get("text_ref"), context.get("extracted_ref"))
+
+
 @celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.process_document_task")
-def process_document_task(self, file_data: Dict, document_type: Optional[str] = None) -> Dict:
+def process_document_task(self, file_data: Dict, document_type: Optional[str] = None,
+                          webhook: Optional[Dict] = None) -> Dict:
     """
-    Process a single document asynchronously
+    Process a single document in one task (legacy, single-queue deployments)
+    
+    New work should use start_document_pipeline(), which splits the same
+    stages across the ocr/llm queues.
     
     Args:
         file_data: Dictionary containing:
@@ -34,6 +279,7 @@ def process_document_task(self, file_data: Dict, document_type: Optional[str] =
             - content: str (base64 encoded file content)
             - mime_type: str
         document_type: Optional document type hint
+        webhook: Optional {"url", "user_key"} to call back when done (see webhooks.py)
     
     Returns:
         Dict with processing result
@@ -45,194 +291,50 @@ def process_document_task(self, file_data: Dict, document_type: Optional[str] =
     print(f"Document type: {document_type}")
     print(f"{'='*60}\n")
     
-    temp_file_path = None
+    workspace = RequestWorkspace(task_id or "task")
+    requested_type = document_type
     
     try:
-        # Lazy import to avoid circular dependencies
-        from app import (
-            extract_text_from_pdf,
-            extract_text_from_docx,
-            extract_text_from_image,
-            classify_document,
-            extract_bank_statement_structured,
-            extract_gst_return,
-            extract_trial_balance,
-            extract_profit_loss,
-            extract_invoice,
-            extract_purchase_order,
-            extract_salary_slip,
-            extract_balance_sheet,
-            extract_audit_papers,
-            extract_agreement_contract,
-            extract_excel_data
-        )
-        from report_generators import (
-            generate_bank_statement_reports,
-            generate_gst_return_reports,
-            generate_invoice_reports,
-            generate_purchase_order_reports,
-            generate_salary_slip_reports,
-            generate_profit_loss_reports,
-            generate_trial_balance_reports,
-            generate_balance_sheet_reports,
-            generate_audit_papers_reports,
-            generate_agreement_contract_reports
-        )
-        
-        # Update task state
-        self.update_state(state='PROCESSING', meta={'status': 'Extracting text from document...'})
-        
         # Decode file content
         file_content = base64.b64decode(file_data['content'])
         filename = file_data['filename']
         
-        # Save to temporary file
-        temp_dir = tempfile.gettempdir()
-        temp_file_path = os.path.join(temp_dir, f"finsight_{task_id}_{filename}")
-        
-        with open(temp_file_path, "wb") as temp:
-            temp.write(file_content)
+        # Save to the job's workspace
+        temp_file_path = workspace.write_bytes(filename, file_content)
         
         print(f"File saved to: {temp_file_path}")
         
-        # Extract text
         self.update_state(state='PROCESSING', meta={'status': 'Extracting text...', 'progress': 10})
-        
-        if filename.lower().endswith(".pdf"):
-            text = extract_text_from_pdf(temp_file_path)
-        elif filename.lower().endswith((".docx", ".doc")):
-            text = extract_text_from_docx(temp_file_path)
-        elif filename.lower().endswith((".jpg", ".jpeg", ".png")):
-            text = extract_text_from_image(temp_file_path)
-        elif filename.lower().endswith((".xlsx", ".xls")):
-            # Handle Excel files
-            excel_data = extract_excel_data(temp_file_path)
-            # For now, convert to text representation
-            text = excel_data.get("summary_text", "")
-        else:
-            # Try to read as text file
-            with open(temp_file_path, "r", encoding="utf-8") as f:
-                text = f.read()
-        
+        text = extract_text_for_file(temp_file_path, filename)
         print(f"Text extracted: {len(text)} characters")
         
-        # Normalize document type
-        if document_type:
-            document_type = document_type.lower().replace(" ", "_").replace("-", "_")
-        
-        # Classify document if type not provided
         if not document_type:
             self.update_state(state='PROCESSING', meta={'status': 'Classifying document type...', 'progress': 20})
-            try:
-                detected = classify_document(text)
-                document_type = detected.get("type", "").lower().replace(" ", "_")
-                print(f"Detected document type: {document_type}")
-            except Exception as e:
-                print(f"Warning: Classification failed: {str(e)}")
-                document_type = "unknown"
+        document_type = resolve_document_type(text, document_type)
         
-        # Extract data based on document type
         self.update_state(state='PROCESSING', meta={'status': 'Extracting structured data...', 'progress': 40})
+        result = extract_structured_data(text, document_type)
         
-        result = None
-        
-        if document_type == "bank_statement" or "bank" in text.lower():
-            result = extract_bank_statement_structured(text)
-        elif document_type == "gst_return" or "gst" in text.lower():
-            result = extract_gst_return(text)
-        elif document_type == "trial_balance":
-            result = extract_trial_balance(text)
-        elif document_type == "profit_loss" or ("profit" in text.lower() and "loss" in text.lower()):
-            result = extract_profit_loss(text)
-        elif document_type == "invoice":
-            result = extract_invoice(text)
-        elif document_type == "purchase_order":
-            result = extract_purchase_order(text)
-        elif document_type == "salary_slip" or "salary" in text.lower():
-            result = extract_salary_slip(text)
-        elif document_type == "balance_sheet":
-            result = extract_balance_sheet(text)
-        elif document_type == "audit_papers":
-            result = extract_audit_papers(text)
-        elif document_type == "agreement_contract":
-            result = extract_agreement_contract(text)
-        else:
-            # Default to bank statement if unknown
-            print("Unknown document type, defaulting to bank statement extraction")
-            result = extract_bank_statement_structured(text)
-        
-        # Generate reports
         self.update_state(state='PROCESSING', meta={'status': 'Generating reports...', 'progress': 70})
+        reports = generate_reports(result, text, document_type)
         
-        reports = {}
-        try:
-            if document_type == "bank_statement":
-                reports = generate_bank_statement_reports(result, text)
-            elif document_type == "gst_return":
-                reports = generate_gst_return_reports(result, text)
-            elif document_type == "invoice":
-                reports = generate_invoice_reports(result, text)
-            elif document_type == "purchase_order":
-                reports = generate_purchase_order_reports(result, text)
-            elif document_type == "salary_slip":
-                reports = generate_salary_slip_reports(result, text)
-            elif document_type == "profit_loss":
-                reports = generate_profit_loss_reports(result, text)
-            elif document_type == "trial_balance":
-                reports = generate_trial_balance_reports(result, text)
-            elif document_type == "balance_sheet":
-                reports = generate_balance_sheet_reports(result, text)
-            elif document_type == "audit_papers":
-                reports = generate_audit_papers_reports(result, text)
-            elif document_type == "agreement_contract":
-                reports = generate_agreement_contract_reports(result, text)
-        except Exception as e:
-            print(f"Warning: Report generation failed: {str(e)}")
-            reports = {}
-        
-        # Combine result and reports
         final_result = {
             "extracted_data": result,
             "reports": reports,
             "document_type": document_type,
             "filename": filename
         }
+        stored_result = result_store.store(final_result)
+        _cache_document_result(hashlib.sha256(file_content).hexdigest(), requested_type, stored_result)
         
-        # Cache the complete result if Redis is available
-        try:
-            import redis
-            import os
-            from dotenv import load_dotenv
-            load_dotenv()
-            
-            redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-            redis_client_cache = redis.from_url(redis_url, decode_responses=True)
-            
-            # Generate cache key from original file content
-            file_content = base64.b64decode(file_data['content'])
-            import hashlib
-            file_hash = hashlib.sha256(file_content).hexdigest()
-            doc_type_str = document_type or "auto"
-            doc_cache_key = f"document_cache:{file_hash}:{doc_type_str}"
-            
-            # Cache for 7 days (604800 seconds)
-            redis_client_cache.setex(doc_cache_key, 604800, json.dumps(final_result))
-            print(f"✓ Cached complete document result in task (key: {doc_cache_key[:30]}..., TTL: 7 days)")
-        except Exception as cache_error:
-            print(f"Warning: Could not cache result in task: {str(cache_error)}")
-        
-        self.update_state(state='SUCCESS', meta={'status': 'Processing completed', 'progress': 100, 'result': final_result})
-        
-        return final_result
+        notify_job_finished(webhook, task_id, stored_result)
+        # The return value is the task result; no separate SUCCESS update_state copy
+        return stored_result
         
     except Exception as e:
         import traceback
-        error_trace = traceback.format_exc()
-        error_msg = str(e)
-        error_type = type(e).__name__
-        
-        print(f"ERROR in process_document_task {task_id}: {error_type}: {error_msg}")
-        print(f"Traceback:\n{error_trace}")
+        print(f"ERROR in process_document_task {task_id}: {type(e).__name__}: {str(e)}")
+        print(f"Traceback:\n{traceback.format_exc()}")
         
         # Update state with properly formatted error info
         try:
@@ -240,38 +342,138 @@ def process_document_task(self, file_data: Dict, document_type: Optional[str] =
                 state='FAILURE',
                 meta={
                     'status': 'Processing failed',
-                    'error': error_msg,
-                    'error_type': error_type
+                    'error': str(e),
+                    'error_type': type(e).__name__
                 }
             )
         except Exception as update_error:
             print(f"Failed to update task state: {str(update_error)}")
         
         # Return error result instead of raising to avoid serialization issues
-        return {
-            'status': 'failed',
-            'error': error_msg,
-            'error_type': error_type,
-            'result': None
+        failed = _failed_result(e)
+        notify_job_finished(webhook, task_id, failed)
+        return failed
+    
+    finally:
+        # Clean up the job's workspace
+        workspace.cleanup()
+
+
+def _materialize_upload(workspace: RequestWorkspace, file_data: Dict) -> str:
+    """Write an uploaded file (artefact ref or base64 content) into the workspace"""
+    if file_data.get("upload_ref"):
+        file_content = artifacts.get_bytes(file_data["upload_ref"])
+    else:
+        file_content = base64.b64decode(file_data["content"])
+    return workspace.write_bytes(file_data["filename"], file_content)
+
+
+def _store_uploads(job_id: str, files_data: List[Dict]) -> List[Dict]:
+    """Move base64 file contents into the artefact store, keeping only refs"""
+    stored = []
+    for file_data in files_data:
+        if file_data.get("upload_ref"):
+            stored.append({"filename": file_data["filename"], "upload_ref": file_data["upload_ref"]})
+            continue
+        upload_ref = artifacts.put_bytes(
+            artifacts.new_artifact_ref(job_id, "upload"),
+            base64.b64decode(file_data["content"])
+        )
+        stored.append({"filename": file_data["filename"], "upload_ref": upload_ref})
+    return stored
+
+
+def start_files_pipeline(task, files: List[tuple], webhook: Optional[Dict] = None) -> str:
+    """
+    Queue a multi-file job (process_gst_files_task or process_audit_files_task)
+    
+    Args:
+        task: The coordinator task to queue
+        files: List of (filename, content bytes) tuples
+        webhook: Optional {"url", "user_key"} to call back when done
+    
+    Returns:
+        The job id to poll
+    """
+    job_id = str(uuid.uuid4())
+    files_data = [
+        {
+            "filename": filename,
+            "upload_ref": artifacts.put_bytes(artifacts.new_artifact_ref(job_id, "upload"), content)
         }
+        for filename, content in files
+    ]
+    task.apply_async(args=[files_data], kwargs={"webhook": webhook}, task_id=job_id)
+    return job_id
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.extract_gst_file_task")
+def extract_gst_file_task(self, job_id: str, file_data: Dict) -> Dict:
+    """
+    Fan-out step: extract one GST Excel file
     
+    Returns:
+        Dict with "key" and "data_ref" for aggregate_gst_files_task
+    """
+    workspace = RequestWorkspace(job_id)
+    try:
+        temp_file_path = _materialize_upload(workspace, file_data)
+        extracted = extract_gst_file(temp_file_path, file_data["filename"])
+    except Exception as e:
+        print(f"Error extracting data from {file_data['filename']}: {str(e)}")
+        extracted = {
+            "key": file_data["filename"],
+            "data": {
+                "error": f"Error extracting data: {str(e)}",
+                "summary_text": f"Error reading {file_data['filename']}",
+                "sheet_names": []
+            }
+        }
     finally:
-        # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                print(f"Cleaned up temporary file: {temp_file_path}")
-            except Exception as e:
-                print(f"Warning: Could not delete temporary file: {e}")
+        artifacts.delete_artifacts(file_data.get("upload_ref"))
+        workspace.cleanup()
+    
+    data_ref = artifacts.put_json(artifacts.new_artifact_ref(job_id, "gst_data"), extracted["data"])
+    return {"key": extracted["key"], "data_ref": data_ref}
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.aggregate_gst_files_task")
+def aggregate_gst_files_task(self, extracted_files: List[Dict], webhook: Optional[Dict] = None) -> Dict:
+    """Fan-in step: build the GST report from every extracted Excel file"""
+    from report_generators import generate_gst_reports_from_excel
+    
+    data_refs = [item["data_ref"] for item in extracted_files]
+    try:
+        self.update_state(state='PROCESSING', meta={'status': 'Generating GST reports...', 'progress': 70})
+        
+        excel_data_dict = {}
+        for item in extracted_files:
+            excel_data_dict[item["key"]] = artifacts.get_json(item["data_ref"])
+        print(f"File types: {list(excel_data_dict.keys())}")
+        
+        result = result_store.store(generate_gst_reports_from_excel(excel_data_dict))
+    except Exception as e:
+        print(f"ERROR in aggregate_gst_files_task {self.request.id}: {type(e).__name__}: {str(e)}")
+        result = _failed_result(e)
+    finally:
+        artifacts.delete_artifacts(*data_refs)
+    # Runs under the coordinator's job id (the chord replaced it)
+    notify_job_finished(webhook, self.request.id, result)
+    return result
 
 
 @celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.process_gst_files_task")
-def process_gst_files_task(self, files_data: List[Dict]) -> Dict:
+def process_gst_files_task(self, files_data: List[Dict], webhook: Optional[Dict] = None):
     """
     Process multiple GST files asynchronously
     
+    Each file is extracted in parallel (extract_gst_file_task on the ocr queue),
+    then aggregate_gst_files_task builds the combined report. This task is
+    replaced by that chord, so its id resolves to the aggregated result.
+    
     Args:
-        files_data: List of file dictionaries (same format as process_document_task)
+        files_data: List of file dictionaries with filename and either
+            upload_ref (artefact store) or content (base64)
     
     Returns:
         Dict with combined processing results
@@ -281,20 +483,82 @@ def process_gst_files_task(self, files_data: List[Dict]) -> Dict:
     
     self.update_state(state='PROCESSING', meta={'status': f'Processing {len(files_data)} files...', 'progress': 0})
     
-    # This would process multiple files and combine results
-    # For now, process first file as placeholder
-    # Full implementation would handle all files
+    files_data = _store_uploads(task_id, files_data)
+    raise self.replace(chord(
+        group(extract_gst_file_task.s(task_id, file_data) for file_data in files_data),
+        aggregate_gst_files_task.s(webhook=webhook)
+    ))
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.extract_audit_file_task")
+def extract_audit_file_task(self, job_id: str, file_data: Dict) -> Dict:
+    """
+    Fan-out step: OCR one audit pack file
+    
+    Returns:
+        Dict with "filename", "type" and "text_ref" for aggregate_audit_files_task
+    """
+    workspace = RequestWorkspace(job_id)
+    try:
+        temp_file_path = _materialize_upload(workspace, file_data)
+        extracted = extract_audit_file(temp_file_path, file_data["filename"])
+    except Exception as e:
+        print(f"Error extracting text from {file_data['filename']}: {str(e)}")
+        extracted = {
+            "filename": file_data["filename"],
+            "text": f"Error extracting text: {str(e)}",
+            "type": audit_document_type(file_data["filename"])
+        }
+    finally:
+        artifacts.delete_artifacts(file_data.get("upload_ref"))
+        workspace.cleanup()
     
-    return {"status": "completed", "files_processed": len(files_data)}
+    print(f"Extracted {len(extracted['text'])} characters from {extracted['filename']} (type: {extracted['type']})")
+    text_ref = artifacts.put_json(artifacts.new_artifact_ref(job_id, "audit_text"), extracted["text"])
+    return {"filename": extracted["filename"], "type": extracted["type"], "text_ref": text_ref}
+
+
+@celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.aggregate_audit_files_task")
+def aggregate_audit_files_task(self, extracted_files: List[Dict], webhook: Optional[Dict] = None) -> Dict:
+    """Fan-in step: build the comprehensive audit report from every extracted file"""
+    from report_generators import generate_comprehensive_audit_report
+    
+    text_refs = [item["text_ref"] for item in extracted_files]
+    try:
+        self.update_state(state='PROCESSING', meta={'status': 'Generating comprehensive audit report...', 'progress': 70})
+        
+        extracted_texts = {}
+        for item in extracted_files:
+            extracted_texts[item["type"]] = {
+                "filename": item["filename"],
+                "text": artifacts.get_json(item["text_ref"]),
+                "type": item["type"]
+            }
+        print(f"Document types: {list(extracted_texts.keys())}")
+        
+        result = result_store.store(generate_comprehensive_audit_report(extracted_texts))
+    except Exception as e:
+        print(f"ERROR in aggregate_audit_files_task {self.request.id}: {type(e).__name__}: {str(e)}")
+        result = _failed_result(e)
+    finally:
+        artifacts.delete_artifacts(*text_refs)
+    # Runs under the coordinator's job id (the chord replaced it)
+    notify_job_finished(webhook, self.request.id, result)
+    return result
 
 
 @celery_app.task(bind=True, base=ProcessingTask, name="tasks.document_processing.process_audit_files_task")
-def process_audit_files_task(self, files_data: List[Dict]) -> Dict:
+def process_audit_files_task(self, files_data: List[Dict], webhook: Optional[Dict] = None):
     """
     Process multiple audit files asynchronously
     
+    Each file is OCR'd in parallel (extract_audit_file_task on the ocr queue),
+    then aggregate_audit_files_task generates the comprehensive report. This
+    task is replaced by that chord, so its id resolves to the audit report.
+    
     Args:
-        files_data: List of file dictionaries
+        files_data: List of file dictionaries with filename and either
+            upload_ref (artefact store) or content (base64)
     
     Returns:
         Dict with comprehensive audit report
@@ -304,6 +568,8 @@ def process_audit_files_task(self, files_data: List[Dict]) -> Dict:
     
     self.update_state(state='PROCESSING', meta={'status': f'Processing {len(files_data)} audit files...', 'progress': 0})
     
-    # Placeholder - would implement full audit processing
-    return {"status": "completed", "files_processed": len(files_data)}
-
+    files_data = _store_uploads(task_id, files_data)
+    raise self.replace(chord(
+        group(extract_audit_file_task.s(task_id, file_data) for file_data in files_data),
+        aggregate_audit_files_task.s(webhook=webhook)
+    ))
@@ -0,0 +1,282 @@
+"""
+Plain (non-Celery) stage functions for the document processing pipeline.
+
+The Celery stage tasks in tasks.document_processing are thin wrappers around
+these so that each stage can be routed to a worker pool sized for its own
+bottleneck: OCR is CPU-bound, classification/extraction and report
+generation are network-bound LLM calls.
+"""
+import io
+from typing import Dict, Optional, Set
+
+# Processing functions are imported lazily inside each stage to avoid
+# circular imports (app imports celery_app, which includes this package)
+
+
+def extract_text_for_file(file_path: str, filename: str) -> str:
+    """OCR stage: extract raw text from a file on disk"""
+    from app import (
+        extract_text_from_pdf,
+        extract_text_from_docx,
+        extract_text_from_image,
+        extract_data_from_excel
+    )
+
+    if filename.lower().endswith(".pdf"):
+        return extract_text_from_pdf(file_path)
+    elif filename.lower().endswith((".docx", ".doc")):
+        return extract_text_from_docx(file_path)
+    elif filename.lower().endswith((".jpg", ".jpeg", ".png")):
+        return extract_text_from_image(file_path)
+    elif filename.lower().endswith((".xlsx", ".xls")):
+        # For now, convert to text representation
+        excel_data = extract_data_from_excel(file_path)
+        return excel_data.get("summary_text", "")
+    else:
+        # Try to read as text file
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+
+def estimate_page_count(file_content, filename: str) -> int:
+    """
+    Cheap page count used for scheduling; non-PDFs count as one page
+    
+    file_content is the file's bytes (or a buffer over them) or a path on disk.
+    """
+    if not filename.lower().endswith(".pdf"):
+        return 1
+    try:
+        from PyPDF2 import PdfReader
+        source = file_content if isinstance(file_content, str) else io.BytesIO(file_content)
+        return max(len(PdfReader(source).pages), 1)
+    except Exception as e:
+        print(f"Warning: Could not count PDF pages for {filename}: {str(e)}")
+        return 1
+
+
+def resolve_document_type(text: str, document_type: Optional[str] = None) -> str:
+    """Classification stage: normalize the hint or classify the text with the LLM"""
+    from app import classify_document
+
+    if document_type:
+        return document_type.lower().replace(" ", "_").replace("-", "_")
+
+    try:
+        detected = classify_document(text)
+        document_type = detected.get("type", "").lower().replace(" ", "_")
+        print(f"Detected document type: {document_type}")
+    except Exception as e:
+        print(f"Warning: Classification failed: {str(e)}")
+        document_type = "unknown"
+    return document_type
+
+
+def extract_structured_data(text: str, document_type: str) -> Dict:
+    """Extraction stage: run the extractor for the document type"""
+    from app import (
+        extract_bank_statement_structured,
+        extract_gst_return,
+        extract_trial_balance,
+        extract_profit_loss,
+        extract_invoice,
+        extract_purchase_order,
+        extract_salary_slip,
+        extract_balance_sheet,
+        extract_audit_papers,
+        extract_agreement_contract
+    )
+
+    if document_type == "bank_statement" or "bank" in text.lower():
+        return extract_bank_statement_structured(text)
+    elif document_type == "gst_return" or "gst" in text.lower():
+        return extract_gst_return(text)
+    elif document_type == "trial_balance":
+        return extract_trial_balance(text)
+    elif document_type == "profit_loss" or ("profit" in text.lower() and "loss" in text.lower()):
+        return extract_profit_loss(text)
+    elif document_type == "invoice":
+        return extract_invoice(text)
+    elif document_type == "purchase_order":
+        return extract_purchase_order(text)
+    elif document_type == "salary_slip" or "salary" in text.lower():
+        return extract_salary_slip(text)
+    elif document_type == "balance_sheet":
+        return extract_balance_sheet(text)
+    elif document_type == "audit_papers":
+        return extract_audit_papers(text)
+    elif document_type == "agreement_contract":
+        return extract_agreement_contract(text)
+
+    # Default to bank statement if unknown
+    print("Unknown document type, defaulting to bank statement extraction")
+    return extract_bank_statement_structured(text)
+
+
+def generate_reports(result: Dict, text: str, document_type: str, only: Optional[Set[str]] = None) -> Dict:
+    """
+    Report stage: generate the reports for the document type
+
+    only limits generation to those report names (None means every report);
+    generators skip the LLM calls for reports that were not asked for.
+    """
+    from report_generators import (
+        generate_bank_statement_reports,
+        generate_gst_return_reports,
+        generate_invoice_reports,
+        generate_purchase_order_reports,
+        generate_salary_slip_reports,
+        generate_profit_loss_reports,
+        generate_trial_balance_reports,
+        generate_balance_sheet_reports,
+        generate_audit_papers_reports,
+        generate_agreement_contract_reports
+    )
+
+    report_generators = {
+        "bank_statement": generate_bank_statement_reports,
+        "gst_return": generate_gst_return_reports,
+        "invoice": generate_invoice_reports,
+        "purchase_order": generate_purchase_order_reports,
+        "salary_slip": generate_salary_slip_reports,
+        "profit_loss": generate_profit_loss_reports,
+        "trial_balance": generate_trial_balance_reports,
+        "balance_sheet": generate_balance_sheet_reports,
+        "audit_papers": generate_audit_papers_reports,
+        "agreement_contract": generate_agreement_contract_reports,
+    }
+
+    generator = report_generators.get(document_type)
+    if not generator:
+        return {}
+    if only is not None and not only:
+        return {}
+    try:
+        reports = generator(result, text, only=only)
+    except Exception as e:
+        print(f"Warning: Report generation failed: {str(e)}")
+        return {}
+    if only is not None:
+        reports = {name: report for name, report in reports.items() if name in only}
+    return reports
+
+
+def audit_document_type(filename: str, field_name: Optional[str] = None) -> str:
+    """Map an audit pack file to its document type from the form field or filename"""
+    doc_type = "unknown"
+    
+    # Check field name if available (from form data)
+    if field_name:
+        field_name = field_name.lower()
+        if "trial" in field_name or "balance" in field_name:
+            doc_type = "trial_balance"
+        elif "profit" in field_name or "loss" in field_name:
+            doc_type = "profit_loss"
+        elif "balance" in field_name and "sheet" in field_name:
+            doc_type = "balance_sheet"
+        elif "ledger" in field_name:
+            doc_type = "general_ledger"
+        elif "cash" in field_name:
+            doc_type = "cash_book"
+        elif "bank" in field_name:
+            doc_type = "bank_statement"
+        elif "asset" in field_name or "fixed" in field_name:
+            doc_type = "fixed_asset_register"
+        elif "gst" in field_name:
+            doc_type = "gst_returns"
+        elif "tds" in field_name:
+            doc_type = "tds_summary"
+    
+    # Fallback to filename analysis
+    if doc_type == "unknown":
+        filename_lower = filename.lower()
+        if "trial" in filename_lower or ("balance" in filename_lower and "sheet" not in filename_lower):
+            doc_type = "trial_balance"
+        elif "profit" in filename_lower or "loss" in filename_lower or "p&l" in filename_lower or "p_l" in filename_lower:
+            doc_type = "profit_loss"
+        elif "balance" in filename_lower and "sheet" in filename_lower:
+            doc_type = "balance_sheet"
+        elif "ledger" in filename_lower:
+            doc_type = "general_ledger"
+        elif "cash" in filename_lower:
+            doc_type = "cash_book"
+        elif "bank" in filename_lower:
+            doc_type = "bank_statement"
+        elif "asset" in filename_lower or "fixed" in filename_lower:
+            doc_type = "fixed_asset_register"
+        elif "gst" in filename_lower:
+            doc_type = "gst_returns"
+        elif "tds" in filename_lower:
+            doc_type = "tds_summary"
+    
+    return doc_type
+
+
+def extract_audit_file(file_path: str, filename: str) -> Dict:
+    """Extract text from one audit pack file; errors are recorded, not raised"""
+    from app import (
+        extract_text_from_pdf,
+        extract_text_from_docx,
+        extract_text_from_image
+    )
+
+    try:
+        if filename.lower().endswith(".pdf"):
+            text = extract_text_from_pdf(file_path)
+        elif filename.lower().endswith((".docx", ".doc")):
+            text = extract_text_from_docx(file_path)
+        elif filename.lower().endswith((".jpg", ".jpeg", ".png")):
+            text = extract_text_from_image(file_path)
+        else:
+            # Try to read as text file
+            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+                text = f.read()
+    except Exception as extract_error:
+        print(f"Error extracting text from {filename}: {str(extract_error)}")
+        text = f"Error extracting text: {str(extract_error)}"
+
+    return {
+        "filename": filename,
+        "text": text,
+        "type": audit_document_type(filename)
+    }
+
+
+def gst_file_type(filename: str) -> str:
+    """Map a GST Excel file to gstr2b_summary, purchase_register or vendor_master"""
+    filename_lower = filename.lower()
+    if "gstr" in filename_lower or "2b" in filename_lower or "summary" in filename_lower:
+        return "gstr2b_summary"
+    elif "purchase" in filename_lower or "register" in filename_lower:
+        return "purchase_register"
+    elif "vendor" in filename_lower or "master" in filename_lower:
+        return "vendor_master"
+    return "unknown"
+
+
+def extract_gst_file(file_path: str, filename: str) -> Dict:
+    """
+    Extract one GST Excel file
+    
+    Returns:
+        Dict with "key" (the file type, or the filename on error) and "data"
+        as expected by generate_gst_reports_from_excel
+    """
+    from app import extract_data_from_excel
+
+    try:
+        excel_data = extract_data_from_excel(file_path)
+        file_type = gst_file_type(filename)
+        print(f"Extracted data from {filename} (type: {file_type})")
+        print(f"  Sheets: {excel_data.get('sheet_names', [])}")
+        return {"key": file_type, "data": excel_data}
+    except Exception as extract_error:
+        print(f"Error extracting data from {filename}: {str(extract_error)}")
+        return {
+            "key": filename,
+            "data": {
+                "error": f"Error extracting data: {str(extract_error)}",
+                "summary_text": f"Error reading {filename}",
+                "sheet_names": []
+            }
+        }
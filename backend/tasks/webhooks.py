@@ -0,0 +1,51 @@
+"""
+Celery delivery of webhook callbacks (see webhooks.py)
+
+Deliveries run on their own queue so slow or failing receivers never hold
+up pipeline workers. Retries use exponential backoff via countdown.
+"""
+import os
+from typing import Dict, Any, Optional
+
+import redis
+from dotenv import load_dotenv
+
+from celery_app import celery_app
+import webhooks
+
+load_dotenv()
+
+_redis_client: Optional[redis.Redis] = None
+
+
+def _get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+    return _redis_client
+
+
+@celery_app.task(bind=True, name="tasks.webhooks.deliver_webhook_task", max_retries=webhooks.WEBHOOK_MAX_ATTEMPTS - 1,
+                 acks_late=False)
+def deliver_webhook_task(self, webhook: Dict[str, str], event: Dict[str, Any]) -> None:
+    """POST one job event, retrying retryable failures with backoff"""
+    try:
+        webhooks.deliver(_get_redis(), webhook, event)
+    except webhooks.WebhookDeliveryError as e:
+        attempt = self.request.retries + 1
+        if attempt >= webhooks.WEBHOOK_MAX_ATTEMPTS:
+            print(f"❌ Webhook for job {event['job_id']} failed after {attempt} attempts: {str(e)}")
+            return
+        delay = webhooks.backoff_seconds(attempt)
+        print(f"⚠️ Webhook for job {event['job_id']} failed ({str(e)}); retry {attempt} in {delay:.0f}s")
+        raise self.retry(countdown=delay)
+
+
+def notify_job_finished(webhook: Optional[Dict[str, str]], job_id: str, result: Any = None) -> None:
+    """Queue the job-finished webhook, if the job has one; never raises"""
+    if not webhook:
+        return
+    try:
+        deliver_webhook_task.delay(webhook, webhooks.build_event(job_id, result))
+    except Exception as e:
+        print(f"Warning: Could not queue webhook for job {job_id}: {str(e)}")
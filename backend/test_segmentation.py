@@ -0,0 +1,50 @@
+"""Test script for multi-document PDF segmentation (python test_segmentation.py, or pytest)"""
+from segmentation import segment_pages
+
+
+def statement(account: str, pages: int):
+    """A statement that repeats its title and prints a running closing balance on every page"""
+    return [
+        f"STATEMENT OF ACCOUNT\nFirst National Bank\nAccount No: {account}\n"
+        f"01/04 Opening balance 1,000.00\n02/04 NEFT transfer 250.00\n"
+        f"Closing Balance 1,250.00\nPage {number} of {pages}"
+        for number in range(1, pages + 1)
+    ]
+
+
+def invoice(number: str):
+    return f"TAX INVOICE\nAcme Supplies\nInvoice No: {number}\nWidgets 10 x 5.00\nGrand Total 50.00"
+
+
+def ranges(pages):
+    return [(segment["start"] + 1, segment["end"] + 1) for segment in segment_pages(pages)]
+
+
+def test_statement_with_running_closing_balance_is_one_document():
+    assert ranges(statement("123456789012", 3)) == [(1, 3)]
+
+
+def test_statement_pack_splits_per_statement():
+    pack = statement("123456789012", 3) + statement("987654321098", 2)
+    assert ranges(pack) == [(1, 3), (4, 5)]
+
+
+def test_same_account_statements_split_on_page_number_reset():
+    pack = statement("123456789012", 2) + statement("123456789012", 2)
+    assert ranges(pack) == [(1, 2), (3, 4)]
+
+
+def test_invoice_run_splits_on_invoice_number():
+    assert ranges([invoice("INV-001"), invoice("INV-002"), invoice("INV-003")]) == [(1, 1), (2, 2), (3, 3)]
+
+
+def test_title_and_header_after_closing_split_without_ids():
+    pages = ["TAX INVOICE\nAcme Supplies\nWidgets\nGrand Total 50.00"] * 2
+    assert ranges(pages) == [(1, 1), (2, 2)]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,343 @@
+"""
+Resumable chunked uploads for large documents
+
+Protocol:
+
+1. POST /uploads creates a session for a file of known size and returns the
+   chunk size and chunk count.
+2. PUT /uploads/{session_id}/chunks/{index} sends one chunk as the raw
+   request body with its SHA-256 in the X-Chunk-SHA256 header. Chunks may
+   arrive in any order, in parallel, and may be re-sent; a re-sent chunk
+   replaces the earlier copy.
+3. GET /uploads/{session_id} lists received and missing chunks, so a client
+   can resume after a dropped connection by sending only what is missing.
+4. POST /uploads/{session_id}/complete assembles the chunks into the content
+   store (content_store.py) in one sequential pass, checks the whole-file
+   SHA-256 if one was given at creation, and hands the stored file to the
+   processing pipeline by path.
+
+Session metadata lives in Redis so any API process can take any request;
+chunk files live under UPLOAD_SESSION_DIR, which must be shared by the API
+processes (same host or shared volume).
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import shutil
+import hashlib
+import tempfile
+from typing import Dict, Any, List, Optional, AsyncIterator
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+import content_store
+from uploads import DOCUMENT_EXTENSIONS, check_signature
+
+load_dotenv()
+
+UPLOAD_SESSION_DIR = os.getenv(
+    "UPLOAD_SESSION_DIR",
+    os.path.join(tempfile.gettempdir(), "finsight_upload_sessions")
+)
+MAX_CHUNKED_UPLOAD_SIZE = int(os.getenv("MAX_CHUNKED_UPLOAD_SIZE", 500 * 1024 * 1024))  # 500MB
+DEFAULT_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))  # 8MB
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+# Unfinished sessions (and their chunks) expire after this long without activity
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", 24 * 60 * 60))
+
+SESSION_PREFIX = "upload_session"
+STATUS_UPLOADING = "uploading"
+STATUS_COMPLETED = "completed"
+ASSEMBLY_BUFFER_SIZE = 1024 * 1024
+
+
+def _session_key(session_id: str) -> str:
+    return f"{SESSION_PREFIX}:{session_id}"
+
+
+def _chunks_key(session_id: str) -> str:
+    return f"{SESSION_PREFIX}:{session_id}:chunks"
+
+
+def _session_dir(session_id: str) -> str:
+    return os.path.join(UPLOAD_SESSION_DIR, session_id)
+
+
+def _chunk_path(session_id: str, index: int) -> str:
+    return os.path.join(_session_dir(session_id), f"chunk_{index:06d}")
+
+
+def _touch(redis_client, session_id: str) -> None:
+    redis_client.expire(_session_key(session_id), UPLOAD_SESSION_TTL)
+    redis_client.expire(_chunks_key(session_id), UPLOAD_SESSION_TTL)
+
+
+def create_session(
+    redis_client,
+    filename: str,
+    total_size: int,
+    owner: str,
+    chunk_size: Optional[int] = None,
+    sha256: Optional[str] = None,
+    document_type: Optional[str] = None
+) -> Dict[str, Any]:
+    """Validate the announced upload and open a session for it"""
+    extension = os.path.splitext(filename or "")[1].lower()
+    if not filename:
+        raise HTTPException(status_code=400, detail="No filename provided. Please ensure the file has a valid name.")
+    if extension not in DOCUMENT_EXTENSIONS:
+        allowed_types_str = ', '.join(sorted([ext.upper() for ext in DOCUMENT_EXTENSIONS]))
+        raise HTTPException(
+            status_code=400,
+            detail=f"File type '{extension}' is not supported. Allowed file types: {allowed_types_str}. Please upload a supported file format."
+        )
+    if total_size <= 0:
+        raise HTTPException(status_code=400, detail="total_size must be greater than zero.")
+    if total_size > MAX_CHUNKED_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File size ({total_size / (1024*1024):.2f}MB) exceeds maximum allowed size of {MAX_CHUNKED_UPLOAD_SIZE // (1024*1024)}MB."
+        )
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes."
+        )
+    if sha256 is not None:
+        sha256 = sha256.lower()
+        try:
+            content_store.path_for(sha256)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="sha256 must be a 64 character hex digest.")
+
+    purge_expired_sessions(redis_client)
+    session_id = uuid.uuid4().hex
+    session = {
+        "session_id": session_id,
+        "filename": filename,
+        "total_size": total_size,
+        "chunk_size": chunk_size,
+        "total_chunks": math.ceil(total_size / chunk_size),
+        "sha256": sha256,
+        "document_type": document_type,
+        "owner": owner,
+        "status": STATUS_UPLOADING,
+        "created_at": time.time(),
+    }
+    os.makedirs(_session_dir(session_id), exist_ok=True)
+    redis_client.set(_session_key(session_id), json.dumps(session), ex=UPLOAD_SESSION_TTL)
+    print(f"✓ Upload session {session_id}: {filename} ({total_size / (1024*1024):.2f}MB in {session['total_chunks']} chunks)")
+    return session
+
+
+def get_session(redis_client, session_id: str) -> Dict[str, Any]:
+    """Load a session; the random session id is the capability to use it"""
+    raw = redis_client.get(_session_key(session_id)) if session_id.isalnum() else None
+    session = json.loads(raw) if raw else None
+    if not session:
+        raise HTTPException(status_code=404, detail=f"Upload session '{session_id}' not found or expired.")
+    return session
+
+
+def _expected_chunk_size(session: Dict[str, Any], index: int) -> int:
+    if index == session["total_chunks"] - 1:
+        return session["total_size"] - index * session["chunk_size"]
+    return session["chunk_size"]
+
+
+def received_chunks(redis_client, session_id: str) -> List[int]:
+    return sorted(int(i) for i in redis_client.smembers(_chunks_key(session_id)))
+
+
+def session_status(redis_client, session: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a session for GET /uploads/{session_id}"""
+    if session["status"] == STATUS_COMPLETED:
+        received = list(range(session["total_chunks"]))
+    else:
+        received = received_chunks(redis_client, session["session_id"])
+    received_set = set(received)
+    missing = [i for i in range(session["total_chunks"]) if i not in received_set]
+    status = {key: session[key] for key in (
+        "session_id", "filename", "total_size", "chunk_size", "total_chunks", "document_type", "status"
+    )}
+    status["received_chunks"] = received
+    status["missing_chunks"] = missing
+    status["received_bytes"] = sum(_expected_chunk_size(session, i) for i in received)
+    for key in ("sha256", "job_id"):
+        if session.get(key):
+            status[key] = session[key]
+    return status
+
+
+async def write_chunk(
+    redis_client,
+    session: Dict[str, Any],
+    index: int,
+    body: AsyncIterator[bytes],
+    chunk_sha256: str
+) -> Dict[str, Any]:
+    """
+    Stream one chunk to disk, verifying its length and checksum
+
+    The chunk is written to a temp name and renamed into place only once it
+    verifies, so a dropped connection never leaves a partial chunk behind.
+    """
+    session_id = session["session_id"]
+    if session["status"] != STATUS_UPLOADING:
+        raise HTTPException(status_code=409, detail="Upload session is already completed.")
+    if not 0 <= index < session["total_chunks"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Chunk index {index} is out of range (0-{session['total_chunks'] - 1})."
+        )
+    if not chunk_sha256:
+        raise HTTPException(status_code=400, detail="X-Chunk-SHA256 header is required.")
+
+    expected_size = _expected_chunk_size(session, index)
+    digest = hashlib.sha256()
+    size = 0
+    os.makedirs(_session_dir(session_id), exist_ok=True)
+    fd, partial_path = tempfile.mkstemp(prefix=f".chunk_{index:06d}_", dir=_session_dir(session_id))
+    try:
+        with os.fdopen(fd, "wb") as out:
+            async for data in body:
+                if not data:
+                    continue
+                if size == 0 and index == 0:
+                    check_signature(session["filename"], os.path.splitext(session["filename"])[1].lower(), data)
+                size += len(data)
+                if size > expected_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Chunk {index} is larger than the expected {expected_size} bytes."
+                    )
+                digest.update(data)
+                out.write(data)
+        if size != expected_size:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Chunk {index} has {size} bytes; expected {expected_size}."
+            )
+        if digest.hexdigest() != chunk_sha256.lower():
+            raise HTTPException(status_code=422, detail=f"Checksum mismatch for chunk {index}. Please resend it.")
+        os.replace(partial_path, _chunk_path(session_id, index))
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+        raise
+
+    redis_client.sadd(_chunks_key(session_id), index)
+    _touch(redis_client, session_id)
+    return {"session_id": session_id, "index": index, "size": size, "sha256": digest.hexdigest()}
+
+
+def assemble(redis_client, session: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Concatenate all chunks into the content store
+
+    Returns:
+        The updated session, with "sha256" and "stored_path" set
+    """
+    session_id = session["session_id"]
+    if session["status"] == STATUS_COMPLETED:
+        return session
+
+    # Only one request may assemble a session; concurrent /complete calls retry
+    lock_key = f"{_session_key(session_id)}:assembling"
+    if not redis_client.set(lock_key, "1", nx=True, ex=10 * 60):
+        raise HTTPException(
+            status_code=409,
+            detail="Upload is already being assembled. Please retry shortly.",
+            headers={"Retry-After": "5"}
+        )
+    latest = get_session(redis_client, session_id)
+    if latest["status"] == STATUS_COMPLETED:
+        redis_client.delete(lock_key)
+        return latest
+
+    received = set(received_chunks(redis_client, session_id))
+    missing = [i for i in range(session["total_chunks"]) if i not in received]
+    if missing:
+        redis_client.delete(lock_key)
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload is incomplete: {len(missing)} chunk(s) missing (first missing: {missing[0]})."
+        )
+
+    digest = hashlib.sha256()
+    staged, staged_path = content_store.staging_file()
+    try:
+        with staged:
+            for index in range(session["total_chunks"]):
+                with open(_chunk_path(session_id, index), "rb") as chunk:
+                    while True:
+                        data = chunk.read(ASSEMBLY_BUFFER_SIZE)
+                        if not data:
+                            break
+                        digest.update(data)
+                        staged.write(data)
+        file_hash = digest.hexdigest()
+        if session.get("sha256") and session["sha256"] != file_hash:
+            raise HTTPException(
+                status_code=422,
+                detail="Assembled file does not match the announced sha256. Please restart the upload."
+            )
+        stored_path = content_store.commit(staged_path, file_hash)
+    except BaseException:
+        if os.path.exists(staged_path):
+            os.unlink(staged_path)
+        redis_client.delete(lock_key)
+        raise
+
+    session.update({"status": STATUS_COMPLETED, "sha256": file_hash, "stored_path": stored_path})
+    redis_client.set(_session_key(session_id), json.dumps(session), ex=UPLOAD_SESSION_TTL)
+    redis_client.delete(_chunks_key(session_id), lock_key)
+    shutil.rmtree(_session_dir(session_id), ignore_errors=True)
+    print(f"✓ Upload session {session_id} assembled: {session['filename']} → {stored_path}")
+    return session
+
+
+def claim_dispatch(redis_client, session_id: str) -> bool:
+    """True for exactly one caller per session, so a completed upload is queued once"""
+    return bool(redis_client.set(f"{_session_key(session_id)}:dispatched", "1", nx=True, ex=UPLOAD_SESSION_TTL))
+
+
+def release_dispatch(redis_client, session_id: str) -> None:
+    """Undo claim_dispatch after queueing failed, so the client can retry /complete"""
+    redis_client.delete(f"{_session_key(session_id)}:dispatched")
+
+
+def record_job(redis_client, session: Dict[str, Any], job_id: str) -> None:
+    """Remember which job processes a completed upload, so /complete is safe to retry"""
+    session["job_id"] = job_id
+    redis_client.set(_session_key(session["session_id"]), json.dumps(session), ex=UPLOAD_SESSION_TTL)
+
+
+def abort_session(redis_client, session: Dict[str, Any]) -> None:
+    """Drop a session and any chunks received so far"""
+    session_id = session["session_id"]
+    redis_client.delete(_session_key(session_id), _chunks_key(session_id), f"{_session_key(session_id)}:dispatched")
+    shutil.rmtree(_session_dir(session_id), ignore_errors=True)
+
+
+def purge_expired_sessions(redis_client) -> int:
+    """Delete chunk directories whose session has expired in Redis"""
+    if not os.path.isdir(UPLOAD_SESSION_DIR):
+        return 0
+    purged = 0
+    for session_id in os.listdir(UPLOAD_SESSION_DIR):
+        session_dir = _session_dir(session_id)
+        # Leave just-created directories alone while their session key is written
+        if time.time() - os.path.getmtime(session_dir) < 60:
+            continue
+        if not redis_client.exists(_session_key(session_id)):
+            shutil.rmtree(session_dir, ignore_errors=True)
+            purged += 1
+    if purged:
+        print(f"Cleaned up {purged} expired upload session(s)")
+    return purged
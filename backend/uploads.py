@@ -0,0 +1,130 @@
+"""
+Streaming upload ingest shared by the processing endpoints
+
+Uploads are spooled chunk by chunk straight to a temp file while the SHA-256
+(used for document cache and idempotency keys) is computed incrementally.
+Size and type limits are enforced as the bytes arrive, so an oversized or
+mislabelled upload is rejected without buffering it in memory.
+"""
+
+import os
+import hashlib
+import tempfile
+from typing import Optional, Set
+
+from fastapi import UploadFile, HTTPException
+
+MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+CHUNK_SIZE = 1024 * 1024  # 1MB
+DOCUMENT_EXTENSIONS = {'.pdf', '.docx', '.doc', '.xlsx', '.xls', '.jpg', '.jpeg', '.png'}
+EXCEL_EXTENSIONS = {'.xlsx', '.xls'}
+
+# Leading bytes every file of these types starts with. .doc/.xls are not
+# checked: legacy exports are often HTML or RTF with an Office extension.
+FILE_SIGNATURES = {
+    '.pdf': (b'%PDF',),
+    '.png': (b'\x89PNG\r\n\x1a\n',),
+    '.jpg': (b'\xff\xd8\xff',),
+    '.jpeg': (b'\xff\xd8\xff',),
+    '.docx': (b'PK\x03\x04',),
+    '.xlsx': (b'PK\x03\x04',),
+    '.zip': (b'PK\x03\x04',),
+}
+
+
+class SpooledUpload:
+    """An upload written to disk, with its size and content hash"""
+
+    def __init__(self, filename: str, path: str, size: int, sha256: str, content_type: Optional[str]):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.content_type = content_type
+
+    @property
+    def extension(self) -> str:
+        return os.path.splitext(self.filename)[1].lower()
+
+    def cleanup(self) -> None:
+        if self.path and os.path.exists(self.path):
+            try:
+                os.unlink(self.path)
+            except Exception as e:
+                print(f"Warning: Could not delete temporary file {self.path}: {e}")
+
+
+def check_signature(filename: str, extension: str, head: bytes) -> None:
+    signatures = FILE_SIGNATURES.get(extension)
+    if not signatures:
+        return
+    # PDFs may carry a few junk bytes before the header
+    window = head[:1024] if extension == '.pdf' else head
+    if extension == '.pdf':
+        matched = any(sig in window for sig in signatures)
+    else:
+        matched = any(window.startswith(sig) for sig in signatures)
+    if not matched:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File '{filename}' does not look like a valid {extension.upper()} file."
+        )
+
+
+async def ingest_upload(
+    file: UploadFile,
+    allowed_extensions: Set[str] = DOCUMENT_EXTENSIONS,
+    max_file_size: int = MAX_FILE_SIZE,
+    dest_dir: Optional[str] = None
+) -> SpooledUpload:
+    """
+    Validate and spool an upload to disk
+
+    Raises:
+        HTTPException 400 for a missing name, unsupported or mismatched type,
+        or empty file; 413 as soon as the size limit is exceeded
+    """
+    filename = file.filename
+    if not filename:
+        raise HTTPException(
+            status_code=400,
+            detail="No filename provided. Please ensure the file has a valid name."
+        )
+
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in allowed_extensions:
+        allowed_types_str = ', '.join(sorted([ext.upper() for ext in allowed_extensions]))
+        raise HTTPException(
+            status_code=400,
+            detail=f"File '{filename}' has unsupported type '{extension}'. Allowed types: {allowed_types_str}"
+        )
+
+    fd, path = tempfile.mkstemp(prefix="finsight_upload_", suffix=extension, dir=dest_dir)
+    digest = hashlib.sha256()
+    total_size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if total_size == 0:
+                    check_signature(filename, extension, chunk)
+                total_size += len(chunk)
+                if total_size > max_file_size:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File '{filename}' size exceeds maximum allowed size of {max_file_size // (1024 * 1024)}MB. Please upload a smaller file."
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+
+        if total_size == 0:
+            raise HTTPException(status_code=400, detail=f"File '{filename}' is empty. Please upload a file with content.")
+    except BaseException:
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+
+    print(f"✓ File validated: {filename} ({total_size / (1024*1024):.2f}MB, {extension})")
+    return SpooledUpload(filename, path, total_size, digest.hexdigest(), file.content_type)
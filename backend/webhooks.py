@@ -0,0 +1,363 @@
+"""
+Webhook callbacks for finished jobs
+
+Instead of polling /job/{job_id}/status, integrators can be called back when
+a job finishes:
+
+- per user: POST /webhooks registers a URL and returns a signing secret;
+  every job that user queues afterwards is reported there. Replacing,
+  reading or deleting a registration needs the current secret
+  (X-Webhook-Secret header)
+- per job: pass webhook_url when queueing; it is signed with the user's
+  registered secret (the request must then carry X-Webhook-Secret), or
+  WEBHOOK_SECRET for users without a registration
+
+URLs must resolve to public addresses: loopback, link-local, private and
+reserved targets are refused at registration and again when delivering,
+where the connection goes to the address that was checked (so a DNS answer
+that changes in between cannot redirect it), and redirects are never
+followed.
+
+The job carries only {"url", "user_key"}; the secret is looked up at
+delivery time. Each delivery POSTs a compact JSON event (status, result
+summary and a link to /job/{job_id}/result) signed with HMAC-SHA256:
+
+    X-FinSight-Signature: sha256=<hex hmac of "<timestamp>.<body>">
+
+Deliveries are retried with exponential backoff on network errors, 429 and
+5xx responses, over a bounded pool of outbound connections. On Celery they
+run as deliver_webhook_task (queue: webhooks); on the local job backend, on
+a small thread pool in the API process.
+"""
+
+import os
+import hmac
+import socket
+import ipaddress
+import json
+import time
+import uuid
+import random
+import secrets
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+import result_store
+
+load_dotenv()
+
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Public base URL of this API, used for result links (relative links if unset)
+WEBHOOK_RESULT_BASE_URL = os.getenv("WEBHOOK_RESULT_BASE_URL", "").rstrip("/")
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", 10))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 8))
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", 5))
+WEBHOOK_BACKOFF_MAX = float(os.getenv("WEBHOOK_BACKOFF_MAX", 30 * 60))
+# Outbound connections per process, shared by all deliveries
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", 20))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+# Allow webhooks to loopback/private addresses (local development only)
+WEBHOOK_ALLOW_PRIVATE_HOSTS = os.getenv("WEBHOOK_ALLOW_PRIVATE_HOSTS", "false").lower() == "true"
+
+WEBHOOK_PREFIX = "webhook:user"
+RETRYABLE_STATUS = {408, 425, 429}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class WebhookDeliveryError(Exception):
+    """A delivery attempt failed in a way worth retrying"""
+
+
+class WebhookAuthError(Exception):
+    """The request did not present the registration's current secret"""
+
+
+class WebhookAddressError(ValueError):
+    """The webhook host does not resolve (only) to public addresses"""
+
+
+# ------------------------------
+# Registration
+# ------------------------------
+
+def validate_url(url: str) -> str:
+    """
+    Return url if it is an absolute http(s) URL whose host resolves only to
+    public addresses, else raise ValueError
+    """
+    parsed = urlparse(url or "")
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("Webhook URL must be an absolute http:// or https:// URL")
+    if WEBHOOK_ALLOW_PRIVATE_HOSTS:
+        return url
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    except ValueError:
+        raise ValueError("Webhook URL has an invalid port")
+    public_addresses(parsed.hostname, port)
+    return url
+
+
+def public_addresses(host: str, port: int) -> List[str]:
+    """
+    Resolve host, raising WebhookAddressError unless every address is public
+
+    Returns:
+        The resolved addresses, in getaddrinfo order
+    """
+    try:
+        infos = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        raise WebhookAddressError(f"Webhook host {host} could not be resolved")
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    for address in addresses:
+        if not ipaddress.ip_address(address.split("%", 1)[0]).is_global:
+            raise WebhookAddressError(
+                "Webhook URL must resolve to a public address (not loopback, link-local, private or reserved)"
+            )
+    return addresses
+
+
+def _user_key(user_key: str) -> str:
+    return f"{WEBHOOK_PREFIX}:{user_key}"
+
+
+def check_secret(registration: Optional[Dict[str, Any]], presented: Optional[str]) -> None:
+    """
+    Raises:
+        WebhookAuthError: there is a registration and presented is not its secret
+    """
+    if registration and not hmac.compare_digest(registration["secret"], presented or ""):
+        raise WebhookAuthError("This user already has a webhook: send its current secret in X-Webhook-Secret")
+
+
+def register(redis_client, user_key: str, url: str, current_secret: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Register (or, with the current secret, replace) a user's webhook; the
+    returned secret is shown only once
+
+    Raises:
+        ValueError: the URL is invalid or not public
+        WebhookAuthError: replacing without the current secret
+    """
+    check_secret(get_registration(redis_client, user_key), current_secret)
+    registration = {
+        "url": validate_url(url),
+        "secret": secrets.token_hex(32),
+        "created_at": time.time(),
+    }
+    redis_client.set(_user_key(user_key), json.dumps(registration))
+    return registration
+
+
+def get_registration(redis_client, user_key: str) -> Optional[Dict[str, Any]]:
+    if redis_client is None:
+        return None
+    raw = redis_client.get(_user_key(user_key))
+    return json.loads(raw) if raw else None
+
+
+def unregister(redis_client, user_key: str, current_secret: Optional[str] = None) -> bool:
+    """
+    Raises:
+        WebhookAuthError: current_secret is not the registration's secret
+    """
+    registration = get_registration(redis_client, user_key)
+    if not registration:
+        return False
+    check_secret(registration, current_secret)
+    return bool(redis_client.delete(_user_key(user_key)))
+
+
+def resolve(redis_client, user_key: str, webhook_url: Optional[str] = None,
+            current_secret: Optional[str] = None) -> Optional[Dict[str, str]]:
+    """
+    The webhook a new job should report to: webhook_url if given, else the
+    user's registration
+
+    Raises:
+        ValueError: webhook_url is invalid, or there is no secret to sign it with
+        WebhookAuthError: webhook_url would be signed with the user's
+            registered secret but current_secret does not match it
+    """
+    registration = None
+    try:
+        registration = get_registration(redis_client, user_key)
+    except Exception as e:
+        print(f"Warning: Could not read webhook registration: {str(e)}")
+    if webhook_url:
+        validate_url(webhook_url)
+        if registration:
+            # Otherwise anyone could have events signed with this user's secret
+            check_secret(registration, current_secret)
+            return {"url": webhook_url, "user_key": user_key}
+        if not WEBHOOK_SECRET:
+            raise ValueError("Register a webhook (POST /webhooks) or set WEBHOOK_SECRET before using webhook_url")
+        return {"url": webhook_url, "user_key": user_key, "signer": "global"}
+    if registration:
+        return {"url": registration["url"], "user_key": user_key}
+    return None
+
+
+def signing_secret(redis_client, webhook: Dict[str, str]) -> Optional[str]:
+    """WEBHOOK_SECRET for jobs resolved without a registration, else the user's current secret"""
+    if webhook.get("signer") == "global":
+        return WEBHOOK_SECRET
+    registration = get_registration(redis_client, webhook["user_key"])
+    return registration["secret"] if registration else WEBHOOK_SECRET
+
+
+# ------------------------------
+# Events
+# ------------------------------
+
+def build_event(job_id: str, result: Any = None, error: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Compact job-finished event: status, summary and a link, never the full result"""
+    if error is None and isinstance(result, dict) and result.get("status") == "failed":
+        error = result
+    event = {
+        "id": uuid.uuid4().hex,
+        "type": "job.failed" if error else "job.completed",
+        "job_id": job_id,
+        "status": "failed" if error else "completed",
+        "created_at": time.time(),
+    }
+    if error:
+        event["error"] = error.get("error")
+        event["error_type"] = error.get("error_type")
+    else:
+        if result_store.is_pointer(result):
+            event["summary"] = result["summary"]
+        elif isinstance(result, dict):
+            event["summary"] = result_store.summarize(result)
+        event["result_url"] = f"{WEBHOOK_RESULT_BASE_URL}/job/{job_id}/result"
+    return event
+
+
+def sign(secret: str, timestamp: str, body: bytes) -> str:
+    digest = hmac.new(secret.encode("utf-8"), timestamp.encode("utf-8") + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Delay before retry number attempt (1-based), with jitter"""
+    delay = min(WEBHOOK_BACKOFF_BASE * (2 ** (attempt - 1)), WEBHOOK_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+# ------------------------------
+# Delivery
+# ------------------------------
+
+def _public_transport():
+    """
+    httpx transport whose connections are made to an address checked by
+    public_addresses, resolved once per connection. TLS still verifies the
+    certificate against the URL's hostname (SNI), and Host stays unchanged.
+    """
+    import httpx
+    import httpcore
+
+    class PublicAddressBackend(httpcore.SyncBackend):
+        def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+            if not WEBHOOK_ALLOW_PRIVATE_HOSTS:
+                host = public_addresses(host, port)[0]
+            return super().connect_tcp(host, port, timeout=timeout, local_address=local_address,
+                                       socket_options=socket_options)
+
+    transport = httpx.HTTPTransport()
+    transport._pool = httpcore.ConnectionPool(
+        ssl_context=httpx.create_ssl_context(),
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        max_keepalive_connections=WEBHOOK_MAX_CONNECTIONS,
+        network_backend=PublicAddressBackend()
+    )
+    return transport
+
+
+def get_client():
+    """Process-wide HTTP client with a bounded connection pool"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            import httpx
+            _client = httpx.Client(
+                timeout=WEBHOOK_TIMEOUT,
+                transport=_public_transport(),
+                follow_redirects=False
+            )
+        return _client
+
+
+def deliver(redis_client, webhook: Dict[str, str], event: Dict[str, Any]) -> None:
+    """
+    POST one event to a webhook
+
+    Raises:
+        WebhookDeliveryError: retryable failure (network error, 408/425/429, 5xx)
+    """
+    import httpx
+
+    secret = signing_secret(redis_client, webhook)
+    if not secret:
+        print(f"⚠️ Webhook for job {event['job_id']} dropped: no signing secret")
+        return
+    body = json.dumps(event).encode("utf-8")
+    timestamp = str(int(time.time()))
+    headers = {
+        "Content-Type": "application/json",
+        "User-Agent": "FinSight-Webhooks/1.0",
+        "X-FinSight-Event": event["type"],
+        "X-FinSight-Delivery": event["id"],
+        "X-FinSight-Timestamp": timestamp,
+        "X-FinSight-Signature": sign(secret, timestamp, body),
+    }
+    try:
+        # Addresses are checked again when connecting: DNS may have changed since registration
+        response = get_client().post(webhook["url"], content=body, headers=headers)
+    except WebhookAddressError as e:
+        print(f"⚠️ Webhook for job {event['job_id']} dropped: {str(e)}")
+        return
+    except httpx.HTTPError as e:
+        raise WebhookDeliveryError(f"{type(e).__name__}: {str(e)}")
+    if response.status_code >= 500 or response.status_code in RETRYABLE_STATUS:
+        raise WebhookDeliveryError(f"HTTP {response.status_code}")
+    if response.status_code >= 400:
+        print(f"⚠️ Webhook for job {event['job_id']} rejected with HTTP {response.status_code}; not retrying")
+        return
+    print(f"✓ Webhook delivered for job {event['job_id']} ({event['type']})")
+
+
+class LocalDeliveryWorker:
+    """Delivers webhooks from the API process (local job backend) with retries"""
+
+    def __init__(self, redis_client=None, max_workers: int = WEBHOOK_WORKERS):
+        self.redis_client = redis_client
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="webhook")
+
+    def submit(self, webhook: Dict[str, str], event: Dict[str, Any], attempt: int = 1) -> None:
+        self._pool.submit(self._attempt, webhook, event, attempt)
+
+    def _attempt(self, webhook: Dict[str, str], event: Dict[str, Any], attempt: int) -> None:
+        try:
+            deliver(self.redis_client, webhook, event)
+        except WebhookDeliveryError as e:
+            if attempt >= WEBHOOK_MAX_ATTEMPTS:
+                print(f"❌ Webhook for job {event['job_id']} failed after {attempt} attempts: {str(e)}")
+                return
+            delay = backoff_seconds(attempt)
+            print(f"⚠️ Webhook for job {event['job_id']} failed ({str(e)}); retry {attempt} in {delay:.0f}s")
+            timer = threading.Timer(delay, self.submit, args=(webhook, event, attempt + 1))
+            timer.daemon = True
+            timer.start()
+        except Exception as e:
+            print(f"❌ Webhook for job {event['job_id']} could not be sent: {type(e).__name__}: {str(e)}")
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,75 @@
+"""
+Request-scoped scratch directories
+
+Every request or pipeline job gets its own unique temp directory, so two
+concurrent uploads with the same filename can never overwrite each other.
+The upload is written into it once; extractors share that single copy by
+path, and in-memory consumers (hashing, Redis hand-off, page counting) get a
+read-only memory-mapped view instead of a second bytes copy. The directory
+and everything in it is removed when the workspace is cleaned up.
+"""
+
+import os
+import mmap
+import shutil
+import tempfile
+from typing import List, Optional
+
+
+class RequestWorkspace:
+    """A unique temp directory for one request or job, removed on cleanup"""
+
+    def __init__(self, label: str = "request", base_dir: Optional[str] = None):
+        safe_label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label)[:64]
+        self.root = tempfile.mkdtemp(prefix=f"finsight_{safe_label}_", dir=base_dir)
+        self._maps: List[mmap.mmap] = []
+        self._views: List[memoryview] = []
+
+    def __enter__(self) -> "RequestWorkspace":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.cleanup()
+
+    def path(self, filename: str) -> str:
+        """Path for filename inside the workspace (directory parts are dropped)"""
+        name = os.path.basename(filename.replace("\\", "/")) or "upload"
+        return os.path.join(self.root, name)
+
+    def write_bytes(self, filename: str, data: bytes) -> str:
+        """Write data into the workspace and return its path"""
+        file_path = self.path(filename)
+        with open(file_path, "wb") as f:
+            f.write(data)
+        return file_path
+
+    def map(self, file_path: str) -> memoryview:
+        """
+        Read-only view of a workspace file, backed by mmap
+
+        The view is valid until cleanup(); pass it anywhere bytes are
+        accepted (hashlib, redis-py, io.BytesIO) without copying the file.
+        """
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b"")
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        self._maps.append(mapped)
+        self._views.append(view)
+        return view
+
+    def cleanup(self) -> None:
+        """Release mapped views and delete the workspace directory"""
+        try:
+            for view in self._views:
+                view.release()
+            for mapped in self._maps:
+                mapped.close()
+        except BufferError as e:
+            # A caller still holds a slice; the map is freed once it is dropped
+            print(f"Warning: Workspace buffer still in use: {e}")
+        self._views = []
+        self._maps = []
+        if os.path.isdir(self.root):
+            shutil.rmtree(self.root, ignore_errors=True)